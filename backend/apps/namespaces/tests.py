@@ -1,9 +1,14 @@
 from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
 from rest_framework import status
 from apps.organizations.models import Organization, OrganizationMember
 from apps.namespaces.models import Namespace
+from apps.urls.models import ShortURL, ClickEvent
+from apps.urls.rollups import rollup_click_events
+from datetime import datetime, timezone as dt_timezone
 
 
 class NamespaceTests(TestCase):
@@ -70,3 +75,60 @@ class NamespaceTests(TestCase):
         self.assertIn('organization', response.data)
         self.assertIn('admin', str(response.data['organization'][0]).lower())
         self.assertEqual(Namespace.objects.count(), 0)
+    
+    def test_duplicate_name_is_rejected_by_the_constraint(self):
+        """Test that a taken name is a field error found by the insert, not a pre-check"""
+        Namespace.objects.create(name='taken', organization=self.org)
+        self.client.force_authenticate(user=self.admin)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/namespaces/', {
+                'name': 'taken',
+                'organization': self.org.id
+            })
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'name': ['This namespace is already taken.']})
+        name_checks = [q for q in queries.captured_queries if q['sql'].startswith('SELECT') and '"name" =' in q['sql']]
+        self.assertEqual(name_checks, [])
+        self.assertEqual(Namespace.objects.count(), 1)
+    
+    def test_update_looks_up_memberships_once(self):
+        """Test that the admin permission and organization validation share one membership query"""
+        namespace = Namespace.objects.create(name='old-name', organization=self.org)
+        self.client.force_authenticate(user=self.admin)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(f'/api/namespaces/{namespace.id}/', {
+                'name': 'new-name',
+                'organization': self.org.id
+            })
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        role_lookups = [q for q in queries.captured_queries if 'FROM "organizations_organizationmember"' in q['sql']]
+        self.assertEqual(len(role_lookups), 1)
+    
+    def test_namespace_stats_sum_short_url_rollups(self):
+        """Test that namespace stats add up the rollups of its short URLs"""
+        namespace = Namespace.objects.create(name='stats-namespace', organization=self.org)
+        clicked_at = datetime(2026, 1, 1, 10, 5, tzinfo=dt_timezone.utc)
+        for short_code in ['abc123', 'def456']:
+            short_url = ShortURL.objects.create(
+                original_url=f'https://example.com/{short_code}',
+                short_code=short_code,
+                namespace=namespace,
+                created_by=self.admin
+            )
+            ClickEvent.objects.bulk_create([ClickEvent(short_url=short_url, clicked_at=clicked_at)] * 2)
+        rollup_click_events()
+        
+        self.client.force_authenticate(user=self.editor)
+        response = self.client.get(f'/api/namespaces/{namespace.id}/stats/', {
+            'granularity': 'day',
+            'start': '2026-01-01T00:00:00Z',
+            'end': '2026-01-02T00:00:00Z',
+        })
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_clicks'], 4)
+        self.assertEqual(len(response.data['buckets']), 1)
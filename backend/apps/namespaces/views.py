@@ -1,10 +1,14 @@
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
+from django.conf import settings
 from .models import Namespace
 from .serializers import NamespaceSerializer
 from apps.organizations.models import OrganizationMember, Organization
+from apps.urls.rollups import parse_stats_params, click_stats
+from apps.urls.trending import parse_trending_k, trending_links
 from core.permissions import IsOrganizationAdmin
 
 
@@ -90,3 +94,36 @@ class NamespaceViewSet(viewsets.ModelViewSet):
         namespace = self.get_object()
         namespace.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    @action(detail=True)
+    def stats(self, request, pk=None):
+        """
+        Clicks per minute, hour or day across all short URLs in a namespace.
+        
+        Takes the same query params as the short URL stats endpoint and is
+        likewise served from the rollup tables.
+        """
+        namespace = self.get_object()
+        try:
+            granularity, start, end = parse_stats_params(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(click_stats(granularity, start, end, namespace_id=namespace.pk))
+    
+    @action(detail=True)
+    def trending(self, request, pk=None):
+        """
+        Top k links in the namespace over the trending window (?k=, default 10).
+        
+        Served from streaming heavy-hitter summaries kept by the redirect
+        workers, so it never sorts the short URL table by click count.
+        """
+        namespace = self.get_object()
+        try:
+            k = parse_trending_k(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'window_seconds': settings.TRENDING_WINDOW_SECONDS,
+            'results': trending_links([namespace.pk], k),
+        })
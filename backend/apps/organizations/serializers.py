@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import Organization, OrganizationMember, OrganizationInvitation
 from django.contrib.auth.models import User
+from core.utils import get_user_organization_role, clear_membership_roles
 
 
 class OrganizationMemberSerializer(serializers.ModelSerializer):
@@ -36,12 +37,8 @@ class OrganizationSerializer(serializers.ModelSerializer):
                 for member in obj.members.all():
                     if member.user_id == request.user.id:
                         return member.role
-            # Fallback to query if prefetch not available
-            member = OrganizationMember.objects.filter(
-                organization=obj,
-                user=request.user
-            ).first()
-            return member.role if member else None
+            # Fall back to the request's membership map if prefetch not available
+            return get_user_organization_role(request.user, obj, request)
         return None
 
 
@@ -60,6 +57,8 @@ class OrganizationCreateSerializer(serializers.ModelSerializer):
             organization=organization,
             role='ADMIN'
         )
+        # The creator's membership map predates this organization
+        clear_membership_roles(self.context['request'])
         return organization
 
 
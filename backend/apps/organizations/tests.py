@@ -1,10 +1,15 @@
 from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
 from rest_framework.test import APIClient
 from rest_framework import status
 from apps.organizations.models import Organization, OrganizationMember, OrganizationInvitation
+from apps.namespaces.models import Namespace
+from apps.urls.models import ShortURL
+from apps.urls.dashboard import refresh_dashboard_views
 
 
 class OrganizationTests(TestCase):
@@ -79,6 +84,48 @@ class OrganizationTests(TestCase):
             # Non-paginated response
             self.assertEqual(len(response.data), 1)
             self.assertEqual(response.data[0]['name'], 'My Org')
+    
+    def test_dashboard_reads_refreshed_materialized_views(self):
+        """Test that the dashboard serves totals as of the last refresh"""
+        org = Organization.objects.create(name='My Org')
+        OrganizationMember.objects.create(
+            organization=org,
+            user=self.user,
+            role='VIEWER'
+        )
+        namespace = Namespace.objects.create(name='dashboard-namespace', organization=org)
+        for n in range(3):
+            ShortURL.objects.create(
+                original_url=f'https://example.com/{n}',
+                short_code=f'dash{n}',
+                namespace=namespace,
+                created_by=self.user,
+                click_count=10
+            )
+        refresh_dashboard_views()
+        
+        # Not visible until the next refresh
+        ShortURL.objects.create(
+            original_url='https://example.com/late',
+            short_code='dashlate',
+            namespace=namespace,
+            created_by=self.user
+        )
+        
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(f'/api/organizations/{org.id}/dashboard/')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['namespace_count'], 1)
+        self.assertEqual(response.data['link_count'], 3)
+        self.assertEqual(response.data['total_clicks'], 30)
+        self.assertEqual(response.data['links_created_per_day'][-1]['links_created'], 3)
+        self.assertIsNotNone(response.data['refreshed_at'])
+        self.assertGreaterEqual(response.data['stale_seconds'], 0)
+        
+        refresh_dashboard_views()
+        response = self.client.get(f'/api/organizations/{org.id}/dashboard/')
+        self.assertEqual(response.data['link_count'], 4)
 
 
 class InvitationTests(TestCase):
@@ -140,6 +187,30 @@ class InvitationTests(TestCase):
             email=self.new_user_email
         ).exists())
     
+    def test_invite_checks_admin_role_once(self):
+        """Test that the admin permission and the view's own check share one membership query"""
+        self.client.force_authenticate(user=self.admin_user)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                f'/api/organizations/{self.organization.id}/invite/',
+                {
+                    'email': self.new_user_email,
+                    'role': 'VIEWER'
+                }
+            )
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # Role lookups filter memberships by user id; the members prefetch
+        # filters by organization and the already-a-member check joins users
+        role_lookups = [
+            q for q in queries.captured_queries
+            if 'FROM "organizations_organizationmember"' in q['sql']
+            and '"organizations_organizationmember"."user_id" = ' in q['sql']
+            and 'JOIN' not in q['sql']
+        ]
+        self.assertEqual(len(role_lookups), 1)
+    
     def test_non_admin_cannot_invite(self):
         """Test that non-admin users cannot invite"""
         self.client.force_authenticate(user=self.editor_user)
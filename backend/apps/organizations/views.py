@@ -5,6 +5,7 @@ from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied, NotFound
 from django.utils import timezone
 from datetime import timedelta
+from django.conf import settings
 from .models import Organization, OrganizationMember, OrganizationInvitation
 from .serializers import (
     OrganizationSerializer, OrganizationCreateSerializer,
@@ -13,8 +14,11 @@ from .serializers import (
 )
 from .email import send_invitation_email
 from .utils import accept_invitation
+from apps.namespaces.models import Namespace
+from apps.urls.trending import parse_trending_k, trending_links
+from apps.urls.dashboard import parse_dashboard_days, organization_dashboard
 from core.permissions import IsOrganizationAdmin
-from core.utils import is_organization_admin
+from core.utils import is_organization_admin, clear_membership_roles
 
 
 class OrganizationViewSet(viewsets.ModelViewSet):
@@ -70,7 +74,7 @@ class OrganizationViewSet(viewsets.ModelViewSet):
         organization = self.get_object()
         
         # Check if user is admin
-        if not is_organization_admin(request.user, organization):
+        if not is_organization_admin(request.user, organization, request):
             raise PermissionDenied("Only organization admins can invite members.")
         
         serializer = InviteUserSerializer(data=request.data)
@@ -130,7 +134,7 @@ class OrganizationViewSet(viewsets.ModelViewSet):
         organization = self.get_object()
         
         # Check if user is admin
-        if not is_organization_admin(request.user, organization):
+        if not is_organization_admin(request.user, organization, request):
             raise PermissionDenied("Only organization admins can update member roles.")
         
         try:
@@ -174,12 +178,46 @@ class OrganizationViewSet(viewsets.ModelViewSet):
             
             member.role = new_role
             member.save(update_fields=['role'])
+            clear_membership_roles(request)
             
             from .serializers import OrganizationMemberSerializer
             response_serializer = OrganizationMemberSerializer(member)
             return Response(response_serializer.data, status=status.HTTP_200_OK)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=True)
+    def dashboard(self, request, pk=None):
+        """
+        Namespace count, link count, total clicks and links created per day
+        over the last ?days= days (default 30).
+        
+        Read from materialized views refreshed by the refresh_dashboards
+        command; refreshed_at and stale_seconds say how old the numbers are.
+        """
+        organization = self.get_object()
+        try:
+            days = parse_dashboard_days(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(organization_dashboard(organization.pk, days))
+    
+    @action(detail=True)
+    def trending(self, request, pk=None):
+        """
+        Top k links across the organization's namespaces over the trending
+        window (?k=, default 10), merged from per-namespace heavy-hitter summaries.
+        """
+        organization = self.get_object()
+        try:
+            k = parse_trending_k(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        namespace_ids = list(Namespace.objects.filter(organization=organization).values_list('pk', flat=True))
+        return Response({
+            'window_seconds': settings.TRENDING_WINDOW_SECONDS,
+            'results': trending_links(namespace_ids, k),
+        })
 
 
 class InvitationViewSet(viewsets.ViewSet):
@@ -222,6 +260,7 @@ class InvitationViewSet(viewsets.ViewSet):
         """Accept an invitation (requires authentication)"""
         try:
             invitation = accept_invitation(request.user, token)
+            clear_membership_roles(request)
             return Response({
                 'success': True,
                 'organization_id': invitation.organization.id,
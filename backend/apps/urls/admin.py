@@ -4,8 +4,17 @@ from .models import ShortURL
 
 @admin.register(ShortURL)
 class ShortURLAdmin(admin.ModelAdmin):
-    list_display = ['id', 'short_code', 'original_url', 'namespace', 'created_by', 'click_count', 'created_at']
+    list_display = ['id', 'short_code', 'original_url', 'namespace', 'created_by', 'total_clicks', 'created_at']
     search_fields = ['short_code', 'original_url', 'namespace__name']
     list_filter = ['created_at', 'namespace']
     ordering = ['-created_at']
-    readonly_fields = ['click_count', 'created_at', 'updated_at']
+    readonly_fields = ['total_clicks', 'created_at', 'updated_at']
+    exclude = ['click_count']
+
+    def get_queryset(self, request):
+        # Sum sharded click counters in the changelist query
+        return super().get_queryset(request).with_click_totals()
+
+    @admin.display(description='Click count', ordering='click_total')
+    def total_clicks(self, obj):
+        return obj.total_clicks
@@ -0,0 +1,235 @@
+"""
+Collision-free short code allocation
+
+Generated short codes are a keyed permutation of a sequence of indexes: the
+n-th code is encode(permute(n)). The permutation is a Feistel network over
+the keyspace of SHORT_CODE_LENGTH characters from SHORT_CODE_CHARSET,
+restricted to the keyspace by cycle-walking, so it is a bijection and two
+sequence values never map to the same code. Consecutive codes look
+unrelated without the key.
+
+Only the first keyspace / SHORT_CODE_SPARSITY sequence values are ever
+allocated. A guessed code is an allocated one with probability at most
+1 / SHORT_CODE_SPARSITY, and custom codes are kept out of that range so
+they can never collide with a future generated code.
+
+Indexes are reserved from the ShortCodeAllocator table a block at a time
+(hi/lo allocation) and handed out from a per-process pool, so most codes
+are generated without a database round trip.
+"""
+import hashlib
+import hmac
+import os
+import threading
+from functools import lru_cache
+from django.conf import settings
+from django.db import connection, transaction
+from .models import ShortCodeAllocator
+
+ALLOCATOR_NAME = 'short_url'
+
+FEISTEL_ROUNDS = 8
+
+
+class ShortCodeSpaceExhausted(Exception):
+    """Raised when every code in the allocator's range has been handed out"""
+
+
+class ShortCodePermutation:
+    """
+    Keyed bijection on the integers [0, keyspace) and the codes they encode.
+    """
+
+    def __init__(self, key, charset, length, sparsity):
+        self.charset = charset
+        self.length = length
+        self.base = len(charset)
+        self.keyspace = self.base ** length
+        self.capacity = self.keyspace // sparsity
+        self._digits = {char: value for value, char in enumerate(charset)}
+        # Balanced Feistel network on the smallest even bit width covering the keyspace
+        self._half_bits = (self.keyspace - 1).bit_length() // 2 + (self.keyspace - 1).bit_length() % 2
+        self._half_mask = (1 << self._half_bits) - 1
+        self._half_bytes = (self._half_bits + 7) // 8
+        self._round_keys = [
+            hmac.new(key, f'short-code-round-{i}'.encode(), hashlib.sha256).digest()[:16]
+            for i in range(FEISTEL_ROUNDS)
+        ]
+
+    def _round(self, i, half):
+        digest = hashlib.blake2b(half.to_bytes(self._half_bytes, 'big'), digest_size=8, key=self._round_keys[i]).digest()
+        return int.from_bytes(digest, 'big') & self._half_mask
+
+    def _feistel(self, value):
+        left, right = value >> self._half_bits, value & self._half_mask
+        for i in range(FEISTEL_ROUNDS):
+            left, right = right, left ^ self._round(i, right)
+        return (left << self._half_bits) | right
+
+    def _feistel_inverse(self, value):
+        left, right = value >> self._half_bits, value & self._half_mask
+        for i in reversed(range(FEISTEL_ROUNDS)):
+            left, right = right ^ self._round(i, left), left
+        return (left << self._half_bits) | right
+
+    def permute(self, index):
+        # Cycle-walk: re-apply the permutation until the value lands in the keyspace
+        value = self._feistel(index)
+        while value >= self.keyspace:
+            value = self._feistel(value)
+        return value
+
+    def unpermute(self, value):
+        index = self._feistel_inverse(value)
+        while index >= self.keyspace:
+            index = self._feistel_inverse(index)
+        return index
+
+    def encode(self, index):
+        """Return the short code for a sequence index."""
+        if not 0 <= index < self.capacity:
+            raise ShortCodeSpaceExhausted(f"Sequence index {index} is outside the allocator range")
+        value = self.permute(index)
+        chars = []
+        for _ in range(self.length):
+            value, digit = divmod(value, self.base)
+            chars.append(self.charset[digit])
+        return ''.join(reversed(chars))
+
+    def decode(self, short_code):
+        """
+        Return the sequence index a generated short code was made from.
+
+        Raises:
+            ValueError: If short_code could not have been generated: wrong
+            length, a character outside the charset, or outside the
+            allocator's range. No database access is needed to tell.
+        """
+        if len(short_code) != self.length:
+            raise ValueError("Short code has the wrong length")
+        value = 0
+        for char in short_code:
+            digit = self._digits.get(char)
+            if digit is None:
+                raise ValueError("Short code contains a character outside the charset")
+            value = value * self.base + digit
+        index = self.unpermute(value)
+        if index >= self.capacity:
+            raise ValueError("Short code is outside the allocator range")
+        return index
+
+
+@lru_cache(maxsize=None)
+def _permutation(key, charset, length, sparsity):
+    return ShortCodePermutation(key, charset, length, sparsity)
+
+
+def get_permutation():
+    """Return the permutation for the current settings."""
+    key = (settings.SHORT_CODE_PERMUTATION_KEY or settings.SECRET_KEY).encode()
+    return _permutation(key, settings.SHORT_CODE_CHARSET, settings.SHORT_CODE_LENGTH, settings.SHORT_CODE_SPARSITY)
+
+
+def reserve_block(size):
+    """
+    Reserve the next size indexes in the allocator table.
+
+    The row is created on first use, so an empty table starts at index 0.
+
+    Returns:
+        tuple: (first index, index after the last) of the reserved block
+    """
+    table = connection.ops.quote_name(ShortCodeAllocator._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} AS a (name, next_index) VALUES (%s, %s) '
+            f'ON CONFLICT (name) DO UPDATE SET next_index = a.next_index + EXCLUDED.next_index '
+            f'RETURNING next_index',
+            [ALLOCATOR_NAME, size]
+        )
+        end = cursor.fetchone()[0]
+    return end - size, end
+
+
+class ShortCodeBlockPool:
+    """
+    Per-process pool of reserved sequence indexes.
+
+    A block reserved inside a transaction only joins the pool once that
+    transaction commits; if it rolls back, so does the reservation, and
+    another worker may be handed the same indexes. Indexes still in the
+    pool when the process exits are never handed out.
+    """
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._pid = None
+        self._next = self._end = 0
+
+    def take(self, count):
+        """Return count unused sequence indexes, reserving a block if the pool runs dry."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # A forked worker must not hand out its parent's indexes
+                self._pid = os.getpid()
+                self._next = self._end = 0
+            available = min(count, self._end - self._next)
+            indexes = list(range(self._next, self._next + available))
+            self._next += available
+
+        missing = count - available
+        if missing:
+            start, end = reserve_block(max(self.block_size or settings.SHORT_CODE_BLOCK_SIZE, missing))
+            indexes.extend(range(start, start + missing))
+            if start + missing < end:
+                # Runs at once outside a transaction
+                transaction.on_commit(lambda: self._adopt(start + missing, end))
+        return indexes
+
+    def _adopt(self, start, end):
+        with self._lock:
+            # If another thread refilled the pool meanwhile, this remainder is wasted
+            if self._pid == os.getpid() and self._next >= self._end:
+                self._next, self._end = start, end
+
+
+short_code_pool = ShortCodeBlockPool()
+
+
+def allocate_short_codes(count):
+    """
+    Allocate count new short codes with no uniqueness lookups, and at most
+    one allocator round trip.
+
+    Raises:
+        ShortCodeSpaceExhausted: If the allocator range is used up
+    """
+    if count <= 0:
+        return []
+    permutation = get_permutation()
+    return [permutation.encode(index) for index in short_code_pool.take(count)]
+
+
+def allocate_short_code():
+    """Allocate one new short code."""
+    return allocate_short_codes(1)[0]
+
+
+def decode_short_code(short_code):
+    """
+    Return the sequence index of a generated short code.
+
+    Raises:
+        ValueError: If short_code is not a well-formed generated code
+    """
+    return get_permutation().decode(short_code)
+
+
+def is_allocator_code(short_code):
+    """True if short_code lies in the range reserved for generated codes."""
+    try:
+        decode_short_code(short_code)
+    except ValueError:
+        return False
+    return True
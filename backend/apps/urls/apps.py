@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class UrlsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.urls'
+
+    def ready(self):
+        # Register signal handlers that invalidate the redirect caches
+        from . import signals  # noqa: F401
+        # Register checks for settings that need a shared cache
+        from . import checks  # noqa: F401
@@ -0,0 +1,203 @@
+"""
+Bloom filter over existing short codes, used to answer "definitely absent"
+without a database query
+"""
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from .models import ShortURL
+
+logger = logging.getLogger(__name__)
+
+# Codes are streamed from the database in chunks of this size on rebuild
+SCAN_CHUNK_SIZE = 10000
+
+# Minimum number of codes a freshly built filter is sized for
+MIN_CAPACITY = 100000
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter for strings.
+
+    Sized for capacity items at the given false-positive rate; adding more
+    than capacity items raises the false-positive rate.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item):
+        # Double hashing: k positions derived from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class ShortCodeFilter:
+    """
+    Per-worker Bloom filter of every short code in the database.
+
+    The filter is built from a streaming scan in a background thread the
+    first time it is used, and answers "maybe present" until then. It is
+    kept current by the save signal in this worker and, for codes saved by
+    other workers, by re-reading recently updated rows on the same
+    background thread at most every sync_interval seconds, so a lookup
+    never waits on a query. Deleted codes stay in the filter until the next
+    full rebuild every rebuild_interval seconds, which only costs false
+    positives.
+    """
+
+    # Rows updated this long before the previous sync are read again, so
+    # transactions that committed late are not missed
+    SYNC_OVERLAP = timedelta(seconds=30)
+
+    def __init__(self, error_rate, sync_interval, rebuild_interval):
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self._bloom = None
+        self._built_at = None
+        self._synced_at = None
+        self._last_sync_check = 0
+        self._pending_adds = None
+        self._background_pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._bloom is not None
+
+    def might_contain(self, short_code):
+        """
+        Return False only if short_code is definitely not in the database.
+        """
+        if not self.ready:
+            self._start_background(self.rebuild)
+            return True
+
+        if time.monotonic() - self._built_at > self.rebuild_interval:
+            self._start_background(self.rebuild)
+        elif time.monotonic() - self._last_sync_check >= self.sync_interval:
+            self._start_background(self.sync)
+        return short_code in self._bloom
+
+    def add(self, short_code):
+        """Record a short code that was just saved."""
+        with self._lock:
+            if self._pending_adds is not None:
+                # A rebuild is scanning; replay the code into the new filter
+                self._pending_adds.append(short_code)
+            if self._bloom is not None:
+                self._bloom.add(short_code)
+
+    def rebuild(self):
+        """Build a new filter from a streaming scan of every short code."""
+        with self._lock:
+            self._pending_adds = []
+        started_at = timezone.now()
+
+        try:
+            capacity = max(MIN_CAPACITY, ShortURL.objects.count() * 2)
+            bloom = BloomFilter(capacity, self.error_rate)
+            short_codes = ShortURL.objects.order_by().values_list('short_code', flat=True)
+            for short_code in short_codes.iterator(chunk_size=SCAN_CHUNK_SIZE):
+                bloom.add(short_code)
+        except Exception:
+            with self._lock:
+                self._pending_adds = None
+            raise
+
+        with self._lock:
+            for short_code in self._pending_adds:
+                bloom.add(short_code)
+            self._pending_adds = None
+            self._bloom = bloom
+            self._built_at = time.monotonic()
+            self._synced_at = started_at
+            self._last_sync_check = time.monotonic()
+
+    def sync(self):
+        """Add codes saved since the last sync or rebuild, from any worker."""
+        started_at = timezone.now()
+        recent = ShortURL.objects.filter(
+            updated_at__gte=self._synced_at - self.SYNC_OVERLAP
+        ).order_by().values_list('short_code', flat=True)
+        bloom = self._bloom
+        for short_code in recent.iterator(chunk_size=SCAN_CHUNK_SIZE):
+            # The overlap re-reads codes; only count genuinely new ones
+            if short_code not in bloom:
+                bloom.add(short_code)
+        self._synced_at = started_at
+        self._last_sync_check = time.monotonic()
+        if bloom.count > bloom.capacity:
+            self.rebuild()
+
+    def _start_background(self, task):
+        # One background rebuild or sync per worker process at a time
+        pid = os.getpid()
+        with self._lock:
+            if self._background_pid == pid:
+                return
+            self._background_pid = pid
+        threading.Thread(target=self._run_background, args=(task,), name='short-code-bloom', daemon=True).start()
+
+    def _run_background(self, task):
+        try:
+            close_old_connections()
+            task()
+        except Exception:
+            logger.exception("Failed to update the short code Bloom filter")
+        finally:
+            close_old_connections()
+            with self._lock:
+                self._background_pid = None
+
+
+short_code_filter = ShortCodeFilter(
+    error_rate=settings.SHORT_CODE_BLOOM_ERROR_RATE,
+    sync_interval=settings.SHORT_CODE_BLOOM_SYNC_INTERVAL,
+    rebuild_interval=settings.SHORT_CODE_BLOOM_REBUILD_INTERVAL,
+)
+
+
+def short_code_may_exist(short_code):
+    """
+    Return False only if short_code is definitely not in the database.
+
+    Always True when SHORT_CODE_BLOOM_FILTER is disabled.
+    """
+    if not settings.SHORT_CODE_BLOOM_FILTER:
+        return True
+    return short_code_filter.might_contain(short_code)
+
+
+async def ashort_code_may_exist(short_code):
+    """
+    Async version of short_code_may_exist.
+
+    Lookups only read memory, with rebuilds and syncs on the background
+    thread, so this runs on the event loop.
+    """
+    return short_code_may_exist(short_code)
@@ -0,0 +1,367 @@
+"""
+Set-based creation, update and deletion of many short URLs in one request
+"""
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, PermissionDenied
+from apps.namespaces.models import Namespace
+from core.serializers import violated_unique_field
+from core.utils import EDITOR_ROLES, get_membership_roles
+from .models import ShortURL, ClickCountShard
+from .serializers import BulkShortURLItemSerializer, BulkDestinationSerializer
+from .cache import ResolvedShortURL
+from .canonical import url_digest
+from .allocator import allocate_short_codes, is_allocator_code, ShortCodeSpaceExhausted
+from .signals import ANALYTICS_MODELS, announce_created_short_urls, announce_bulk_changes
+
+
+class BulkCreateConflict(Exception):
+    """Raised when concurrent requests keep inserting the same URLs or codes"""
+
+
+def _error(errors):
+    return {'status': 'error', 'errors': errors}
+
+
+def bulk_create_short_urls(user, items, request=None):
+    """
+    Validate and insert a batch of short URLs.
+
+    Permissions are checked once per distinct namespace, duplicate
+    original_urls (by canonical digest) and short_codes are found with one
+    IN query each, and
+    the valid items are inserted with a single bulk_create. Invalid items
+    do not stop the others from being created.
+
+    Args:
+        user: The user creating the short URLs, or None for operator
+            imports that skip the permission check and record no creator
+        items: List of dicts with original_url, namespace and optional short_code
+        request: Request whose membership map to consult, see get_membership_roles
+
+    Returns:
+        list: One result per item, in input order: {'status': 'created',
+        'short_url': {...}} or {'status': 'error', 'errors': {...}}
+
+    Raises:
+        BulkCreateConflict: If the insert keeps conflicting with concurrent writes
+    """
+    results = [None] * len(items)
+    valid = {}
+    for index, item in enumerate(items):
+        serializer = BulkShortURLItemSerializer(data=item)
+        if serializer.is_valid():
+            valid[index] = serializer.validated_data
+        else:
+            results[index] = _error(serializer.errors)
+
+    # A concurrent request may insert a URL or code between the checks and
+    # the insert; the unique constraints reject the batch and it is checked
+    # again, now seeing those rows.
+    for _ in range(2):
+        try:
+            return _create_valid(user, valid, list(results), request)
+        except IntegrityError:
+            continue
+    raise BulkCreateConflict("Short URLs were created concurrently with this request. Please retry.")
+
+
+def _create_valid(user, valid, results, request):
+    namespaces = Namespace.objects.filter(pk__in={attrs['namespace'] for attrs in valid.values()})
+    namespaces = {namespace.pk: namespace for namespace in namespaces}
+    roles = get_membership_roles(user, request) if user is not None else {}
+
+    digests = {index: url_digest(attrs['original_url']) for index, attrs in valid.items()}
+    existing_urls = {
+        bytes(digest): f'{namespace_name}/{short_code}'
+        for digest, namespace_name, short_code in ShortURL.objects.filter(
+            original_url_digest__in=set(digests.values())
+        ).values_list('original_url_digest', 'namespace__name', 'short_code')
+    }
+    custom_codes = {attrs['short_code'] for attrs in valid.values() if attrs.get('short_code')}
+    taken_codes = set(
+        ShortURL.objects.filter(short_code__in=custom_codes).values_list('short_code', flat=True)
+    ) if custom_codes else set()
+
+    accepted = []
+    seen_urls, seen_codes = set(), set()
+    for index, attrs in valid.items():
+        errors = {}
+        namespace = namespaces.get(attrs['namespace'])
+        if namespace is None:
+            errors['namespace'] = [f'Invalid pk "{attrs["namespace"]}" - object does not exist.']
+        elif user is not None and roles.get(namespace.organization_id) not in EDITOR_ROLES:
+            errors['namespace'] = ['You must be an admin or editor to create URLs.']
+
+        original_url, digest = attrs['original_url'], digests[index]
+        if digest in existing_urls:
+            errors['original_url'] = [f'This URL has already been shortened as: {existing_urls[digest]}']
+        elif digest in seen_urls:
+            errors['original_url'] = ['This URL appears more than once in the request.']
+
+        short_code = attrs.get('short_code')
+        if short_code:
+            if short_code in taken_codes:
+                errors['short_code'] = ['This short code is already taken. Please choose a different one.']
+            elif short_code in seen_codes:
+                errors['short_code'] = ['This short code appears more than once in the request.']
+            elif is_allocator_code(short_code):
+                errors['short_code'] = ['This short code is reserved for generated codes. Please choose a different one.']
+
+        if errors:
+            results[index] = _error(errors)
+            continue
+        seen_urls.add(digest)
+        if short_code:
+            seen_codes.add(short_code)
+        accepted.append((index, namespace, original_url, digest, short_code))
+
+    try:
+        generated = iter(allocate_short_codes(sum(1 for *_, short_code in accepted if not short_code)))
+    except ShortCodeSpaceExhausted:
+        for index, *_ in accepted:
+            results[index] = _error({'short_code': ['Unable to generate unique short code. Please try again.']})
+        return results
+
+    short_urls = [
+        ShortURL(
+            original_url=original_url,
+            original_url_digest=digest,
+            short_code=short_code or next(generated),
+            namespace=namespace,
+            created_by=user
+        )
+        for _, namespace, original_url, digest, short_code in accepted
+    ]
+    with transaction.atomic():
+        ShortURL.objects.bulk_create(short_urls)
+    announce_created_short_urls((short_url.namespace.name, short_url.short_code) for short_url in short_urls)
+
+    for (index, *_), short_url in zip(accepted, short_urls):
+        results[index] = {
+            'status': 'created',
+            'short_url': {
+                'id': short_url.pk,
+                'original_url': short_url.original_url,
+                'short_code': short_url.short_code,
+                'namespace': short_url.namespace_id,
+                'namespace_name': short_url.namespace.name,
+                'created_at': short_url.created_at,
+            },
+        }
+    return results
+
+
+def _target_rows(user, request, ids=None, namespace_id=None, target_organization_id=None, after_pk=None, limit=None):
+    """
+    Load the short URLs a bulk action applies to and check the user may edit
+    them against the user's membership map, see get_membership_roles.
+
+    Short URLs outside the user's organizations are left out as if they did
+    not exist. With limit, only the first limit short URLs by id after
+    after_pk are loaded, so a whole namespace can be read in batches.
+
+    Returns:
+        tuple: (list of (pk, short_code, namespace_id, namespace_name,
+        original_url) rows, sorted requested ids that were not found)
+
+    Raises:
+        NotFound: If namespace_id, or the target of a move, is not in one
+            of the user's organizations
+        PermissionDenied: If the user is not an admin or editor of one of
+            the organizations
+    """
+    queryset = ShortURL.objects.all()
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    if namespace_id is not None:
+        queryset = queryset.filter(namespace_id=namespace_id)
+    if after_pk is not None:
+        queryset = queryset.filter(pk__gt=after_pk)
+    if limit is not None:
+        queryset = queryset.order_by('pk')[:limit]
+    rows = list(queryset.values_list(
+        'pk', 'short_code', 'namespace_id', 'namespace__name', 'original_url', 'namespace__organization_id'
+    ))
+
+    roles = get_membership_roles(user, request)
+    filter_organization_id = None
+    if namespace_id is not None:
+        filter_organization_id = Namespace.objects.filter(pk=namespace_id).values_list(
+            'organization_id', flat=True
+        ).first()
+
+    if namespace_id is not None and filter_organization_id not in roles:
+        raise NotFound("Namespace not found")
+    if target_organization_id is not None and target_organization_id not in roles:
+        raise NotFound("Namespace not found")
+    visible = [row for row in rows if row[5] in roles]
+    affected_organization_ids = {row[5] for row in visible}
+    if target_organization_id is not None:
+        affected_organization_ids.add(target_organization_id)
+    if any(roles.get(organization_id) not in EDITOR_ROLES for organization_id in affected_organization_ids):
+        raise PermissionDenied("You must be an admin or editor of every organization involved.")
+
+    not_found = sorted(set(ids) - {row[0] for row in visible}) if ids is not None else []
+    return [row[:5] for row in visible], not_found
+
+
+def bulk_delete_short_urls(user, ids=None, namespace_id=None, request=None):
+    """
+    Delete the short URLs with the given ids, or every short URL in a namespace.
+
+    The short URLs and their click data go in one DELETE ... WHERE
+    short_url_id = ANY(...) per table, in one transaction. A namespace is
+    emptied BULK_ACTION_MAX_ITEMS short URLs per transaction, so the arrays
+    stay bounded however large it is; if a batch fails, earlier batches
+    stay deleted.
+
+    Returns:
+        dict: deleted count and not_found ids
+    """
+    if namespace_id is None:
+        rows, not_found = _target_rows(user, request, ids=ids)
+        return {'deleted': _delete_rows(rows), 'not_found': not_found}
+
+    deleted = 0
+    last_pk = 0
+    while True:
+        rows, _ = _target_rows(
+            user, request, namespace_id=namespace_id, after_pk=last_pk, limit=settings.BULK_ACTION_MAX_ITEMS
+        )
+        if not rows:
+            return {'deleted': deleted, 'not_found': []}
+        deleted += _delete_rows(rows)
+        last_pk = rows[-1][0]
+
+
+def _delete_rows(rows):
+    # Rows as returned by _target_rows; returns the number of short URLs deleted
+    pks = [pk for pk, *_ in rows]
+    deleted = 0
+    if pks:
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Click data is not cascaded in the database
+            for model in [ClickCountShard, *ANALYTICS_MODELS]:
+                cursor.execute(
+                    f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)} WHERE short_url_id = ANY(%s)',
+                    [pks]
+                )
+            cursor.execute(
+                f'DELETE FROM {connection.ops.quote_name(ShortURL._meta.db_table)} WHERE id = ANY(%s)',
+                [pks]
+            )
+            deleted = cursor.rowcount
+            announce_bulk_changes(pks, [(namespace_name, short_code) for _, short_code, _, namespace_name, _ in rows])
+    return deleted
+
+
+def bulk_move_short_urls(user, ids, namespace_id, request=None):
+    """
+    Move short URLs to another namespace with one UPDATE ... WHERE id = ANY(...).
+
+    The user must be an admin or editor of the source and target
+    organizations. Click history already rolled up stays with the old
+    namespace.
+
+    Returns:
+        dict: moved count and not_found ids
+
+    Raises:
+        NotFound: If the target namespace does not exist or is not visible
+    """
+    target = Namespace.objects.filter(pk=namespace_id).values_list('organization_id', 'name').first()
+    if target is None:
+        raise NotFound("Namespace not found")
+    target_organization_id, target_name = target
+    rows, not_found = _target_rows(user, request, ids=ids, target_organization_id=target_organization_id)
+
+    pks = [pk for pk, *_ in rows]
+    moved = 0
+    if pks:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {connection.ops.quote_name(ShortURL._meta.db_table)} '
+                f'SET namespace_id = %s, updated_at = %s WHERE id = ANY(%s)',
+                [namespace_id, timezone.now(), pks]
+            )
+            moved = cursor.rowcount
+            announce_bulk_changes(
+                pks,
+                [(namespace_name, short_code) for _, short_code, _, namespace_name, _ in rows],
+                [
+                    ((target_name, short_code), ResolvedShortURL(pk, original_url, namespace_id))
+                    for pk, short_code, _, _, original_url in rows
+                ],
+            )
+    return {'moved': moved, 'not_found': not_found}
+
+
+def bulk_update_destinations(user, updates, request=None):
+    """
+    Point short URLs at new destinations with one UPDATE ... FROM (VALUES ...).
+
+    When links in the request swap destinations, the digests being handed
+    over are cleared by one more UPDATE first, in the same transaction.
+
+    Args:
+        updates: List of dicts with id and original_url
+
+    Returns:
+        dict: updated count and not_found ids
+
+    Raises:
+        ValueError: With a message for the client if an item is invalid or a
+            destination has already been shortened
+    """
+    serializer = BulkDestinationSerializer(data=updates, many=True)
+    if not serializer.is_valid():
+        errors = [f'{index}: {error}' for index, error in enumerate(serializer.errors) if error]
+        raise ValueError(f"Invalid updates: {'; '.join(errors)}")
+    destinations = {item['id']: item['original_url'] for item in serializer.validated_data}
+    digests = {pk: url_digest(original_url) for pk, original_url in destinations.items()}
+    if len(set(digests.values())) != len(digests):
+        raise ValueError("The same destination URL appears more than once in the request.")
+
+    rows, not_found = _target_rows(user, request, ids=list(destinations))
+    pks = [pk for pk, *_ in rows]
+    # Links taking over a destination another link in the request gives up,
+    # as in a swap; unique constraints are checked row by row, not per statement
+    new_digests = {digests[pk] for pk in pks}
+    handed_over = [pk for pk, *_, original_url in rows if url_digest(original_url) in new_digests]
+    updated = 0
+    if pks:
+        values = ', '.join(['(%s::bigint, %s, %s::bytea)'] * len(pks))
+        params = [value for pk in pks for value in (pk, destinations[pk], digests[pk])]
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                if handed_over:
+                    # Release the destinations being handed over first
+                    cursor.execute(
+                        f'UPDATE {connection.ops.quote_name(ShortURL._meta.db_table)} '
+                        f'SET original_url_digest = NULL WHERE id = ANY(%s)',
+                        [handed_over]
+                    )
+                cursor.execute(
+                    f'UPDATE {connection.ops.quote_name(ShortURL._meta.db_table)} AS s '
+                    f'SET original_url = v.url, original_url_digest = v.digest, updated_at = %s '
+                    f'FROM (VALUES {values}) AS v(id, url, digest) WHERE s.id = v.id',
+                    [timezone.now(), *params]
+                )
+                updated = cursor.rowcount
+                announce_bulk_changes(pks, [], [
+                    ((namespace_name, short_code), ResolvedShortURL(pk, destinations[pk], row_namespace_id))
+                    for pk, short_code, row_namespace_id, namespace_name, _ in rows
+                ])
+        except IntegrityError as e:
+            if violated_unique_field(ShortURL, e) != 'original_url_digest':
+                raise
+            taken = ShortURL.objects.filter(
+                original_url_digest__in=[digests[pk] for pk in pks]
+            ).exclude(pk__in=pks).values_list('original_url', 'namespace__name', 'short_code').first()
+            if taken is None:
+                # The conflicting link changed again before it could be named
+                raise ValueError("Destination URLs were changed concurrently with this request. Please retry.")
+            raise ValueError(f"{taken[0]} has already been shortened as: {taken[1]}/{taken[2]}")
+    return {'updated': updated, 'not_found': not_found}
@@ -0,0 +1,404 @@
+"""
+Resolution caches for the public redirect endpoint
+"""
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+from django.conf import settings
+from django.core.cache import caches
+from .models import ShortURL
+from .bloom import short_code_may_exist, ashort_code_may_exist
+from .snapshot import snapshot_lookup
+
+
+# Marker stored in the shared cache for lookups that found nothing
+NOT_FOUND = 'NOT_FOUND'
+
+# What a redirect needs to know about a short URL once it has been resolved
+ResolvedShortURL = namedtuple('ResolvedShortURL', ['pk', 'original_url', 'namespace_id'])
+
+# Cached namespace name -> id mapping, so lookups can filter on namespace_id.
+# Only trusted while the shared namespace generation is unchanged.
+ResolvedNamespace = namedtuple('ResolvedNamespace', ['pk', 'generation'])
+
+# Shared cache key of the token replaced whenever a namespace is renamed or deleted
+NAMESPACE_GENERATION_KEY = 'redirect:namespace-generation'
+
+
+class ResolutionCache:
+    """
+    Bounded in-process LRU cache with a per-entry TTL.
+
+    Values are namedtuples with a pk field (ResolvedShortURL for redirect
+    resolutions, ResolvedNamespace for namespace ids). The cache lives in the worker process, so
+    invalidation from signals only reaches the current worker; other workers
+    pick up changes once the TTL expires.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._keys_by_pk = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the cached value for key, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Store value under key, evicting the least recently used entries."""
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._keys_by_pk[value.pk] = key
+
+            while len(self._entries) > self.max_size:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+
+    def invalidate_pk(self, pk):
+        """Drop the entry for the short URL with the given primary key."""
+        with self._lock:
+            key = self._keys_by_pk.get(pk)
+            if key is not None:
+                self._remove(key)
+
+    def invalidate_namespace(self, namespace_id):
+        """Drop every entry that belongs to the given namespace."""
+        with self._lock:
+            stale_keys = [
+                key for key, (value, _) in self._entries.items()
+                if value.namespace_id == namespace_id
+            ]
+            for key in stale_keys:
+                self._remove(key)
+
+    def clear(self):
+        """Drop all entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_pk.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return a snapshot of the cache size and hit/miss counters."""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def _remove(self, key):
+        value, _ = self._entries.pop(key)
+        if self._keys_by_pk.get(value.pk) == key:
+            del self._keys_by_pk[value.pk]
+
+
+resolution_cache = ResolutionCache(
+    max_size=settings.REDIRECT_CACHE_SIZE,
+    ttl=settings.REDIRECT_CACHE_TTL,
+)
+
+namespace_cache = ResolutionCache(
+    max_size=settings.REDIRECT_CACHE_SIZE,
+    ttl=settings.REDIRECT_CACHE_TTL,
+)
+
+
+def get_shared_cache():
+    """Return the Django cache backing the shared resolution tier"""
+    return caches[settings.REDIRECT_SHARED_CACHE_ALIAS]
+
+
+def shared_cache_key(namespace_name, short_code):
+    """
+    Build the shared cache key for a namespace name and short code.
+
+    Names are hashed so keys stay short and safe for every cache backend.
+    """
+    digest = hashlib.md5(f'{namespace_name}\0{short_code}'.encode()).hexdigest()
+    return f'redirect:{digest}'
+
+
+def invalidate_shared(keys):
+    """
+    Delete shared cache entries for (namespace_name, short_code) pairs.
+
+    Args:
+        keys: Iterable of (namespace_name, short_code) tuples
+    """
+    cache_keys = [shared_cache_key(namespace_name, short_code) for namespace_name, short_code in keys]
+    if cache_keys:
+        get_shared_cache().delete_many(cache_keys)
+
+
+def pin_shared(stale_keys, current=None, resolutions=()):
+    """
+    Override the redirect snapshot for keys that changed since it was exported.
+
+    Snapshot entries are only replaced by the next export, so after a commit
+    the changed keys are pinned in the shared cache for
+    REDIRECT_SNAPSHOT_MAX_AGE seconds: stale keys as negative entries, and
+    the current key with its new resolution. Does nothing when snapshots are
+    disabled.
+
+    Args:
+        stale_keys: (namespace_name, short_code) tuples that no longer resolve
+        current: Optional ((namespace_name, short_code), ResolvedShortURL)
+        resolutions: More such pairs, for short URLs changed in bulk
+    """
+    if not settings.REDIRECT_SNAPSHOT_PATH:
+        return
+    entries = {shared_cache_key(*key): NOT_FOUND for key in stale_keys}
+    if current is not None:
+        resolutions = [current, *resolutions]
+    for key, resolved in resolutions:
+        entries[shared_cache_key(*key)] = tuple(resolved)
+    if entries:
+        get_shared_cache().set_many(entries, settings.REDIRECT_SNAPSHOT_MAX_AGE)
+
+
+def clear_redirect_caches():
+    """Empty both the in-process and the shared resolution tiers"""
+    resolution_cache.clear()
+    namespace_cache.clear()
+    get_shared_cache().clear()
+
+
+def lookup_cached(namespace_name, short_code):
+    """
+    Look a resolution up in the in-process cache, the shared cache, then the
+    redirect snapshot.
+
+    Returns:
+        ResolvedShortURL on a hit, NOT_FOUND on a negative hit, None on a miss
+    """
+    key = (namespace_name, short_code)
+    resolved = resolution_cache.get(key)
+    if resolved is not None:
+        return resolved
+
+    cached = get_shared_cache().get(shared_cache_key(namespace_name, short_code))
+    if cached == NOT_FOUND:
+        return cached
+    if cached is None:
+        snapshot_row = snapshot_lookup(namespace_name, short_code)
+        return ResolvedShortURL(*snapshot_row) if snapshot_row else None
+
+    resolved = ResolvedShortURL(*cached)
+    resolution_cache.set(key, resolved)
+    return resolved
+
+
+def store_resolution(namespace_name, short_code, resolved):
+    """
+    Cache the database answer for a lookup in both tiers.
+
+    Args:
+        resolved: ResolvedShortURL, or None to store a negative entry for
+            REDIRECT_NEGATIVE_CACHE_TTL seconds
+    """
+    shared_key = shared_cache_key(namespace_name, short_code)
+    if resolved is None:
+        get_shared_cache().set(shared_key, NOT_FOUND, settings.REDIRECT_NEGATIVE_CACHE_TTL)
+        return
+
+    get_shared_cache().set(shared_key, tuple(resolved), settings.REDIRECT_SHARED_CACHE_TTL)
+    resolution_cache.set((namespace_name, short_code), resolved)
+
+
+def _new_generation():
+    return uuid.uuid4().hex
+
+
+def namespace_generation():
+    """
+    Return the current namespace generation token from the shared cache.
+
+    Name -> id mappings are cached per worker, so a rename or delete in one
+    worker cannot reach the others' caches directly; instead it replaces this
+    token, and mappings learnt under an older token are ignored. A token lost
+    from the cache is replaced by a new one, which only costs a re-lookup.
+    """
+    return get_shared_cache().get_or_set(NAMESPACE_GENERATION_KEY, _new_generation, None)
+
+
+async def anamespace_generation():
+    """Async version of namespace_generation"""
+    return await get_shared_cache().aget_or_set(NAMESPACE_GENERATION_KEY, _new_generation, None)
+
+
+def bump_namespace_generation():
+    """Invalidate every worker's cached namespace ids after a rename or delete"""
+    get_shared_cache().set(NAMESPACE_GENERATION_KEY, _new_generation(), None)
+
+
+def cached_namespace_id(namespace_name, generation):
+    """
+    Return the namespace id for a name if this worker learnt it under the
+    given generation, else None.
+    """
+    resolved = namespace_cache.get(namespace_name)
+    if resolved is None or resolved.generation != generation:
+        return None
+    return resolved.pk
+
+
+def remember_namespace_id(namespace_name, namespace_id, generation):
+    """
+    Cache a namespace name -> id mapping learnt from a lookup.
+
+    Args:
+        generation: The namespace generation read before the lookup, so a
+            rename committed meanwhile leaves the mapping already stale
+    """
+    namespace_cache.set(namespace_name, ResolvedNamespace(namespace_id, generation))
+
+
+def _resolution_queryset(namespace_name, short_code, namespace_id):
+    # With a known namespace id the lookup probes the short_code unique index
+    # and checks namespace_id without touching the namespace table; otherwise
+    # join on the namespace name once and learn the id from the result.
+    if namespace_id is not None:
+        lookup = {'namespace_id': namespace_id, 'short_code': short_code}
+    else:
+        lookup = {'namespace__name': namespace_name, 'short_code': short_code}
+    # No ORDER BY: the default -created_at ordering would force a heap fetch
+    return ShortURL.objects.filter(**lookup).order_by().values_list('pk', 'original_url', 'namespace_id')
+
+
+def fetch_resolution(namespace_name, short_code):
+    """Load a resolution from the database, or None if the short URL does not exist"""
+    generation = namespace_generation()
+    namespace_id = cached_namespace_id(namespace_name, generation)
+    try:
+        row = _resolution_queryset(namespace_name, short_code, namespace_id).get()
+    except ShortURL.DoesNotExist:
+        return None
+    resolved = ResolvedShortURL(*row)
+    remember_namespace_id(namespace_name, resolved.namespace_id, generation)
+    return resolved
+
+
+def resolve_short_url(namespace_name, short_code):
+    """
+    Resolve a namespace name and short code to the short URL they point at.
+
+    Lookups go through the in-process cache, then the shared cache, then the
+    database. Lookups that find nothing are remembered in the shared cache
+    for REDIRECT_NEGATIVE_CACHE_TTL seconds so repeated 404s skip the query,
+    and codes the Bloom filter rules out never reach the database.
+
+    Args:
+        namespace_name: The namespace name
+        short_code: The short code identifier
+
+    Returns:
+        ResolvedShortURL or None if no such short URL exists
+    """
+    cached = lookup_cached(namespace_name, short_code)
+    if cached is not None:
+        return None if cached == NOT_FOUND else cached
+
+    # Not cached negatively: the filter may lag codes saved by other workers
+    if not short_code_may_exist(short_code):
+        return None
+
+    resolved = fetch_resolution(namespace_name, short_code)
+    store_resolution(namespace_name, short_code, resolved)
+    return resolved
+
+
+async def alookup_cached(namespace_name, short_code):
+    """
+    Async version of lookup_cached.
+
+    In-process cache hits are answered without leaving the event loop.
+    """
+    key = (namespace_name, short_code)
+    resolved = resolution_cache.get(key)
+    if resolved is not None:
+        return resolved
+
+    cached = await get_shared_cache().aget(shared_cache_key(namespace_name, short_code))
+    if cached == NOT_FOUND:
+        return cached
+    if cached is None:
+        # Memory-mapped and in the page cache, so safe to read on the event loop
+        snapshot_row = snapshot_lookup(namespace_name, short_code)
+        return ResolvedShortURL(*snapshot_row) if snapshot_row else None
+
+    resolved = ResolvedShortURL(*cached)
+    resolution_cache.set(key, resolved)
+    return resolved
+
+
+async def astore_resolution(namespace_name, short_code, resolved):
+    """Async version of store_resolution"""
+    shared_key = shared_cache_key(namespace_name, short_code)
+    if resolved is None:
+        await get_shared_cache().aset(shared_key, NOT_FOUND, settings.REDIRECT_NEGATIVE_CACHE_TTL)
+        return
+
+    await get_shared_cache().aset(shared_key, tuple(resolved), settings.REDIRECT_SHARED_CACHE_TTL)
+    resolution_cache.set((namespace_name, short_code), resolved)
+
+
+async def afetch_resolution(namespace_name, short_code):
+    """Async version of fetch_resolution"""
+    generation = await anamespace_generation()
+    namespace_id = cached_namespace_id(namespace_name, generation)
+    try:
+        row = await _resolution_queryset(namespace_name, short_code, namespace_id).aget()
+    except ShortURL.DoesNotExist:
+        return None
+    resolved = ResolvedShortURL(*row)
+    remember_namespace_id(namespace_name, resolved.namespace_id, generation)
+    return resolved
+
+
+async def aresolve_short_url(namespace_name, short_code):
+    """
+    Async version of resolve_short_url for the ASGI redirect path.
+
+    The shared tier and the database are read with Django's async cache and
+    ORM calls.
+    """
+    cached = await alookup_cached(namespace_name, short_code)
+    if cached is not None:
+        return None if cached == NOT_FOUND else cached
+
+    if not await ashort_code_may_exist(short_code):
+        return None
+
+    resolved = await afetch_resolution(namespace_name, short_code)
+    await astore_resolution(namespace_name, short_code, resolved)
+    return resolved
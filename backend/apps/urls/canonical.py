@@ -0,0 +1,49 @@
+"""
+Canonical form and digest of destination URLs
+
+Global URL uniqueness is enforced on a 32-byte SHA-256 digest of the
+canonical URL instead of on the URL itself, so the unique index holds
+fixed-width keys rather than strings of up to 2 KB, and spellings of the
+same URL that only differ in host case, an explicit default port or the
+order of query parameters count as duplicates.
+"""
+import hashlib
+from urllib.parse import urlsplit, urlunsplit
+from django.conf import settings
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonicalize_url(url):
+    """
+    Return the canonical form of a URL used for duplicate detection.
+
+    Lowercases the scheme and host, drops the scheme's default port, turns
+    an empty path into '/' and, with URL_CANONICAL_SORT_QUERY, orders query
+    parameters by name (repeated names keep their relative order). Path,
+    query values and fragment are kept as written.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+
+    userinfo, _, hostport = parts.netloc.rpartition('@')
+    netloc = hostport.lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port is not None and port == DEFAULT_PORTS.get(scheme):
+        netloc = netloc[:netloc.rindex(':')]
+    if userinfo:
+        netloc = f'{userinfo}@{netloc}'
+
+    query = parts.query
+    if query and settings.URL_CANONICAL_SORT_QUERY:
+        query = '&'.join(sorted(query.split('&'), key=lambda pair: pair.split('=', 1)[0]))
+
+    return urlunsplit((scheme, netloc, parts.path or '/', query, parts.fragment))
+
+
+def url_digest(url):
+    """Return the 32-byte digest of a URL's canonical form."""
+    return hashlib.sha256(canonicalize_url(url).encode()).digest()
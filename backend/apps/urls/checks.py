@@ -0,0 +1,60 @@
+"""
+System checks for settings that only work with a shared cache
+"""
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Backends whose entries never reach the other workers
+PROCESS_LOCAL_CACHE_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def _shared_cache_is_process_local():
+    alias = settings.REDIRECT_SHARED_CACHE_ALIAS
+    return settings.CACHES.get(alias, {}).get('BACKEND') in PROCESS_LOCAL_CACHE_BACKENDS
+
+
+@register()
+def check_redirect_snapshot_cache(app_configs, **kwargs):
+    """
+    Reject a redirect snapshot without a shared cache.
+
+    Edits and deletes made after an export are only hidden from the
+    snapshot by pins in the shared cache; with a per-process cache the
+    other workers would keep serving the exported URLs.
+    """
+    if not settings.REDIRECT_SNAPSHOT_PATH or not _shared_cache_is_process_local():
+        return []
+    return [Error(
+        'REDIRECT_SNAPSHOT_PATH requires a cache shared by every worker.',
+        hint=(
+            f"The '{settings.REDIRECT_SHARED_CACHE_ALIAS}' cache is per process, so edits and deletes "
+            "would not override the snapshot in other workers. Point CACHE_BACKEND at Redis or "
+            "memcached, or leave REDIRECT_SNAPSHOT_PATH empty."
+        ),
+        id='urls.E001',
+    )]
+
+
+@register()
+def check_trending_links_cache(app_configs, **kwargs):
+    """
+    Reject trending links without a shared cache.
+
+    Workers publish their summaries to the shared cache and the endpoints
+    merge what they find there; with a per-process cache the results would
+    silently cover only the worker answering the request.
+    """
+    if not settings.TRENDING_LINKS or not _shared_cache_is_process_local():
+        return []
+    return [Error(
+        'TRENDING_LINKS requires a cache shared by every worker.',
+        hint=(
+            f"The '{settings.REDIRECT_SHARED_CACHE_ALIAS}' cache is per process, so trending links "
+            "would only count the clicks of the worker answering the request. Point CACHE_BACKEND "
+            "at Redis or memcached, or turn TRENDING_LINKS off."
+        ),
+        id='urls.E002',
+    )]
@@ -0,0 +1,372 @@
+"""
+Click counting for the public redirect endpoint
+"""
+import atexit
+import logging
+import os
+import random
+import threading
+from collections import Counter
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, close_old_connections, models
+from apps.namespaces.models import Namespace
+from .models import ShortURL, ClickCountShard
+from .bloom import short_code_may_exist, ashort_code_may_exist
+from .cache import (
+    NOT_FOUND, ResolvedShortURL,
+    namespace_generation, anamespace_generation, cached_namespace_id, remember_namespace_id,
+    lookup_cached, store_resolution, resolve_short_url,
+    alookup_cached, astore_resolution, aresolve_short_url,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def apply_increments(increments):
+    """
+    Add pending clicks to the click counters in a single statement.
+
+    With CLICK_COUNTER_SHARDS set, each short URL's clicks are upserted into
+    one random shard of the narrow counter table; otherwise click_count is
+    updated with UPDATE ... FROM (VALUES ...).
+
+    Args:
+        increments: Mapping of ShortURL primary key to number of new clicks
+    """
+    if not increments:
+        return
+
+    # Sorted so concurrent flushes from different workers lock rows in the same order
+    rows = sorted(increments.items())
+    if settings.CLICK_COUNTER_SHARDS:
+        _increment_shards(rows, settings.CLICK_COUNTER_SHARDS)
+    else:
+        _increment_click_counts(rows)
+
+
+def _increment_click_counts(rows):
+    values = ', '.join(['(%s::bigint, %s::integer)'] * len(rows))
+    params = [value for row in rows for value in row]
+    table = connection.ops.quote_name(ShortURL._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} AS s SET click_count = s.click_count + v.delta '
+            f'FROM (VALUES {values}) AS v(id, delta) WHERE s.id = v.id',
+            params
+        )
+
+
+def _increment_shards(rows, shard_count):
+    values = ', '.join(['(%s, %s, %s)'] * len(rows))
+    params = []
+    for pk, delta in rows:
+        params.extend([pk, random.randrange(shard_count), delta])
+    table = connection.ops.quote_name(ClickCountShard._meta.db_table)
+    # Rows for deleted short URLs fail the foreign key, so only insert live ones
+    short_url_table = connection.ops.quote_name(ShortURL._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (short_url_id, shard, count) '
+            f'SELECT v.short_url_id, v.shard, v.delta '
+            f'FROM (VALUES {values}) AS v(short_url_id, shard, delta) '
+            f'JOIN {short_url_table} s ON s.id = v.short_url_id '
+            f'ON CONFLICT (short_url_id, shard) DO UPDATE SET count = {table}.count + EXCLUDED.count',
+            params
+        )
+
+
+def compact_click_shards(batch_size=1000):
+    """
+    Fold sharded click counts back into ShortURL.click_count.
+
+    Each batch deletes the shards of up to batch_size short URLs and adds
+    their sum to click_count in the same statement, so readers summing
+    click_count and the shards never see clicks counted twice or missed.
+
+    Returns:
+        int: Number of short URLs whose shards were folded
+    """
+    shard_table = connection.ops.quote_name(ClickCountShard._meta.db_table)
+    short_url_table = connection.ops.quote_name(ShortURL._meta.db_table)
+    compacted = 0
+    last_id = 0
+    while True:
+        short_url_ids = list(
+            ClickCountShard.objects.filter(short_url_id__gt=last_id)
+            .order_by('short_url_id')
+            .values_list('short_url_id', flat=True)
+            .distinct()[:batch_size]
+        )
+        if not short_url_ids:
+            return compacted
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'WITH folded AS ('
+                f'  DELETE FROM {shard_table} WHERE short_url_id = ANY(%s) '
+                f'  RETURNING short_url_id, count'
+                f') '
+                f'UPDATE {short_url_table} AS s SET click_count = s.click_count + f.total '
+                f'FROM (SELECT short_url_id, SUM(count) AS total FROM folded GROUP BY short_url_id) AS f '
+                f'WHERE s.id = f.short_url_id',
+                [short_url_ids]
+            )
+        compacted += len(short_url_ids)
+        last_id = short_url_ids[-1]
+
+
+class BackgroundFlusher:
+    """
+    Base for in-memory buffers drained by a background thread.
+
+    The thread calls flush() every flush_interval seconds, as soon as
+    wake() is called, and once more when the process exits.
+    """
+    thread_name = 'background-flush'
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self._started_pid = None
+
+    def flush(self):
+        raise NotImplementedError
+
+    def wake(self):
+        """Ask the background thread to flush now."""
+        self._wakeup.set()
+
+    def _ensure_started(self):
+        # Threads do not survive fork(), so start one per worker process
+        pid = os.getpid()
+        if self._started_pid == pid:
+            return
+        with self._start_lock:
+            if self._started_pid == pid:
+                return
+            self._started_pid = pid
+            threading.Thread(target=self._run, name=self.thread_name, daemon=True).start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            # Like a request handler, drop connections that broke or got too old
+            close_old_connections()
+            self.flush()
+
+
+class ClickCounterBuffer(BackgroundFlusher):
+    """
+    Write-behind buffer that collects click increments in memory.
+
+    Increments are flushed by a background thread every flush_interval
+    seconds, as soon as max_pending clicks are waiting, and once more when
+    the process exits. Clicks still buffered when a worker dies without
+    running its exit handlers are lost, so flush_interval bounds the window.
+    """
+    thread_name = 'click-counter-flush'
+
+    def __init__(self, flush_interval, max_pending):
+        super().__init__(flush_interval)
+        self.max_pending = max_pending
+        self._pending = Counter()
+        self._pending_total = 0
+        self._lock = threading.Lock()
+
+    def add(self, pk, count=1):
+        """Buffer count clicks for the short URL with the given primary key."""
+        self._ensure_started()
+        with self._lock:
+            self._pending[pk] += count
+            self._pending_total += count
+            full = self._pending_total >= self.max_pending
+        if full:
+            self.wake()
+
+    def pending(self):
+        """Return a copy of the increments waiting to be flushed."""
+        with self._lock:
+            return dict(self._pending)
+
+    def flush(self):
+        """Write all buffered increments to the database in one statement."""
+        with self._lock:
+            increments, self._pending = self._pending, Counter()
+            self._pending_total = 0
+
+        try:
+            apply_increments(increments)
+        except Exception:
+            # Keep the clicks for the next flush rather than dropping them
+            logger.exception("Failed to flush %d buffered click counts", len(increments))
+            with self._lock:
+                self._pending.update(increments)
+                self._pending_total += sum(increments.values())
+
+
+click_buffer = ClickCounterBuffer(
+    flush_interval=settings.CLICK_FLUSH_INTERVAL,
+    max_pending=settings.CLICK_FLUSH_MAX_PENDING,
+)
+
+
+def record_click(pk):
+    """
+    Count one click on the short URL with the given primary key.
+
+    With CLICK_WRITE_BEHIND enabled the click is buffered in memory and
+    written later in a batch; otherwise it is counted right away, in a random
+    counter shard when CLICK_COUNTER_SHARDS is set.
+    """
+    if settings.CLICK_WRITE_BEHIND:
+        click_buffer.add(pk)
+        return
+
+    if settings.CLICK_COUNTER_SHARDS:
+        apply_increments({pk: 1})
+        return
+
+    # Increment click count atomically to avoid race conditions
+    ShortURL.objects.filter(pk=pk).update(
+        click_count=models.F('click_count') + 1
+    )
+
+
+async def arecord_click(pk):
+    """Async version of record_click for the ASGI redirect path."""
+    if settings.CLICK_WRITE_BEHIND:
+        click_buffer.add(pk)
+        return
+
+    if settings.CLICK_COUNTER_SHARDS:
+        await sync_to_async(apply_increments)({pk: 1})
+        return
+
+    await ShortURL.objects.filter(pk=pk).aupdate(
+        click_count=models.F('click_count') + 1
+    )
+
+
+def _fetch_and_count_statement(namespace_name, short_code, namespace_id):
+    # The namespace is matched by its cached id when this worker knows it,
+    # and by joining on its name otherwise
+    table = connection.ops.quote_name(ShortURL._meta.db_table)
+    if namespace_id is not None:
+        return (
+            f'UPDATE {table} SET click_count = click_count + 1 '
+            f'WHERE namespace_id = %s AND short_code = %s '
+            f'RETURNING id, original_url, namespace_id',
+            [namespace_id, short_code]
+        )
+    namespace_table = connection.ops.quote_name(Namespace._meta.db_table)
+    return (
+        f'UPDATE {table} AS s SET click_count = s.click_count + 1 '
+        f'FROM {namespace_table} AS n '
+        f'WHERE n.id = s.namespace_id AND n.name = %s AND s.short_code = %s '
+        f'RETURNING s.id, s.original_url, s.namespace_id',
+        [namespace_name, short_code]
+    )
+
+
+def fetch_and_count(namespace_name, short_code):
+    """
+    Increment click_count and return the resolution in one round trip, using
+    UPDATE ... RETURNING.
+
+    Returns:
+        ResolvedShortURL or None if no such short URL exists
+    """
+    generation = namespace_generation()
+    namespace_id = cached_namespace_id(namespace_name, generation)
+    with connection.cursor() as cursor:
+        cursor.execute(*_fetch_and_count_statement(namespace_name, short_code, namespace_id))
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    resolved = ResolvedShortURL(*row)
+    remember_namespace_id(namespace_name, resolved.namespace_id, generation)
+    return resolved
+
+
+async def afetch_and_count(namespace_name, short_code):
+    """
+    Async version of fetch_and_count.
+
+    Runs the same UPDATE ... RETURNING statement as a raw queryset, so the
+    lookup and the increment stay one round trip on the async ORM.
+    """
+    generation = await anamespace_generation()
+    namespace_id = cached_namespace_id(namespace_name, generation)
+    statement = _fetch_and_count_statement(namespace_name, short_code, namespace_id)
+    async for short_url in ShortURL.objects.raw(*statement):
+        resolved = ResolvedShortURL(short_url.pk, short_url.original_url, short_url.namespace_id)
+        remember_namespace_id(namespace_name, resolved.namespace_id, generation)
+        return resolved
+    return None
+
+
+def _counts_in_lookup():
+    # The combined statement only applies when clicks go straight to click_count
+    return (
+        settings.REDIRECT_SINGLE_STATEMENT
+        and not settings.CLICK_WRITE_BEHIND
+        and not settings.CLICK_COUNTER_SHARDS
+    )
+
+
+def resolve_and_record_click(namespace_name, short_code):
+    """
+    Resolve a short URL and count a click on it.
+
+    On a cache miss with REDIRECT_SINGLE_STATEMENT enabled, the lookup and the
+    increment are one UPDATE ... RETURNING statement instead of two queries.
+
+    Returns:
+        ResolvedShortURL or None if no such short URL exists
+    """
+    if not _counts_in_lookup():
+        resolved = resolve_short_url(namespace_name, short_code)
+        if resolved is not None:
+            record_click(resolved.pk)
+        return resolved
+
+    cached = lookup_cached(namespace_name, short_code)
+    if cached == NOT_FOUND:
+        return None
+    if cached is not None:
+        record_click(cached.pk)
+        return cached
+
+    if not short_code_may_exist(short_code):
+        return None
+
+    resolved = fetch_and_count(namespace_name, short_code)
+    store_resolution(namespace_name, short_code, resolved)
+    return resolved
+
+
+async def aresolve_and_record_click(namespace_name, short_code):
+    """Async version of resolve_and_record_click for the ASGI redirect path."""
+    if not _counts_in_lookup():
+        resolved = await aresolve_short_url(namespace_name, short_code)
+        if resolved is not None:
+            await arecord_click(resolved.pk)
+        return resolved
+
+    cached = await alookup_cached(namespace_name, short_code)
+    if cached == NOT_FOUND:
+        return None
+    if cached is not None:
+        await arecord_click(cached.pk)
+        return cached
+
+    if not await ashort_code_may_exist(short_code):
+        return None
+
+    resolved = await afetch_and_count(namespace_name, short_code)
+    await astore_resolution(namespace_name, short_code, resolved)
+    return resolved
@@ -0,0 +1,85 @@
+"""
+Organization dashboard aggregates, read from materialized views that the
+refresh_dashboards command refreshes on a schedule
+"""
+from datetime import timedelta
+from django.db import connection
+from django.utils import timezone
+
+DASHBOARD_VIEWS = ['urls_organization_summary', 'urls_organization_daily_links']
+
+# Longest links-created-per-day series a dashboard request may ask for
+MAX_DASHBOARD_DAYS = 366
+
+
+def refresh_dashboard_views():
+    """
+    Recompute the dashboard materialized views.
+
+    CONCURRENTLY builds the new contents next to the old ones and swaps
+    them in with a diff, so dashboards keep reading the previous data
+    instead of waiting for the refresh.
+    """
+    with connection.cursor() as cursor:
+        for view in DASHBOARD_VIEWS:
+            cursor.execute(f'REFRESH MATERIALIZED VIEW CONCURRENTLY {connection.ops.quote_name(view)}')
+
+
+def organization_dashboard(organization_id, days=30):
+    """
+    Read an organization's dashboard totals from the materialized views.
+
+    Organizations created since the last refresh report zeros.
+
+    Returns:
+        dict: namespace_count, link_count, total_clicks,
+        links_created_per_day (the last days days with new links),
+        refreshed_at and stale_seconds (age of the data)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT namespace_count, link_count, total_clicks, refreshed_at '
+            'FROM urls_organization_summary WHERE organization_id = %s',
+            [organization_id]
+        )
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute('SELECT MAX(refreshed_at) FROM urls_organization_summary')
+            row = (0, 0, 0, cursor.fetchone()[0])
+        namespace_count, link_count, total_clicks, refreshed_at = row
+
+        since = timezone.now().date() - timedelta(days=days - 1)
+        cursor.execute(
+            'SELECT day, links_created FROM urls_organization_daily_links '
+            'WHERE organization_id = %s AND day >= %s ORDER BY day',
+            [organization_id, since]
+        )
+        links_created_per_day = [
+            {'day': day, 'links_created': links_created} for day, links_created in cursor.fetchall()
+        ]
+
+    return {
+        'organization_id': organization_id,
+        'namespace_count': namespace_count,
+        'link_count': link_count,
+        'total_clicks': int(total_clicks),
+        'links_created_per_day': links_created_per_day,
+        'refreshed_at': refreshed_at,
+        'stale_seconds': int((timezone.now() - refreshed_at).total_seconds()) if refreshed_at else None,
+    }
+
+
+def parse_dashboard_days(query_params, default=30):
+    """
+    Read days from query parameters.
+
+    Raises:
+        ValueError: With a message for the client if days is invalid
+    """
+    try:
+        days = int(query_params.get('days', default))
+    except (TypeError, ValueError):
+        raise ValueError("days must be an integer")
+    if not 1 <= days <= MAX_DASHBOARD_DAYS:
+        raise ValueError(f"days must be between 1 and {MAX_DASHBOARD_DAYS}")
+    return days
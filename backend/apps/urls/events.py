@@ -0,0 +1,129 @@
+"""
+Per-click event capture for the public redirect endpoint
+"""
+import hashlib
+import hmac
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from .models import ClickEvent
+from .clicks import BackgroundFlusher
+from .visitors import record_visitor_sketches
+
+logger = logging.getLogger(__name__)
+
+_referrer_length = ClickEvent._meta.get_field('referrer').max_length
+_user_agent_length = ClickEvent._meta.get_field('user_agent').max_length
+
+
+def hash_client_ip(ip):
+    """Keyed hash of a client IP address, stable across workers and restarts"""
+    if not ip:
+        return ''
+    return hmac.new(settings.SECRET_KEY.encode(), ip.encode(), hashlib.sha256).hexdigest()
+
+
+class ClickEventBuffer(BackgroundFlusher):
+    """
+    Bounded ring buffer of click events, drained in batches by bulk_create.
+
+    Recording an event is a deque append and never touches the database.
+    When the buffer is full because flushes cannot keep up, the oldest
+    events are overwritten and counted in dropped, so a slow database costs
+    analytics data instead of redirect latency or worker memory.
+    """
+    thread_name = 'click-event-flush'
+
+    def __init__(self, capacity, flush_interval, batch_size):
+        super().__init__(flush_interval)
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._events = deque(maxlen=capacity)
+        self._flush_lock = threading.Lock()
+
+    def add(self, short_url_id, referrer='', user_agent='', ip=''):
+        """Buffer one click on the short URL with the given primary key."""
+        self._ensure_started()
+        events = self._events
+        if len(events) >= self.capacity:
+            # Not locked: an approximate count is enough for monitoring
+            self.dropped += 1
+        events.append((short_url_id, time.time(), referrer, user_agent, ip))
+        if len(events) >= self.batch_size:
+            self.wake()
+
+    def pending(self):
+        """Return the number of events waiting to be flushed."""
+        return len(self._events)
+
+    def flush(self):
+        """
+        Insert all buffered events, batch_size rows per INSERT, and fold
+        each batch into the unique visitor sketches.
+
+        Returns:
+            int: Number of events written
+        """
+        written = 0
+        with self._flush_lock:
+            while self._events:
+                batch = self._take(self.batch_size)
+                try:
+                    ClickEvent.objects.bulk_create(batch)
+                except Exception:
+                    # Retrying would let a failing database grow the backlog; drop the batch
+                    logger.exception("Failed to write %d click events", len(batch))
+                    self.dropped += len(batch)
+                    continue
+                written += len(batch)
+                try:
+                    record_visitor_sketches(batch)
+                except Exception:
+                    logger.exception("Failed to update visitor sketches for %d click events", len(batch))
+        return written
+
+    def _take(self, limit):
+        batch = []
+        events = self._events
+        while events and len(batch) < limit:
+            try:
+                short_url_id, clicked_at, referrer, user_agent, ip = events.popleft()
+            except IndexError:
+                break
+            batch.append(ClickEvent(
+                short_url_id=short_url_id,
+                clicked_at=datetime.fromtimestamp(clicked_at, tz=dt_timezone.utc),
+                referrer=referrer[:_referrer_length],
+                user_agent=user_agent[:_user_agent_length],
+                ip_hash=hash_client_ip(ip),
+            ))
+        return batch
+
+
+click_event_buffer = ClickEventBuffer(
+    capacity=settings.CLICK_EVENT_BUFFER_SIZE,
+    flush_interval=settings.CLICK_EVENT_FLUSH_INTERVAL,
+    batch_size=settings.CLICK_EVENT_BATCH_SIZE,
+)
+
+
+def record_click_event(request, short_url_id):
+    """
+    Buffer a click event for a redirect request.
+
+    Does nothing unless CLICK_EVENTS is enabled. Hashing and truncation
+    happen on the flush thread, not in the request.
+    """
+    if not settings.CLICK_EVENTS:
+        return
+    meta = request.META
+    click_event_buffer.add(
+        short_url_id,
+        referrer=meta.get('HTTP_REFERER', ''),
+        user_agent=meta.get('HTTP_USER_AGENT', ''),
+        ip=meta.get('REMOTE_ADDR', ''),
+    )
@@ -0,0 +1,90 @@
+"""
+Streaming CSV / NDJSON export of short URLs
+"""
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import ShortURL
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+EXPORT_FIELDS = [
+    ('id', 'id'),
+    ('namespace_name', 'namespace__name'),
+    ('short_code', 'short_code'),
+    ('original_url', 'original_url'),
+    ('created_by_username', 'created_by__username'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+]
+
+
+def export_rows(organization_ids, include_clicks=False):
+    """
+    Stream every short URL in the given organizations as dicts.
+
+    Filters on organization ids directly, so unlike the list endpoint there
+    is no membership join, DISTINCT or COUNT(*). Rows come from a
+    server-side cursor EXPORT_CHUNK_SIZE at a time, so memory stays flat
+    however many rows there are.
+    """
+    columns = [column for _, column in EXPORT_FIELDS]
+    names = [name for name, _ in EXPORT_FIELDS]
+    queryset = ShortURL.objects.filter(namespace__organization_id__in=organization_ids).order_by('pk')
+    if include_clicks:
+        queryset = queryset.with_click_totals()
+        columns.append('click_total')
+        names.append('click_count')
+
+    for values in queryset.values_list(*columns).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield dict(zip(names, values))
+
+
+def export_field_names(include_clicks=False):
+    names = [name for name, _ in EXPORT_FIELDS]
+    if include_clicks:
+        names.append('click_count')
+    return names
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, field_names):
+    """Yield a CSV header line followed by one line per row."""
+    writer = csv.DictWriter(_Echo(), fieldnames=field_names)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_ndjson(rows, field_names=None):
+    """Yield one JSON document per line per row."""
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+def stream_export(output_format, organization_ids, include_clicks=False):
+    """
+    Return a generator of text chunks for the export in output_format.
+
+    Raises:
+        ValueError: If output_format is not one of EXPORT_FORMATS
+    """
+    if output_format not in EXPORT_FORMATS:
+        raise ValueError(f"output must be one of: {', '.join(EXPORT_FORMATS)}")
+    rows = export_rows(organization_ids, include_clicks)
+    field_names = export_field_names(include_clicks)
+    if output_format == 'csv':
+        return stream_csv(rows, field_names)
+    return stream_ndjson(rows, field_names)
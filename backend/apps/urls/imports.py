@@ -0,0 +1,224 @@
+"""
+Streaming import of short URLs from CSV or NDJSON files
+
+Rows are parsed lazily, validated and inserted a chunk at a time through
+the set-based bulk create, so memory stays flat and each chunk commits on
+its own. Files written by export_short_urls can be imported as they are.
+"""
+import csv
+import json
+import os
+import time
+from django.conf import settings
+from apps.namespaces.models import Namespace
+from .bulk import bulk_create_short_urls, BulkCreateConflict
+
+IMPORT_FORMATS = {
+    'csv': ['.csv'],
+    'ndjson': ['.ndjson', '.jsonl'],
+}
+
+
+class ImportStats:
+    """Running totals of an import, including rows skipped on resume"""
+
+    def __init__(self, rows=0, created=0, rejected=0):
+        # Rows an earlier run imported are skipped and not counted in the throughput
+        self.skipped = rows
+        self.rows = rows
+        self.created = created
+        self.rejected = rejected
+        self.started = time.monotonic()
+
+    @property
+    def seconds(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        return (self.rows - self.skipped) / max(self.seconds, 1e-9)
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'rejected': self.rejected,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+def detect_format(filename, explicit=None):
+    """
+    Return the import format named explicitly or implied by the file extension.
+
+    Raises:
+        ValueError: If the format is unknown or cannot be inferred
+    """
+    if explicit:
+        if explicit not in IMPORT_FORMATS:
+            raise ValueError(f"Format must be one of: {', '.join(IMPORT_FORMATS)}")
+        return explicit
+    extension = os.path.splitext(filename or '')[1].lower()
+    for import_format, extensions in IMPORT_FORMATS.items():
+        if extension in extensions:
+            return import_format
+    raise ValueError(f"Cannot tell the format of {filename!r}; pass one of: {', '.join(IMPORT_FORMATS)}")
+
+
+def parse_csv(lines):
+    """Yield (row, parse error) for each CSV record after the header."""
+    reader = csv.DictReader(lines)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            # The reader has consumed the malformed record and can go on
+            yield {}, f"Invalid CSV: {e}"
+            continue
+        yield row, None
+
+
+def parse_ndjson(lines):
+    """Yield (row, parse error) for each non-blank NDJSON line."""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield {'line': line.rstrip('\n')}, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield {'line': line.rstrip('\n')}, "Expected a JSON object"
+            continue
+        yield row, None
+
+
+def parse_rows(lines, import_format):
+    if import_format == 'csv':
+        return parse_csv(lines)
+    return parse_ndjson(lines)
+
+
+def import_short_urls(records, user=None, namespace_id=None, chunk_size=None, resume=None,
+                      on_reject=None, on_chunk=None):
+    """
+    Create short URLs from parsed rows, one chunk per transaction.
+
+    Rows name their namespace in namespace_name (as exported) or namespace;
+    rows without one go to namespace_id. short_code is optional.
+
+    Args:
+        records: Iterable of (row, parse error) from parse_rows
+        user: Creator whose edit permission is checked, or None for an
+            operator import
+        namespace_id: Default namespace for rows that do not name one
+        chunk_size: Rows per transaction (defaults to IMPORT_CHUNK_SIZE)
+        resume: ImportStats of an earlier run whose rows are skipped
+        on_reject: Called with (row number, row, errors) for every rejected row,
+            including the rows of a chunk that kept conflicting with
+            concurrent writes
+        on_chunk: Called with the ImportStats after every committed chunk
+
+    Returns:
+        ImportStats
+    """
+    chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+    stats = resume or ImportStats()
+    namespace_ids = {}
+    chunk = []
+    for number, (row, error) in enumerate(records, start=1):
+        if number <= stats.skipped:
+            continue
+        chunk.append((number, row, error))
+        if len(chunk) >= chunk_size:
+            _import_chunk(chunk, user, namespace_id, namespace_ids, stats, on_reject)
+            chunk = []
+            if on_chunk:
+                on_chunk(stats)
+    if chunk:
+        _import_chunk(chunk, user, namespace_id, namespace_ids, stats, on_reject)
+        if on_chunk:
+            on_chunk(stats)
+    return stats
+
+
+def _namespace_name(row):
+    return row.get('namespace_name') or row.get('namespace')
+
+
+def _import_chunk(chunk, user, default_namespace_id, namespace_ids, stats, on_reject):
+    # Namespace names are resolved once per import, with one query per chunk for new names
+    names = {_namespace_name(row) for _, row, error in chunk if not error and _namespace_name(row)}
+    unresolved = {str(name) for name in names} - namespace_ids.keys()
+    if unresolved:
+        namespace_ids.update({name: None for name in unresolved})
+        namespace_ids.update(Namespace.objects.filter(name__in=unresolved).values_list('name', 'pk'))
+
+    rejects = []
+    items, numbers = [], []
+    for number, row, error in chunk:
+        if error:
+            rejects.append((number, row, {'row': [error]}))
+            continue
+        name = _namespace_name(row)
+        if name:
+            namespace_id = namespace_ids[str(name)]
+            if namespace_id is None:
+                rejects.append((number, row, {'namespace': [f'Namespace "{name}" does not exist.']}))
+                continue
+        elif default_namespace_id is None:
+            rejects.append((number, row, {'namespace': ['This field is required.']}))
+            continue
+        else:
+            namespace_id = default_namespace_id
+        items.append({
+            'original_url': row.get('original_url'),
+            'short_code': row.get('short_code') or '',
+            'namespace': namespace_id,
+        })
+        numbers.append((number, row))
+
+    try:
+        results = bulk_create_short_urls(user, items) if items else []
+    except BulkCreateConflict as e:
+        # Concurrent writes kept conflicting: reject the chunk's rows, which
+        # can be imported again from the rejects file, and carry on
+        results = [{'status': 'error', 'errors': {'row': [str(e)]}}] * len(items)
+    for (number, row), result in zip(numbers, results):
+        if result['status'] == 'created':
+            stats.created += 1
+        else:
+            rejects.append((number, row, result['errors']))
+
+    stats.rows += len(chunk)
+    stats.rejected += len(rejects)
+    if on_reject:
+        for reject in sorted(rejects, key=lambda reject: reject[0]):
+            on_reject(*reject)
+
+
+def read_checkpoint(path):
+    """Return the ImportStats an earlier run recorded, or None without a checkpoint."""
+    try:
+        with open(path, encoding='utf-8') as checkpoint:
+            data = json.load(checkpoint)
+    except FileNotFoundError:
+        return None
+    return ImportStats(data['rows'], data['created'], data['rejected'])
+
+
+def write_checkpoint(path, stats):
+    """Record progress after a committed chunk; replaced atomically so a crash never leaves half a file."""
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as checkpoint:
+        json.dump(stats.as_dict(), checkpoint)
+    os.replace(temporary_path, path)
+
+
+def format_reject(number, row, errors):
+    """Serialize a rejected row as one NDJSON line for the rejects file."""
+    return json.dumps({'row': number, 'record': row, 'errors': errors}) + '\n'
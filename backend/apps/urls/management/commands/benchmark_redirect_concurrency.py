@@ -0,0 +1,104 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from apps.urls.cache import resolve_short_url
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the redirect endpoint served through the WSGI handler (one "
+        "thread per in-flight request) with the ASGI handler (async view on "
+        "one event loop) at a given concurrency. Every request counts as a "
+        "click on the given short URL; enable CLICK_WRITE_BEHIND to keep the "
+        "database out of the measurement. Each WSGI thread holds its own "
+        "database connection, so WSGI threads are capped at "
+        "--max-db-connections and any extra requests queue for a thread."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('namespace_name', help="Namespace of an existing short URL")
+        parser.add_argument('short_code', help="Short code of an existing short URL")
+        parser.add_argument('--requests', type=int, default=5000, help="Requests per scenario")
+        parser.add_argument('--concurrency', type=int, default=50, help="Requests in flight at once")
+        parser.add_argument(
+            '--max-db-connections', type=int, default=50,
+            help="Most WSGI threads to run; keep it below the database's max_connections"
+        )
+
+    def handle(self, *args, **options):
+        namespace_name = options['namespace_name']
+        short_code = options['short_code']
+        if resolve_short_url(namespace_name, short_code) is None:
+            raise CommandError(f"Short URL {namespace_name}/{short_code} does not exist")
+
+        url = f'/{namespace_name}/{short_code}/'
+        requests = options['requests']
+        concurrency = options['concurrency']
+        wsgi_threads = min(concurrency, options['max_db_connections'])
+
+        self.stdout.write(f"{requests} requests, {concurrency} in flight (resolution cache warm)")
+        if wsgi_threads < concurrency:
+            self.stdout.write(f"WSGI capped at {wsgi_threads} threads by --max-db-connections")
+        self.stdout.write('')
+        self.stdout.write(f"{'handler':<8} {'req/s':>10} {'mean ms':>10} {'p99 ms':>10}")
+        for label, run, workers in [('WSGI', self._run_wsgi, wsgi_threads), ('ASGI', self._run_asgi, concurrency)]:
+            # The test client's host has to pass the ALLOWED_HOSTS check
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                start = time.perf_counter()
+                timings = run(url, requests, workers)
+                elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{label:<8} {requests / elapsed:>10.0f} "
+                f"{statistics.mean(timings):>10.2f} {statistics.quantiles(timings, n=100)[98]:>10.2f}"
+            )
+
+    def _run_wsgi(self, url, requests, concurrency):
+        def worker(count):
+            client = Client()
+            timings = []
+            try:
+                for _ in range(count):
+                    start = time.perf_counter()
+                    response = client.get(url)
+                    timings.append((time.perf_counter() - start) * 1000)
+                    if response.status_code != 302:
+                        raise CommandError(f"Expected a 302 from {url}, got {response.status_code}")
+            finally:
+                # Each thread opened its own database connection
+                connections.close_all()
+            return timings
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            batches = pool.map(worker, self._split(requests, concurrency))
+            return [timing for batch in batches for timing in batch]
+
+    def _run_asgi(self, url, requests, concurrency):
+        async def worker(client, count):
+            timings = []
+            for _ in range(count):
+                start = time.perf_counter()
+                response = await client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 302:
+                    raise CommandError(f"Expected a 302 from {url}, got {response.status_code}")
+            return timings
+
+        async def run():
+            client = AsyncClient()
+            batches = await asyncio.gather(*[
+                worker(client, count) for count in self._split(requests, concurrency)
+            ])
+            return [timing for batch in batches for timing in batch]
+
+        return asyncio.run(run())
+
+    @staticmethod
+    def _split(requests, concurrency):
+        """Spread requests as evenly as possible over concurrency workers"""
+        base, extra = divmod(requests, concurrency)
+        return [base + (1 if i < extra else 0) for i in range(concurrency) if base or i < extra]
@@ -0,0 +1,73 @@
+import statistics
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import path
+from apps.urls import views
+from apps.urls.cache import resolve_short_url
+
+FAST_PATH_MIDDLEWARE = 'apps.urls.middleware.RedirectFastPathMiddleware'
+
+# URLconf that routes redirects through the DRF view, as before the fast path
+urlpatterns = [
+    path('<str:namespace_name>/<str:short_code>/', views.RedirectShortURLView.as_view()),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure per-request overhead of the redirect endpoint: the fast-path "
+        "middleware versus the DRF view behind the full middleware stack. "
+        "Every request counts as a click on the given short URL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('namespace_name', help="Namespace of an existing short URL")
+        parser.add_argument('short_code', help="Short code of an existing short URL")
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per scenario")
+
+    def handle(self, *args, **options):
+        namespace_name = options['namespace_name']
+        short_code = options['short_code']
+        if resolve_short_url(namespace_name, short_code) is None:
+            raise CommandError(f"Short URL {namespace_name}/{short_code} does not exist")
+
+        url = f'/{namespace_name}/{short_code}/'
+        full_stack = [m for m in settings.MIDDLEWARE if m != FAST_PATH_MIDDLEWARE]
+        # The test client's host has to pass the ALLOWED_HOSTS check
+        allowed_hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        scenarios = [
+            ('DRF view, full middleware', {'MIDDLEWARE': full_stack, 'ROOT_URLCONF': __name__}),
+            ('Plain view, full middleware', {'MIDDLEWARE': full_stack}),
+            ('Fast-path middleware', {}),
+        ]
+
+        self.stdout.write(f"{options['requests']} requests per scenario (resolution cache warm)\n")
+        self.stdout.write(f"{'scenario':<30} {'mean µs':>10} {'p50 µs':>10} {'p99 µs':>10}")
+        baseline = None
+        for label, overrides in scenarios:
+            with override_settings(ALLOWED_HOSTS=allowed_hosts, **overrides):
+                timings = self._run(url, options['requests'])
+            mean = statistics.mean(timings)
+            baseline = baseline or mean
+            p50 = statistics.median(timings)
+            p99 = statistics.quantiles(timings, n=100)[98]
+            self.stdout.write(
+                f"{label:<30} {mean:>10.1f} {p50:>10.1f} {p99:>10.1f}"
+                f"  ({baseline - mean:+.1f} µs saved)"
+            )
+
+    def _run(self, url, requests):
+        # A fresh client loads the middleware from the current settings
+        client = Client()
+        response = client.get(url)
+        if response.status_code != 302:
+            raise CommandError(f"Expected a 302 from {url}, got {response.status_code}")
+
+        timings = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            client.get(url)
+            timings.append((time.perf_counter() - start) * 1_000_000)
+        return timings
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from apps.urls.clicks import compact_click_shards
+
+
+class Command(BaseCommand):
+    help = "Fold sharded click counters back into ShortURL.click_count (run periodically, e.g. from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of short URLs to compact per statement",
+        )
+
+    def handle(self, *args, **options):
+        compacted = compact_click_shards(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Compacted click counters for {compacted} short URLs"))
@@ -0,0 +1,28 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from apps.urls.snapshot import export_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Export every (namespace, short_code) -> original_url mapping to a sorted, "
+        "memory-mappable snapshot file and atomically swap it in for redirect workers"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default=settings.REDIRECT_SNAPSHOT_PATH,
+            help="Snapshot file to write (defaults to REDIRECT_SNAPSHOT_PATH)",
+        )
+
+    def handle(self, *args, **options):
+        path = options['output']
+        if not path:
+            raise CommandError("Set REDIRECT_SNAPSHOT_PATH or pass --output")
+
+        start = time.perf_counter()
+        count = export_snapshot(path)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"Exported {count} short URLs to {path} in {elapsed:.1f}s"))
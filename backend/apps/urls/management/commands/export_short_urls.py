@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.organizations.models import Organization
+from apps.urls.export import EXPORT_FORMATS, stream_export
+
+
+class Command(BaseCommand):
+    help = "Stream short URLs, optionally with click counts, as CSV or NDJSON with constant memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--organization', type=int, action='append',
+            help="Organization id to export (repeatable; defaults to every organization)",
+        )
+        parser.add_argument('--output-format', choices=list(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--clicks', action='store_true', help="Include click counts")
+        parser.add_argument('--output', help="File to write (defaults to stdout)")
+
+    def handle(self, *args, **options):
+        organization_ids = options['organization']
+        if organization_ids is None:
+            organization_ids = Organization.objects.values_list('pk', flat=True)
+        elif Organization.objects.filter(pk__in=organization_ids).count() != len(set(organization_ids)):
+            raise CommandError("Unknown organization id")
+
+        chunks = stream_export(options['output_format'], organization_ids, options['clicks'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                # Chunks already end in a newline
+                self.stdout.write(chunk, ending='')
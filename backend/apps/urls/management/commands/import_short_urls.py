@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.namespaces.models import Namespace
+from apps.urls.imports import (
+    IMPORT_FORMATS, detect_format, parse_rows, import_short_urls,
+    read_checkpoint, write_checkpoint, format_reject,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import short URLs from a CSV or NDJSON file in chunks, one transaction "
+        "per chunk, with a checkpoint to resume from and a file of rejected rows"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or NDJSON file to import")
+        parser.add_argument('--input-format', choices=list(IMPORT_FORMATS), help="Defaults to the file extension")
+        parser.add_argument('--namespace', help="Namespace name for rows that do not name one")
+        parser.add_argument('--chunk-size', type=int, help="Rows per transaction")
+        parser.add_argument('--checkpoint', help="Progress file (defaults to PATH.checkpoint)")
+        parser.add_argument('--rejects', help="NDJSON file of rejected rows (defaults to PATH.rejects.ndjson)")
+        parser.add_argument('--resume', action='store_true', help="Skip the rows the checkpoint records as imported")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            import_format = detect_format(path, options['input_format'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        namespace_id = None
+        if options['namespace']:
+            namespace_id = Namespace.objects.filter(name=options['namespace']).values_list('pk', flat=True).first()
+            if namespace_id is None:
+                raise CommandError(f"Unknown namespace {options['namespace']!r}")
+
+        checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        rejects_path = options['rejects'] or f'{path}.rejects.ndjson'
+        resume = read_checkpoint(checkpoint_path) if options['resume'] else None
+        if resume:
+            self.stdout.write(f"Resuming after row {resume.rows}")
+
+        def report(stats):
+            write_checkpoint(checkpoint_path, stats)
+            self.stdout.write(
+                f"{stats.rows} rows: {stats.created} created, {stats.rejected} rejected "
+                f"({stats.rows_per_second:.0f} rows/s)"
+            )
+
+        with open(path, newline='', encoding='utf-8') as source, \
+                open(rejects_path, 'a' if resume else 'w', encoding='utf-8') as rejects:
+            stats = import_short_urls(
+                parse_rows(source, import_format),
+                namespace_id=namespace_id,
+                chunk_size=options['chunk_size'],
+                resume=resume,
+                on_reject=lambda *reject: rejects.write(format_reject(*reject)),
+                on_chunk=report,
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats.created} short URLs from {stats.rows} rows in {stats.seconds:.1f}s; "
+            f"{stats.rejected} rejected rows are in {rejects_path}"
+        ))
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.urls.partitions import create_click_partitions, expire_click_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming monthly click event partitions and detach or drop the "
+        "ones past CLICK_EVENT_RETENTION_MONTHS (run daily, e.g. from cron)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead', type=int, default=settings.CLICK_EVENT_PARTITIONS_AHEAD,
+            help="Number of future months to create partitions for",
+        )
+        parser.add_argument(
+            '--retention-months', type=int, default=settings.CLICK_EVENT_RETENTION_MONTHS,
+            help="Full months of click events to keep before the current month (0 keeps everything)",
+        )
+        parser.add_argument(
+            '--detach-only', action='store_true',
+            help="Detach expired partitions but keep their tables, e.g. for archiving",
+        )
+
+    def handle(self, *args, **options):
+        for name in create_click_partitions(options['months_ahead']):
+            self.stdout.write(f"Created {name}")
+
+        if options['retention_months'] > 0:
+            drop = not options['detach_only']
+            for name in expire_click_partitions(options['retention_months'], drop=drop):
+                self.stdout.write(f"{'Dropped' if drop else 'Detached'} {name}")
+
+        self.stdout.write(self.style.SUCCESS("Click event partitions are up to date"))
@@ -0,0 +1,16 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.urls.dashboard import refresh_dashboard_views
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh the organization dashboard materialized views concurrently "
+        "(run on a schedule, e.g. every few minutes from cron)"
+    )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        refresh_dashboard_views()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"Refreshed dashboard views in {elapsed:.1f}s"))
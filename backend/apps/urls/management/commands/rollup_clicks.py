@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from apps.urls.rollups import rollup_click_events
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold click events recorded since the last run into the minute, hour "
+        "and day rollup tables (run periodically, e.g. every minute from cron)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100000,
+            help="Number of event ids to aggregate per transaction",
+        )
+
+    def handle(self, *args, **options):
+        processed = rollup_click_events(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {processed} click event ids"))
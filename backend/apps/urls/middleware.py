@@ -0,0 +1,58 @@
+"""
+Middleware that serves public redirects ahead of the rest of the stack
+"""
+import re
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from .views import redirect_short_url, aredirect_short_url
+
+REDIRECT_PATH_RE = re.compile(r'^/(?P<namespace_name>[^/]+)/(?P<short_code>[^/]+)/$')
+
+
+class RedirectFastPathMiddleware:
+    """
+    Answer /<namespace_name>/<short_code>/ requests without running the
+    middleware below this one or resolving the URLconf.
+
+    Place it right after SecurityMiddleware. Paths whose first segment is in
+    REDIRECT_RESERVED_PREFIXES (the API, admin and static files) and methods
+    other than GET/HEAD fall through to the normal stack. Under ASGI the
+    middleware runs in async mode and serves redirects with the async view.
+    The Host header is still checked against ALLOWED_HOSTS, as
+    CommonMiddleware would, so a bad host gets a 400.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.reserved_prefixes = frozenset(settings.REDIRECT_RESERVED_PREFIXES)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        match = self.match_redirect(request)
+        if match:
+            return redirect_short_url(request, **match)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        match = self.match_redirect(request)
+        if match:
+            return await aredirect_short_url(request, **match)
+        return await self.get_response(request)
+
+    def match_redirect(self, request):
+        """Return the view kwargs if the request is a public redirect, else None"""
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        match = REDIRECT_PATH_RE.match(request.path_info)
+        if match is None or match['namespace_name'] in self.reserved_prefixes:
+            return None
+        # Raises DisallowedHost, which the handler turns into a 400
+        request.get_host()
+        return match.groupdict()
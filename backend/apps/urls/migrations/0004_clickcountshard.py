@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('urls', '0003_remove_shorturl_urls_shortu_namespa_75f1a5_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClickCountShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('count', models.BigIntegerField(default=0)),
+                ('short_url', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='click_shards', to='urls.shorturl')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='clickcountshard',
+            constraint=models.UniqueConstraint(fields=('short_url', 'shard'), name='urls_clickcountshard_unique_shard'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:55
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the index without locking writes on a large table
+    atomic = False
+
+    dependencies = [
+        ('urls', '0005_shorturl_redirect_idx'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='shorturl',
+            index=models.Index(fields=['updated_at'], name='urls_shorturl_updated_idx'),
+        ),
+    ]
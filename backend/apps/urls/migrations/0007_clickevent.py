@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('urls', '0006_shorturl_updated_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClickEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clicked_at', models.DateTimeField()),
+                ('referrer', models.CharField(blank=True, max_length=2048)),
+                ('user_agent', models.CharField(blank=True, max_length=512)),
+                ('ip_hash', models.CharField(blank=True, max_length=64)),
+                ('short_url', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='click_events', to='urls.shorturl')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['short_url', 'clicked_at'], name='urls_clicke_short_u_6891d3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.30 on 2026-10-17 07:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('namespaces', '0002_namespace_namespaces__name_8eeb8c_idx_and_more'),
+        ('urls', '0007_clickevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HourClickRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('clicks', models.BigIntegerField(default=0)),
+                ('namespace', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='namespaces.namespace')),
+                ('short_url', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='urls.shorturl')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DayClickRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('clicks', models.BigIntegerField(default=0)),
+                ('namespace', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='namespaces.namespace')),
+                ('short_url', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='urls.shorturl')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MinuteClickRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('clicks', models.BigIntegerField(default=0)),
+                ('namespace', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='namespaces.namespace')),
+                ('short_url', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='urls.shorturl')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['namespace', 'bucket'], name='urls_minuterollup_ns_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='minuteclickrollup',
+            constraint=models.UniqueConstraint(fields=('short_url', 'bucket'), name='urls_minuteclickrollup_unique_bucket'),
+        ),
+        migrations.AddIndex(
+            model_name='hourclickrollup',
+            index=models.Index(fields=['namespace', 'bucket'], name='urls_hourrollup_ns_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='hourclickrollup',
+            constraint=models.UniqueConstraint(fields=('short_url', 'bucket'), name='urls_hourclickrollup_unique_bucket'),
+        ),
+        migrations.AddIndex(
+            model_name='dayclickrollup',
+            index=models.Index(fields=['namespace', 'bucket'], name='urls_dayrollup_ns_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dayclickrollup',
+            constraint=models.UniqueConstraint(fields=('short_url', 'bucket'), name='urls_dayclickrollup_unique_bucket'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-17 07:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('namespaces', '0002_namespace_namespaces__name_8eeb8c_idx_and_more'),
+        ('urls', '0008_click_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LifetimeVisitorSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('registers', models.BinaryField()),
+                ('namespace', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='namespaces.namespace')),
+                ('short_url', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='visitor_sketch', to='urls.shorturl')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyVisitorSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('registers', models.BinaryField()),
+                ('day', models.DateField()),
+                ('namespace', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='namespaces.namespace')),
+                ('short_url', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='urls.shorturl')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['namespace', 'day'], name='urls_visitorsketch_ns_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyvisitorsketch',
+            constraint=models.UniqueConstraint(fields=('short_url', 'day'), name='urls_dailyvisitorsketch_unique_day'),
+        ),
+    ]
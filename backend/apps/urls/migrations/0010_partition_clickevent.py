@@ -0,0 +1,83 @@
+"""
+Convert urls_clickevent into a table partitioned by month on clicked_at.
+
+Existing rows are copied into the new table. Partitions are created for the
+current month and the next two; the manage_click_partitions command keeps
+creating them ahead of time after that. Rows outside every monthly partition
+land in urls_clickevent_default.
+
+The primary key of a partitioned table must include the partition key, so
+it becomes (id, clicked_at). id is still unique, since it comes from one
+sequence. The Django model keeps id as its primary key.
+"""
+from django.db import migrations
+
+COLUMNS = 'id, clicked_at, referrer, user_agent, ip_hash, short_url_id'
+
+PARTITION = """
+CREATE TABLE urls_clickevent (
+    id bigint NOT NULL,
+    clicked_at timestamp with time zone NOT NULL,
+    referrer varchar(2048) NOT NULL,
+    user_agent varchar(512) NOT NULL,
+    ip_hash varchar(64) NOT NULL,
+    short_url_id bigint NOT NULL
+) PARTITION BY RANGE (clicked_at);
+
+CREATE TABLE urls_clickevent_default PARTITION OF urls_clickevent DEFAULT;
+
+DO $$
+DECLARE
+    month_start date := date_trunc('month', now());
+BEGIN
+    FOR i IN 0..2 LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF urls_clickevent FOR VALUES FROM (%L) TO (%L)',
+            'urls_clickevent_p' || to_char(month_start + make_interval(months => i), 'YYYYMM'),
+            month_start + make_interval(months => i),
+            month_start + make_interval(months => i + 1)
+        );
+    END LOOP;
+END $$;
+
+INSERT INTO urls_clickevent ({columns}) SELECT {columns} FROM urls_clickevent_unpartitioned;
+DROP TABLE urls_clickevent_unpartitioned;
+
+CREATE SEQUENCE urls_clickevent_id_seq OWNED BY urls_clickevent.id;
+SELECT setval('urls_clickevent_id_seq', COALESCE(MAX(id), 0) + 1, false) FROM urls_clickevent;
+ALTER TABLE urls_clickevent ALTER COLUMN id SET DEFAULT nextval('urls_clickevent_id_seq');
+
+ALTER TABLE urls_clickevent ADD CONSTRAINT urls_clickevent_pkey PRIMARY KEY (id, clicked_at);
+CREATE INDEX urls_clicke_short_u_6891d3_idx ON urls_clickevent (short_url_id, clicked_at);
+""".format(columns=COLUMNS)
+
+UNPARTITION = """
+CREATE TABLE urls_clickevent (
+    id bigint NOT NULL,
+    clicked_at timestamp with time zone NOT NULL,
+    referrer varchar(2048) NOT NULL,
+    user_agent varchar(512) NOT NULL,
+    ip_hash varchar(64) NOT NULL,
+    short_url_id bigint NOT NULL
+);
+INSERT INTO urls_clickevent ({columns}) SELECT {columns} FROM urls_clickevent_partitioned;
+DROP TABLE urls_clickevent_partitioned;
+ALTER TABLE urls_clickevent ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY;
+SELECT setval(pg_get_serial_sequence('urls_clickevent', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM urls_clickevent;
+ALTER TABLE urls_clickevent ADD CONSTRAINT urls_clickevent_pkey PRIMARY KEY (id);
+CREATE INDEX urls_clicke_short_u_6891d3_idx ON urls_clickevent (short_url_id, clicked_at);
+""".format(columns=COLUMNS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('urls', '0009_visitor_sketches'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=['ALTER TABLE urls_clickevent RENAME TO urls_clickevent_unpartitioned', PARTITION],
+            reverse_sql=['ALTER TABLE urls_clickevent RENAME TO urls_clickevent_partitioned', UNPARTITION],
+        ),
+    ]
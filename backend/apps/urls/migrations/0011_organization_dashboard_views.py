@@ -0,0 +1,60 @@
+"""
+Materialized views behind the organization dashboard.
+
+Both have a unique index so the refresh_dashboards command can refresh
+them with REFRESH MATERIALIZED VIEW CONCURRENTLY, which does not block
+readers.
+"""
+from django.db import migrations
+
+CREATE_SUMMARY = """
+CREATE MATERIALIZED VIEW urls_organization_summary AS
+SELECT
+    o.id AS organization_id,
+    COUNT(DISTINCT n.id) AS namespace_count,
+    COUNT(s.id) AS link_count,
+    COALESCE(SUM(s.click_count), 0) + COALESCE(SUM(shards.pending), 0) AS total_clicks,
+    now() AS refreshed_at
+FROM organizations_organization o
+LEFT JOIN namespaces_namespace n ON n.organization_id = o.id
+LEFT JOIN urls_shorturl s ON s.namespace_id = n.id
+LEFT JOIN (
+    SELECT short_url_id, SUM(count) AS pending FROM urls_clickcountshard GROUP BY short_url_id
+) shards ON shards.short_url_id = s.id
+GROUP BY o.id;
+
+CREATE UNIQUE INDEX urls_organization_summary_org_idx ON urls_organization_summary (organization_id);
+"""
+
+CREATE_DAILY_LINKS = """
+CREATE MATERIALIZED VIEW urls_organization_daily_links AS
+SELECT
+    n.organization_id,
+    (s.created_at AT TIME ZONE 'UTC')::date AS day,
+    COUNT(*) AS links_created
+FROM urls_shorturl s
+JOIN namespaces_namespace n ON n.id = s.namespace_id
+GROUP BY 1, 2;
+
+CREATE UNIQUE INDEX urls_organization_daily_links_org_day_idx ON urls_organization_daily_links (organization_id, day);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0003_organizationinvitation'),
+        ('namespaces', '0002_namespace_namespaces__name_8eeb8c_idx_and_more'),
+        ('urls', '0010_partition_clickevent'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=CREATE_SUMMARY,
+            reverse_sql='DROP MATERIALIZED VIEW urls_organization_summary',
+        ),
+        migrations.RunSQL(
+            sql=CREATE_DAILY_LINKS,
+            reverse_sql='DROP MATERIALIZED VIEW urls_organization_daily_links',
+        ),
+    ]
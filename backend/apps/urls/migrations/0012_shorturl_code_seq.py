@@ -0,0 +1,16 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Sequence that generated short codes are permuted from (see apps.urls.allocator)"""
+
+    dependencies = [
+        ('urls', '0011_organization_dashboard_views'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE SEQUENCE urls_shorturl_code_seq AS bigint MINVALUE 1 START 1',
+            reverse_sql='DROP SEQUENCE urls_shorturl_code_seq',
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-17 07:17
+
+from django.db import migrations, models
+
+ALLOCATOR_NAME = 'short_url'
+
+
+def seed_from_sequence(apps, schema_editor):
+    """Continue from the last index the sequence handed out."""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END FROM urls_shorturl_code_seq')
+        next_index = cursor.fetchone()[0]
+    ShortCodeAllocator = apps.get_model('urls', 'ShortCodeAllocator')
+    ShortCodeAllocator.objects.create(name=ALLOCATOR_NAME, next_index=next_index)
+
+
+def restore_sequence(apps, schema_editor):
+    ShortCodeAllocator = apps.get_model('urls', 'ShortCodeAllocator')
+    allocator = ShortCodeAllocator.objects.filter(name=ALLOCATOR_NAME).first()
+    if allocator and allocator.next_index:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT setval('urls_shorturl_code_seq', %s)", [allocator.next_index])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('urls', '0012_shorturl_code_seq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShortCodeAllocator',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('next_index', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_from_sequence, restore_sequence),
+        migrations.RunSQL(
+            sql='DROP SEQUENCE urls_shorturl_code_seq',
+            reverse_sql='CREATE SEQUENCE urls_shorturl_code_seq AS bigint MINVALUE 1 START 1',
+        ),
+    ]
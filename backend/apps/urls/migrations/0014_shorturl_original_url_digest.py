@@ -0,0 +1,84 @@
+"""
+Move global URL uniqueness from original_url to a digest of its canonical form.
+
+Runs outside a transaction: existing rows are backfilled one chunk per
+transaction and the unique index is built CONCURRENTLY, so the table stays
+writable throughout. Rows whose URLs only differ in spelling keep the
+digest on the oldest row and NULL on the others.
+"""
+from django.db import migrations, models, transaction
+from apps.urls.canonical import url_digest
+
+BACKFILL_CHUNK_SIZE = 5000
+
+
+def backfill_digests(apps, schema_editor):
+    ShortURL = apps.get_model('urls', 'ShortURL')
+    connection = schema_editor.connection
+    last_id = 0
+    while True:
+        rows = list(
+            ShortURL.objects.filter(pk__gt=last_id, original_url_digest__isnull=True)
+            .order_by('pk').values_list('pk', 'original_url')[:BACKFILL_CHUNK_SIZE]
+        )
+        if not rows:
+            break
+        values = ', '.join(['(%s::bigint, %s::bytea)'] * len(rows))
+        params = [value for pk, original_url in rows for value in (pk, url_digest(original_url))]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE urls_shorturl AS s SET original_url_digest = v.digest '
+                f'FROM (VALUES {values}) AS v(id, digest) WHERE s.id = v.id',
+                params
+            )
+        last_id = rows[-1][0]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE urls_shorturl AS s SET original_url_digest = NULL FROM ('
+            '  SELECT id, row_number() OVER (PARTITION BY original_url_digest ORDER BY id) AS position'
+            '  FROM urls_shorturl WHERE original_url_digest IS NOT NULL'
+            ') AS d WHERE s.id = d.id AND d.position > 1'
+        )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('urls', '0013_shortcodeallocator'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shorturl',
+            name='original_url_digest',
+            field=models.BinaryField(editable=False, max_length=32, null=True),
+        ),
+        migrations.RunPython(backfill_digests, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql='CREATE UNIQUE INDEX CONCURRENTLY urls_shorturl_url_digest_uniq '
+                        'ON urls_shorturl (original_url_digest)',
+                    reverse_sql='DROP INDEX IF EXISTS urls_shorturl_url_digest_uniq',
+                ),
+                migrations.RunSQL(
+                    sql='ALTER TABLE urls_shorturl ADD CONSTRAINT urls_shorturl_url_digest_uniq '
+                        'UNIQUE USING INDEX urls_shorturl_url_digest_uniq',
+                    reverse_sql='ALTER TABLE urls_shorturl DROP CONSTRAINT urls_shorturl_url_digest_uniq',
+                ),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='shorturl',
+                    constraint=models.UniqueConstraint(fields=['original_url_digest'], name='urls_shorturl_url_digest_uniq'),
+                ),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='shorturl',
+            name='original_url',
+            field=models.URLField(max_length=2048),
+        ),
+    ]
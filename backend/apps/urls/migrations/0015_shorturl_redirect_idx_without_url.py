@@ -0,0 +1,24 @@
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Rebuild the index without locking writes on a large table.
+    # original_url leaves the INCLUDE list: with a URL near max_length the
+    # index tuple could exceed the btree size limit and reject the insert.
+    atomic = False
+
+    dependencies = [
+        ('urls', '0014_shorturl_original_url_digest'),
+    ]
+
+    operations = [
+        RemoveIndexConcurrently(
+            model_name='shorturl',
+            name='urls_shorturl_redirect_idx',
+        ),
+        AddIndexConcurrently(
+            model_name='shorturl',
+            index=models.Index(fields=['namespace', 'short_code'], include=('id',), name='urls_shorturl_redirect_idx'),
+        ),
+    ]
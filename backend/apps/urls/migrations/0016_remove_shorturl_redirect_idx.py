@@ -0,0 +1,21 @@
+from django.contrib.postgres.operations import RemoveIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Drop the index without locking writes on a large table.
+    # short_code is globally unique, so its unique index already finds the
+    # one candidate row; without original_url the (namespace, short_code)
+    # index could not cover the lookup and only added write cost.
+    atomic = False
+
+    dependencies = [
+        ('urls', '0015_shorturl_redirect_idx_without_url'),
+    ]
+
+    operations = [
+        RemoveIndexConcurrently(
+            model_name='shorturl',
+            name='urls_shorturl_redirect_idx',
+        ),
+    ]
@@ -1,11 +1,35 @@
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from apps.namespaces.models import Namespace
+from .hll import HyperLogLog
+from .canonical import url_digest
+
+
+class ShortURLQuerySet(models.QuerySet):
+    def with_click_totals(self):
+        """
+        Annotate click_total: the compacted click_count plus any clicks still
+        sitting in the sharded counter table.
+        """
+        shard_sum = ClickCountShard.objects.filter(
+            short_url=models.OuterRef('pk')
+        ).order_by().values('short_url').annotate(total=models.Sum('count')).values('total')
+        return self.annotate(
+            click_total=models.F('click_count') + Coalesce(
+                models.Subquery(shard_sum, output_field=models.BigIntegerField()), 0
+            )
+        )
 
 
 class ShortURL(models.Model):
     """Short URL model - stores shortened URLs"""
-    original_url = models.URLField(max_length=2048, unique=True)
+    original_url = models.URLField(max_length=2048)
+    # SHA-256 of the canonical URL; global URL uniqueness is enforced here.
+    # Null only for legacy rows whose URL duplicates an older row's once canonicalized.
+    original_url_digest = models.BinaryField(max_length=32, null=True, editable=False)
+    # Its unique index also serves the redirect lookup by (namespace_id, short_code)
     short_code = models.CharField(max_length=255, unique=True)
     namespace = models.ForeignKey(Namespace, on_delete=models.CASCADE, related_name='short_urls')
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_urls')
@@ -13,12 +37,242 @@ class ShortURL(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     click_count = models.PositiveIntegerField(default=0)
 
+    objects = ShortURLQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['namespace', '-created_at']),
             models.Index(fields=['-created_at']),
+            # Lets workers re-read recently saved short codes into their Bloom filter
+            models.Index(fields=['updated_at'], name='urls_shorturl_updated_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['original_url_digest'], name='urls_shorturl_url_digest_uniq'),
         ]
 
     def __str__(self):
         return f"{self.short_code} -> {self.original_url}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so save() can tell whether the URL was edited, and so the
+        # cache signals know the stored redirect key without a query
+        instance._remember_loaded_values()
+        return instance
+
+    def _remember_loaded_values(self, fields=None):
+        # fields: attnames just written, or None for all of them
+        for attname in ('original_url', 'namespace_id', 'short_code'):
+            if fields is None or attname in fields:
+                setattr(self, f'_loaded_{attname}', self.__dict__.get(attname))
+
+    def save(self, *args, **kwargs):
+        # A legacy duplicate keeps its null digest until its URL is edited,
+        # otherwise any save of it would violate the digest constraint
+        url_changed = self.original_url != getattr(self, '_loaded_original_url', None)
+        if url_changed or self.original_url_digest is not None:
+            self.original_url_digest = url_digest(self.original_url)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'original_url' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'original_url_digest'}
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        self._remember_loaded_values(
+            None if update_fields is None else {self._meta.get_field(name).attname for name in update_fields}
+        )
+
+    @property
+    def total_clicks(self):
+        """
+        Total clicks including those not yet compacted into click_count.
+        Uses the click_total annotation when available to avoid a query.
+        """
+        if hasattr(self, 'click_total'):
+            return self.click_total
+        pending = self.click_shards.aggregate(total=models.Sum('count'))['total']
+        return self.click_count + (pending or 0)
+
+    @property
+    def unique_visitors(self):
+        """
+        Estimated distinct visitors of all time, from the lifetime sketch.
+        Prefetch visitor_sketch to avoid a query per short URL.
+        """
+        try:
+            sketch = self.visitor_sketch
+        except ObjectDoesNotExist:
+            return 0
+        return HyperLogLog(sketch.registers).count()
+
+
+class ClickCountShard(models.Model):
+    """
+    Narrow click counter, N rows per short URL.
+
+    Clicks are added to a random shard so concurrent redirects of the same
+    link do not queue on a single row lock or rewrite the wide ShortURL row.
+    Shards are periodically folded back into ShortURL.click_count.
+    """
+    short_url = models.ForeignKey(ShortURL, on_delete=models.CASCADE, related_name='click_shards')
+    shard = models.PositiveSmallIntegerField()
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['short_url', 'shard'], name='urls_clickcountshard_unique_shard'),
+        ]
+
+    def __str__(self):
+        return f"{self.short_url_id}[{self.shard}] +{self.count}"
+
+
+class ClickEvent(models.Model):
+    """
+    One redirect of a short URL, for click analytics.
+
+    Events are buffered in memory by each worker and inserted in batches.
+    The foreign key has no database constraint so a batch never fails
+    because one of its short URLs was deleted in the meantime; events of
+    deleted short URLs are removed by the delete signal.
+    """
+    short_url = models.ForeignKey(
+        ShortURL, on_delete=models.DO_NOTHING, db_constraint=False, related_name='click_events'
+    )
+    clicked_at = models.DateTimeField()
+    referrer = models.CharField(max_length=2048, blank=True)
+    user_agent = models.CharField(max_length=512, blank=True)
+    # Keyed hash of the client IP, so visitors can be told apart without storing addresses
+    ip_hash = models.CharField(max_length=64, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['short_url', 'clicked_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.short_url_id} @ {self.clicked_at}"
+
+
+class ClickRollup(models.Model):
+    """
+    Clicks per short URL per time bucket, maintained incrementally from
+    ClickEvent by the rollup_clicks command.
+
+    namespace is copied from the short URL so namespace-level stats read
+    only rollup rows. Like ClickEvent, the foreign keys have no database
+    constraints and rows of deleted short URLs are removed by the delete
+    signal.
+    """
+    short_url = models.ForeignKey(ShortURL, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    namespace = models.ForeignKey(Namespace, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    bucket = models.DateTimeField()
+    clicks = models.BigIntegerField(default=0)
+
+    # Truncation unit passed to Postgres date_trunc()
+    granularity = None
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"{self.short_url_id} @ {self.bucket}: {self.clicks}"
+
+
+class MinuteClickRollup(ClickRollup):
+    granularity = 'minute'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['short_url', 'bucket'], name='urls_minuteclickrollup_unique_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['namespace', 'bucket'], name='urls_minuterollup_ns_idx'),
+        ]
+
+
+class HourClickRollup(ClickRollup):
+    granularity = 'hour'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['short_url', 'bucket'], name='urls_hourclickrollup_unique_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['namespace', 'bucket'], name='urls_hourrollup_ns_idx'),
+        ]
+
+
+class DayClickRollup(ClickRollup):
+    granularity = 'day'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['short_url', 'bucket'], name='urls_dayclickrollup_unique_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['namespace', 'bucket'], name='urls_dayrollup_ns_idx'),
+        ]
+
+
+class RollupWatermark(models.Model):
+    """Highest ClickEvent id folded into the rollups, one row per rollup job"""
+    name = models.CharField(max_length=100, unique=True)
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_event_id}"
+
+
+class VisitorSketch(models.Model):
+    """
+    HyperLogLog registers of the visitors (hashed client IPs) of a short URL,
+    one byte per register. Sketches merge by taking the register-wise
+    maximum, so any range of days, namespace or organization can be
+    estimated from the daily sketches.
+    """
+    namespace = models.ForeignKey(Namespace, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    registers = models.BinaryField()
+
+    class Meta:
+        abstract = True
+
+
+class DailyVisitorSketch(VisitorSketch):
+    short_url = models.ForeignKey(ShortURL, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    day = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['short_url', 'day'], name='urls_dailyvisitorsketch_unique_day'),
+        ]
+        indexes = [
+            models.Index(fields=['namespace', 'day'], name='urls_visitorsketch_ns_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.short_url_id} @ {self.day}"
+
+
+class LifetimeVisitorSketch(VisitorSketch):
+    """All-time sketch, so a short URL's unique visitors are one row away"""
+    short_url = models.OneToOneField(
+        ShortURL, on_delete=models.DO_NOTHING, db_constraint=False, related_name='visitor_sketch'
+    )
+
+    def __str__(self):
+        return f"{self.short_url_id}"
+
+
+class ShortCodeAllocator(models.Model):
+    """
+    Next unreserved sequence index that generated short codes are permuted
+    from; workers reserve blocks of indexes from it (see apps.urls.allocator)
+    """
+    name = models.CharField(max_length=100, unique=True)
+    next_index = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.next_index}"
@@ -0,0 +1,127 @@
+"""
+Monthly partitions of the click event table
+
+urls_clickevent is partitioned by range on clicked_at, one partition per
+calendar month named urls_clickevent_pYYYYMM, plus a default partition for
+rows no monthly partition covers. Creating partitions ahead of time and
+dropping expired ones are catalog operations, so retention never runs a
+large DELETE.
+"""
+import re
+from datetime import date
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import ClickEvent
+
+PARENT_TABLE = ClickEvent._meta.db_table
+DEFAULT_PARTITION = f'{PARENT_TABLE}_default'
+PARTITION_NAME = re.compile(rf'^{PARENT_TABLE}_p(\d{{4}})(\d{{2}})$')
+
+
+def add_months(month, months):
+    """Return the first day of the month months after month (which may be negative)."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{PARENT_TABLE}_p{month:%Y%m}'
+
+
+def click_partitions():
+    """
+    Return the monthly partitions currently attached.
+
+    Returns:
+        list of (name, first day of the month), oldest first
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE parent.relname = %s',
+            [PARENT_TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_click_partitions(months_ahead, today=None):
+    """
+    Make sure partitions exist for the current month and months_ahead more.
+
+    Rows that already landed in the default partition for a new month are
+    moved into it in the same transaction, since Postgres refuses to attach
+    a partition whose range the default partition holds rows for.
+
+    Returns:
+        list of created partition names
+    """
+    current = (today or timezone.now().date()).replace(day=1)
+    existing = {month for _, month in click_partitions()}
+    parent = connection.ops.quote_name(PARENT_TABLE)
+    default = connection.ops.quote_name(DEFAULT_PARTITION)
+
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if month in existing:
+            continue
+        name = connection.ops.quote_name(partition_name(month))
+        bounds = [month.isoformat(), add_months(month, 1).isoformat()]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT EXISTS (SELECT 1 FROM {default} WHERE clicked_at >= %s AND clicked_at < %s)',
+                bounds
+            )
+            if cursor.fetchone()[0]:
+                cursor.execute(f'CREATE TABLE {name} (LIKE {parent} INCLUDING DEFAULTS)')
+                cursor.execute(
+                    f'WITH moved AS ('
+                    f'  DELETE FROM {default} WHERE clicked_at >= %s AND clicked_at < %s RETURNING *'
+                    f') INSERT INTO {name} SELECT * FROM moved',
+                    bounds
+                )
+                cursor.execute(
+                    f'ALTER TABLE {parent} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)',
+                    bounds
+                )
+            else:
+                cursor.execute(
+                    f'CREATE TABLE {name} PARTITION OF {parent} FOR VALUES FROM (%s) TO (%s)',
+                    bounds
+                )
+        created.append(partition_name(month))
+    return created
+
+
+def expire_click_partitions(retention_months, drop=True, today=None):
+    """
+    Detach, and unless drop is False also drop, monthly partitions that end
+    more than retention_months months before the current month.
+
+    Detached tables keep their name and can be archived and dropped later.
+
+    Returns:
+        list of expired partition names
+    """
+    cutoff = add_months((today or timezone.now().date()).replace(day=1), -retention_months)
+    parent = connection.ops.quote_name(PARENT_TABLE)
+    expired = []
+    for name, month in click_partitions():
+        if month >= cutoff:
+            break
+        quoted = connection.ops.quote_name(name)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {parent} DETACH PARTITION {quoted}')
+            if drop:
+                cursor.execute(f'DROP TABLE {quoted}')
+        expired.append(name)
+    return expired
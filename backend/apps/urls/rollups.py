@@ -0,0 +1,185 @@
+"""
+Incremental minute/hour/day click rollups and the stats read path
+"""
+from datetime import timedelta
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import ShortURL, ClickEvent, MinuteClickRollup, HourClickRollup, DayClickRollup, RollupWatermark
+from .visitors import unique_visitors
+
+ROLLUP_MODELS = {
+    model.granularity: model for model in (MinuteClickRollup, HourClickRollup, DayClickRollup)
+}
+
+# Width of one bucket, and the range returned when the caller gives no start
+BUCKET_WIDTHS = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+DEFAULT_BUCKETS = {
+    'minute': 60,
+    'hour': 48,
+    'day': 30,
+}
+
+# Stats requests spanning more buckets than this are rejected
+MAX_STATS_BUCKETS = 1500
+
+WATERMARK_NAME = 'click_rollups'
+
+
+def _committed_event_high_water():
+    """
+    Return an event id such that every event with a lower or equal id is
+    committed and visible.
+
+    Ids are handed out before their transactions commit, so max(id) alone
+    may skip over a flush that commits later. Taking a SHARE lock waits for
+    in-flight inserts to finish and holds new ones off while max(id) is read;
+    the lock is released as soon as this short transaction ends.
+    """
+    table = connection.ops.quote_name(ClickEvent._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {table} IN SHARE MODE')
+        cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}')
+        return cursor.fetchone()[0]
+
+
+def _rollup_range(cursor, low, high):
+    # One pass over the new events: aggregate per minute, then derive hours
+    # and days from the minute rows, upserting all three tables.
+    event_table = connection.ops.quote_name(ClickEvent._meta.db_table)
+    short_url_table = connection.ops.quote_name(ShortURL._meta.db_table)
+    upserts = []
+    for granularity, model in ROLLUP_MODELS.items():
+        table = connection.ops.quote_name(model._meta.db_table)
+        upserts.append(
+            f'{granularity}_rows AS ('
+            f'  INSERT INTO {table} (short_url_id, namespace_id, bucket, clicks) '
+            f"  SELECT short_url_id, namespace_id, date_trunc('{granularity}', bucket), SUM(clicks) "
+            f'  FROM new_clicks GROUP BY 1, 2, 3 '
+            f'  ON CONFLICT (short_url_id, bucket) DO UPDATE SET clicks = {table}.clicks + EXCLUDED.clicks'
+            f'  RETURNING 1'
+            f')'
+        )
+    # Events of deleted short URLs drop out of the join
+    cursor.execute(
+        f'WITH new_clicks AS ('
+        f"  SELECT e.short_url_id, s.namespace_id, date_trunc('minute', e.clicked_at) AS bucket, COUNT(*) AS clicks "
+        f'  FROM {event_table} e JOIN {short_url_table} s ON s.id = e.short_url_id '
+        f'  WHERE e.id > %s AND e.id <= %s '
+        f'  GROUP BY 1, 2, 3'
+        f'), {", ".join(upserts)} '
+        f'SELECT (SELECT COUNT(*) FROM minute_rows)',
+        [low, high]
+    )
+
+
+def rollup_click_events(batch_size=100000):
+    """
+    Fold click events recorded since the last run into the rollup tables.
+
+    Events are processed in id ranges of batch_size. Each range is
+    aggregated and the watermark advanced in the same transaction, so an
+    interrupted run resumes where it stopped without counting anything
+    twice.
+
+    Returns:
+        int: Number of event ids covered by this run
+    """
+    RollupWatermark.objects.get_or_create(name=WATERMARK_NAME)
+    high_water = _committed_event_high_water()
+    processed = 0
+    while True:
+        with transaction.atomic():
+            # Row lock keeps two concurrent runs from folding the same range
+            watermark = RollupWatermark.objects.select_for_update().get(name=WATERMARK_NAME)
+            low = watermark.last_event_id
+            if low >= high_water:
+                return processed
+            high = min(low + batch_size, high_water)
+            with connection.cursor() as cursor:
+                _rollup_range(cursor, low, high)
+            watermark.last_event_id = high
+            watermark.save(update_fields=['last_event_id', 'updated_at'])
+        processed += high - low
+
+
+def rolled_up_at():
+    """Return when the rollups were last advanced, or None if never"""
+    return RollupWatermark.objects.filter(name=WATERMARK_NAME).values_list('updated_at', flat=True).first()
+
+
+def parse_stats_params(query_params):
+    """
+    Read granularity, start and end from stats query parameters.
+
+    Returns:
+        (granularity, start, end)
+
+    Raises:
+        ValueError: With a message for the client if a parameter is invalid
+    """
+    granularity = query_params.get('granularity', 'hour')
+    if granularity not in ROLLUP_MODELS:
+        raise ValueError(f"granularity must be one of: {', '.join(ROLLUP_MODELS)}")
+    width = BUCKET_WIDTHS[granularity]
+
+    end = _parse_time(query_params, 'end') or timezone.now()
+    start = _parse_time(query_params, 'start') or end - width * DEFAULT_BUCKETS[granularity]
+    if start >= end:
+        raise ValueError("start must be before end")
+    if (end - start) / width > MAX_STATS_BUCKETS:
+        raise ValueError(f"At most {MAX_STATS_BUCKETS} {granularity} buckets can be requested")
+    return granularity, start, end
+
+
+def _parse_time(query_params, name):
+    value = query_params.get(name)
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"{name} must be an ISO 8601 datetime")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def click_stats(granularity, start, end, short_url_id=None, namespace_id=None):
+    """
+    Read click counts per bucket from the rollup table for granularity.
+
+    Exactly one of short_url_id or namespace_id selects the rows. Only
+    pre-aggregated rows are read; events newer than the watermark are not
+    included until the next rollup run.
+
+    Returns:
+        dict: granularity, start, end, total_clicks, rolled_up_at,
+        unique_visitors (estimated over the days the range touches) and
+        buckets, a list of {'bucket', 'clicks'} for buckets with clicks
+    """
+    model = ROLLUP_MODELS[granularity]
+    # Include the bucket that start falls into
+    rows = model.objects.filter(bucket__gt=start - BUCKET_WIDTHS[granularity], bucket__lt=end)
+    if short_url_id is not None:
+        rows = rows.filter(short_url_id=short_url_id).values('bucket', 'clicks')
+    else:
+        rows = rows.filter(namespace_id=namespace_id).values('bucket').annotate(clicks=Sum('clicks'))
+    buckets = list(rows.order_by('bucket'))
+
+    return {
+        'granularity': granularity,
+        'start': start,
+        'end': end,
+        'total_clicks': sum(row['clicks'] for row in buckets),
+        'rolled_up_at': rolled_up_at(),
+        'unique_visitors': unique_visitors(
+            start.date(), (end - timedelta(microseconds=1)).date(),
+            short_url_id=short_url_id, namespace_id=namespace_id
+        ),
+        'buckets': buckets,
+    }
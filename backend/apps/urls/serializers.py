@@ -1,89 +1,127 @@
 from rest_framework import serializers
 from .models import ShortURL
 from apps.namespaces.models import Namespace
-from apps.organizations.models import OrganizationMember
-from django.conf import settings
-import random
-import string
+from .allocator import allocate_short_code, is_allocator_code, ShortCodeSpaceExhausted
+from .canonical import url_digest
+from core.serializers import UniqueConstraintErrorsMixin
+from core.utils import is_organization_editor_or_admin
 
 
-class ShortURLSerializer(serializers.ModelSerializer):
+class ShortURLSerializer(UniqueConstraintErrorsMixin, serializers.ModelSerializer):
     """Serializer for short URLs"""
     namespace_name = serializers.CharField(source='namespace.name', read_only=True)
     created_by_username = serializers.CharField(source='created_by.username', read_only=True)
+    # Includes clicks still held in the sharded counter table
+    click_count = serializers.IntegerField(source='total_clicks', read_only=True)
+    # Approximate all-time distinct visitors, from a HyperLogLog sketch
+    unique_visitors = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = ShortURL
         fields = [
             'id', 'original_url', 'short_code', 'namespace', 'namespace_name',
-            'created_by', 'created_by_username', 'created_at', 'updated_at', 'click_count'
+            'created_by', 'created_by_username', 'created_at', 'updated_at', 'click_count',
+            'unique_visitors'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at', 'click_count', 'created_by', 'namespace_name', 'created_by_username']
+        read_only_fields = ['id', 'created_at', 'updated_at', 'click_count', 'unique_visitors', 'created_by', 'namespace_name', 'created_by_username']
+        # Omitted short codes are generated in validate(); uniqueness is
+        # enforced by the database instead of DRF's UniqueValidator queries
+        extra_kwargs = {
+            'original_url': {'validators': []},
+            'short_code': {'required': False, 'validators': []},
+        }
+    
+    unique_error_messages = {
+        'original_url_digest': 'This URL has already been shortened.',
+        'short_code': 'This short code is already taken. Please choose a different one.',
+    }
+    # URLs are unique by the digest of their canonical form
+    unique_error_fields = {'original_url_digest': 'original_url'}
     
     def validate_namespace(self, value):
         # Check if user has at least editor role in the namespace's organization
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            member = OrganizationMember.objects.filter(
-                organization=value.organization,
-                user=request.user,
-                role__in=['ADMIN', 'EDITOR']
-            ).first()
-            if not member:
+            if not is_organization_editor_or_admin(request.user, value.organization_id, request):
                 raise serializers.ValidationError("You must be an admin or editor to create URLs.")
         return value
     
     def validate(self, attrs):
-        # Check if original_url already exists (global uniqueness)
-        original_url = attrs.get('original_url')
-        if original_url:
-            existing_url = ShortURL.objects.filter(original_url=original_url)
-            # If updating, exclude current instance
-            if self.instance:
-                existing_url = existing_url.exclude(pk=self.instance.pk)
-            
-            if existing_url.exists():
-                existing = existing_url.first()
-                raise serializers.ValidationError({
-                    'original_url': f'This URL has already been shortened as: {existing.namespace.name}/{existing.short_code}'
-                })
+        # original_url and short_code uniqueness is left to the unique
+        # constraints, see UniqueConstraintErrorsMixin
         
         # If short_code is not provided, generate one
         if not attrs.get('short_code'):
             attrs['short_code'] = self._generate_short_code()
+            self._short_code_generated = True
         else:
-            # Check if short_code is globally unique
             short_code = attrs.get('short_code')
             
-            # Check for global uniqueness
-            exists = ShortURL.objects.filter(short_code=short_code)
-            
-            # If updating, exclude current instance
-            if self.instance:
-                exists = exists.exclude(pk=self.instance.pk)
-            
-            if exists.exists():
+            # Codes the allocator could hand out later are reserved for it
+            changed = not self.instance or self.instance.short_code != short_code
+            if changed and is_allocator_code(short_code):
                 raise serializers.ValidationError({
-                    'short_code': 'This short code is already taken. Please choose a different one.'
+                    'short_code': 'This short code is reserved for generated codes. Please choose a different one.'
                 })
         
         return attrs
     
+    def unique_error_message(self, field, validated_data):
+        if field == 'original_url_digest':
+            # A partial update may not send the URL it collides on
+            original_url = validated_data.get('original_url') or self.instance.original_url
+            existing = ShortURL.objects.filter(
+                original_url_digest=url_digest(original_url)
+            ).values_list(
+                'namespace__name', 'short_code'
+            ).first()
+            if existing:
+                return f'This URL has already been shortened as: {existing[0]}/{existing[1]}'
+        return super().unique_error_message(field, validated_data)
+    
     def _generate_short_code(self):
-        """Generate a globally unique random short code"""
-        length = settings.SHORT_CODE_LENGTH
-        charset = settings.SHORT_CODE_CHARSET
+        """
+        Allocate the next generated short code.
         
-        max_attempts = 10
-        for _ in range(max_attempts):
-            short_code = ''.join(random.choices(charset, k=length))
-            # Check for global uniqueness
-            if not ShortURL.objects.filter(short_code=short_code).exists():
-                return short_code
-        
-        raise serializers.ValidationError("Unable to generate unique short code. Please try again.")
+        Generated codes come from a permuted sequence and never collide with
+        each other, so no uniqueness query is needed.
+        """
+        try:
+            return allocate_short_code()
+        except ShortCodeSpaceExhausted:
+            raise serializers.ValidationError("Unable to generate unique short code. Please try again.")
     
     def create(self, validated_data):
         # Set created_by to current user
         validated_data['created_by'] = self.context['request'].user
-        return super().create(validated_data)
+        if not getattr(self, '_short_code_generated', False):
+            return super().create(validated_data)
+        
+        # Codes saved before the allocator existed were random and may sit in
+        # its range; skip past one on the rare unique violation
+        for _ in range(10):
+            try:
+                return super().create(validated_data)
+            except serializers.ValidationError as e:
+                if set(e.detail) != {'short_code'}:
+                    raise
+                validated_data['short_code'] = self._generate_short_code()
+        raise serializers.ValidationError("Unable to generate unique short code. Please try again.")
+
+
+class BulkShortURLItemSerializer(serializers.Serializer):
+    """
+    Shape of one item of a bulk create request.
+    
+    Only checks the fields themselves; namespaces and uniqueness are checked
+    for the whole batch at once in apps.urls.bulk.
+    """
+    original_url = serializers.URLField(max_length=2048)
+    short_code = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    namespace = serializers.IntegerField()
+
+
+class BulkDestinationSerializer(serializers.Serializer):
+    """One item of a bulk destination update"""
+    id = serializers.IntegerField()
+    original_url = serializers.URLField(max_length=2048)
@@ -0,0 +1,226 @@
+"""
+Signal handlers that keep the redirect caches in sync with the database
+"""
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from apps.organizations.models import Organization
+from apps.namespaces.models import Namespace
+from .models import ShortURL, ClickEvent, DailyVisitorSketch, LifetimeVisitorSketch
+from .rollups import ROLLUP_MODELS
+from .cache import (
+    ResolvedShortURL, resolution_cache, namespace_cache, invalidate_shared, pin_shared, bump_namespace_generation,
+)
+from .bloom import short_code_filter
+
+# Click analytics keyed by short URL without a database foreign key
+ANALYTICS_MODELS = [ClickEvent, *ROLLUP_MODELS.values(), DailyVisitorSketch, LifetimeVisitorSketch]
+
+# Shared cache keys are deleted in batches of this size on namespace renames
+# and deletes
+INVALIDATION_BATCH_SIZE = 1000
+
+# Deleting one of these cascades to its short URLs; the parent's pre_delete
+# handler cleans up after all of them at once
+CASCADING_PARENT_MODELS = (Namespace, Organization)
+
+
+def _deleted_by(origin, models):
+    # origin is the instance or queryset whose delete() started the collection
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, models)
+
+
+def _invalidate_now_and_on_commit(invalidate, *args):
+    # Invalidate immediately so this worker stops serving the old value, and
+    # again after commit in case a concurrent redirect re-cached the old row
+    # before the transaction finished.
+    invalidate(*args)
+    transaction.on_commit(lambda: invalidate(*args))
+
+
+@receiver(pre_save, sender=ShortURL)
+@receiver(pre_delete, sender=ShortURL)
+def remember_short_url_key(sender, instance, origin=None, **kwargs):
+    """Remember the (namespace_name, short_code) a short URL has in the database"""
+    instance._stored_redirect_key = None
+    if origin is not None and _deleted_by(origin, CASCADING_PARENT_MODELS):
+        # forget_short_urls_of_deleted_parent handles the whole cascade
+        return
+    namespace_id = getattr(instance, '_loaded_namespace_id', None)
+    short_code = getattr(instance, '_loaded_short_code', None)
+    if instance.pk and namespace_id is not None and short_code is not None:
+        # Loaded from the database: reuse the values it was loaded with. The
+        # namespace is usually select_related, and is read after saving anyway.
+        if namespace_id == instance.namespace_id:
+            namespace_name = instance.namespace.name
+        else:
+            namespace_name = Namespace.objects.filter(pk=namespace_id).values_list('name', flat=True).first()
+        if namespace_name is not None:
+            instance._stored_redirect_key = (namespace_name, short_code)
+    elif instance.pk:
+        instance._stored_redirect_key = ShortURL.objects.filter(pk=instance.pk).values_list(
+            'namespace__name', 'short_code'
+        ).first()
+
+
+@receiver(post_save, sender=ShortURL)
+def invalidate_saved_short_url(sender, instance, **kwargs):
+    """Drop cached resolutions for a short URL that was created or edited"""
+    # The new key may hold a negative entry from before the short URL existed
+    current_key = (instance.namespace.name, instance.short_code)
+    keys = {instance._stored_redirect_key, current_key}
+    keys.discard(None)
+    _invalidate_now_and_on_commit(resolution_cache.invalidate_pk, instance.pk)
+    _invalidate_now_and_on_commit(invalidate_shared, keys)
+    short_code_filter.add(instance.short_code)
+
+    resolved = ResolvedShortURL(instance.pk, instance.original_url, instance.namespace_id)
+    transaction.on_commit(lambda: pin_shared(keys - {current_key}, (current_key, resolved)))
+
+
+def announce_created_short_urls(keys):
+    """
+    Do for short URLs inserted with bulk_create what the save handlers do:
+    drop negative cache entries for their keys and add their codes to the
+    Bloom filter.
+
+    Args:
+        keys: (namespace_name, short_code) tuples of the new short URLs
+    """
+    keys = list(keys)
+    _invalidate_now_and_on_commit(invalidate_shared, keys)
+    for _, short_code in keys:
+        short_code_filter.add(short_code)
+
+
+def announce_bulk_changes(pks, stale_keys, resolutions=()):
+    """
+    Do for short URLs changed or deleted with a single UPDATE or DELETE
+    what the save and delete handlers do row by row.
+
+    Args:
+        pks: Primary keys of the affected short URLs
+        stale_keys: (namespace_name, short_code) tuples that no longer resolve
+        resolutions: ((namespace_name, short_code), ResolvedShortURL) pairs
+            for keys that resolve to something new
+    """
+    pks, stale_keys, resolutions = list(pks), list(stale_keys), list(resolutions)
+
+    def invalidate_local():
+        for pk in pks:
+            resolution_cache.invalidate_pk(pk)
+
+    _invalidate_now_and_on_commit(invalidate_local)
+    _invalidate_now_and_on_commit(invalidate_shared, stale_keys + [key for key, _ in resolutions])
+    transaction.on_commit(lambda: pin_shared(stale_keys, resolutions=resolutions))
+
+
+@receiver(post_delete, sender=ShortURL)
+def invalidate_deleted_short_url(sender, instance, origin=None, **kwargs):
+    """Drop cached resolutions and click analytics for a short URL that was deleted"""
+    if origin is not None and _deleted_by(origin, CASCADING_PARENT_MODELS):
+        return
+    # Nothing cascades to the analytics tables in the database
+    for model in ANALYTICS_MODELS:
+        model.objects.filter(short_url_id=instance.pk).delete()
+    _invalidate_now_and_on_commit(resolution_cache.invalidate_pk, instance.pk)
+    if instance._stored_redirect_key:
+        stale_keys = [instance._stored_redirect_key]
+        _invalidate_now_and_on_commit(invalidate_shared, stale_keys)
+        transaction.on_commit(lambda: pin_shared(stale_keys))
+
+
+@receiver(pre_save, sender=Namespace)
+def remember_namespace_name(sender, instance, **kwargs):
+    """Remember the name a namespace has in the database"""
+    instance._stored_name = None
+    if instance.pk:
+        instance._stored_name = Namespace.objects.filter(pk=instance.pk).values_list(
+            'name', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=Namespace)
+def invalidate_renamed_namespace(sender, instance, created, **kwargs):
+    """
+    Drop cached resolutions under a namespace that was renamed.
+
+    Other workers' cached name -> id mappings are retired by replacing the
+    shared namespace generation, otherwise they would keep resolving the old
+    name by id and write those resolutions back to the shared cache.
+    """
+    old_name = instance._stored_name
+    if created or old_name is None or old_name == instance.name:
+        return
+
+    _invalidate_now_and_on_commit(resolution_cache.invalidate_namespace, instance.pk)
+    _invalidate_now_and_on_commit(namespace_cache.invalidate_pk, instance.pk)
+    _invalidate_now_and_on_commit(bump_namespace_generation)
+
+    short_codes = instance.short_urls.values_list('short_code', flat=True)
+    batch = []
+    for short_code in short_codes.iterator(chunk_size=INVALIDATION_BATCH_SIZE):
+        batch.append((old_name, short_code))
+        if len(batch) >= INVALIDATION_BATCH_SIZE:
+            _invalidate_renamed_keys(batch)
+            batch = []
+    if batch:
+        _invalidate_renamed_keys(batch)
+
+
+def _invalidate_renamed_keys(stale_keys):
+    _invalidate_now_and_on_commit(invalidate_shared, stale_keys)
+    transaction.on_commit(lambda: pin_shared(stale_keys))
+
+
+@receiver(post_delete, sender=Namespace)
+def invalidate_deleted_namespace(sender, instance, **kwargs):
+    """
+    Retire cached name -> id mappings for a namespace that was deleted.
+
+    Its short URLs' own delete handlers take care of their cache entries,
+    but a worker still mapping the name to the deleted id would 404 a new
+    namespace that reuses the name.
+    """
+    _invalidate_now_and_on_commit(namespace_cache.invalidate_pk, instance.pk)
+    _invalidate_now_and_on_commit(bump_namespace_generation)
+
+
+@receiver(pre_delete, sender=Namespace)
+@receiver(pre_delete, sender=Organization)
+def forget_short_urls_of_deleted_parent(sender, instance, origin=None, **kwargs):
+    """
+    Drop click analytics and cached resolutions for every short URL about to
+    be deleted along with a namespace or organization.
+
+    The per-row short URL handlers skip cascaded deletes, so this runs one
+    DELETE per analytics table and reads the redirect keys in batches
+    instead of several queries per short URL.
+    """
+    if sender is Namespace and origin is not None and _deleted_by(origin, Organization):
+        # The organization's own handler covers its namespaces
+        return
+
+    if sender is Organization:
+        short_urls = ShortURL.objects.filter(namespace__organization=instance)
+    else:
+        short_urls = ShortURL.objects.filter(namespace=instance)
+    # Nothing cascades to the analytics tables in the database
+    for model in ANALYTICS_MODELS:
+        model.objects.filter(short_url_id__in=short_urls.values('pk')).delete()
+
+    rows = short_urls.order_by().values_list('pk', 'namespace__name', 'short_code')
+    batch = []
+    for row in rows.iterator(chunk_size=INVALIDATION_BATCH_SIZE):
+        batch.append(row)
+        if len(batch) >= INVALIDATION_BATCH_SIZE:
+            _forget_deleted_rows(batch)
+            batch = []
+    if batch:
+        _forget_deleted_rows(batch)
+
+
+def _forget_deleted_rows(rows):
+    announce_bulk_changes([pk for pk, _, _ in rows], [(name, short_code) for _, name, short_code in rows])
@@ -0,0 +1,201 @@
+"""
+Memory-mapped redirect snapshot files
+
+A snapshot is a sorted binary file of every (namespace_name, short_code) ->
+original_url mapping. Redirect workers map it read-only, so all processes on
+a host share one copy through the page cache, and look keys up with a binary
+search.
+
+Layout (little-endian):
+    header   MAGIC, count (Q), index_offset (Q), max_id (Q), exported_at (d)
+    records  key_len (H), url_len (H), pk (Q), namespace_id (Q), key, url
+    index    count record offsets (Q), in key order
+
+Keys are the UTF-8 namespace name and short code joined by a NUL byte, so
+byte order matches ordering by (name, short_code) with the C collation.
+"""
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Collate
+from .models import ShortURL
+
+MAGIC = b'URLSNAP1'
+HEADER = struct.Struct('<8sQQQd')
+RECORD = struct.Struct('<HHQQ')
+OFFSET = struct.Struct('<Q')
+
+# Rows are streamed from the database in chunks of this size on export
+EXPORT_CHUNK_SIZE = 10000
+
+
+def snapshot_key(namespace_name, short_code):
+    return f'{namespace_name}\0{short_code}'.encode()
+
+
+def export_snapshot(path):
+    """
+    Write a snapshot of every short URL to path.
+
+    The file is written next to path and renamed over it, so readers either
+    see the previous snapshot or the complete new one.
+
+    Returns:
+        int: Number of short URLs exported
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    rows = ShortURL.objects.order_by(
+        Collate(F('namespace__name'), 'C'), Collate(F('short_code'), 'C')
+    ).values_list('namespace__name', 'short_code', 'original_url', 'pk', 'namespace_id')
+
+    offsets = array('Q')
+    max_id = 0
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.redirect-snapshot-')
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            # Header is rewritten once the count and index position are known
+            output.write(HEADER.pack(MAGIC, 0, 0, 0, 0.0))
+            position = HEADER.size
+            for namespace_name, short_code, original_url, pk, namespace_id in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+                key = snapshot_key(namespace_name, short_code)
+                url = original_url.encode()
+                offsets.append(position)
+                output.write(RECORD.pack(len(key), len(url), pk, namespace_id))
+                output.write(key)
+                output.write(url)
+                position += RECORD.size + len(key) + len(url)
+                max_id = max(max_id, pk)
+
+            if sys.byteorder != 'little':
+                offsets.byteswap()
+            output.write(offsets.tobytes())
+            output.seek(0)
+            output.write(HEADER.pack(MAGIC, len(offsets), position, max_id, time.time()))
+            output.flush()
+            os.fsync(output.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return len(offsets)
+
+
+class RedirectSnapshot:
+    """A read-only, memory-mapped snapshot file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as snapshot_file:
+            stat = os.fstat(snapshot_file.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns)
+            self._map = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.count, self._index_offset, self.max_id, self.exported_at = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a redirect snapshot")
+
+    def _record_at(self, index):
+        offset = OFFSET.unpack_from(self._map, self._index_offset + index * OFFSET.size)[0]
+        key_len, url_len, pk, namespace_id = RECORD.unpack_from(self._map, offset)
+        key_start = offset + RECORD.size
+        return key_start, key_len, url_len, pk, namespace_id
+
+    def get(self, namespace_name, short_code):
+        """
+        Look a short URL up by binary search.
+
+        Returns:
+            (pk, original_url, namespace_id) or None if the key is not in the snapshot
+        """
+        key = snapshot_key(namespace_name, short_code)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            key_start, key_len, url_len, pk, namespace_id = self._record_at(middle)
+            candidate = self._map[key_start:key_start + key_len]
+            if candidate < key:
+                low = middle + 1
+            elif candidate > key:
+                high = middle
+            else:
+                url_start = key_start + key_len
+                original_url = self._map[url_start:url_start + url_len].decode()
+                return pk, original_url, namespace_id
+        return None
+
+
+class SnapshotReader:
+    """
+    Keeps the current snapshot mapped and picks up a swapped file.
+
+    The file is stat()ed at most every check_interval seconds; when its
+    inode or mtime changed the new file is mapped. The old mapping is left
+    for the garbage collector, so lookups in flight keep working.
+    """
+
+    def __init__(self, path, check_interval):
+        self.path = path
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def current(self):
+        """Return the mapped snapshot, or None if there is no snapshot file"""
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            with self._lock:
+                if now - self._checked_at >= self.check_interval:
+                    self._checked_at = now
+                    self._reload_if_changed()
+        return self._snapshot
+
+    def _reload_if_changed(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._snapshot = None
+            return
+        if self._snapshot is None or self._snapshot.identity != (stat.st_ino, stat.st_mtime_ns):
+            self._snapshot = RedirectSnapshot(self.path)
+
+
+_reader = None
+_reader_lock = threading.Lock()
+
+
+def get_snapshot_reader():
+    """Return the reader for REDIRECT_SNAPSHOT_PATH, or None if snapshots are disabled"""
+    global _reader
+    path = settings.REDIRECT_SNAPSHOT_PATH
+    if not path:
+        return None
+    reader = _reader
+    if reader is None or reader.path != path:
+        with _reader_lock:
+            if _reader is None or _reader.path != path:
+                _reader = SnapshotReader(path, settings.REDIRECT_SNAPSHOT_CHECK_INTERVAL)
+            reader = _reader
+    return reader
+
+
+def snapshot_lookup(namespace_name, short_code):
+    """
+    Look a short URL up in the redirect snapshot.
+
+    Returns:
+        (pk, original_url, namespace_id), or None if snapshots are disabled
+        or the key was created after the snapshot was exported
+    """
+    reader = get_snapshot_reader()
+    snapshot = reader.current() if reader else None
+    if snapshot is None:
+        return None
+    return snapshot.get(namespace_name, short_code)
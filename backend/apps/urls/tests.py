@@ -1,10 +1,36 @@
-from django.test import TestCase
+from django.test import TestCase, SimpleTestCase, TransactionTestCase, AsyncClient, Client, override_settings
+from django.db import connection, transaction
+from django.conf import settings
+from django.test.utils import CaptureQueriesContext
+from unittest import mock
+import os
+import shutil
+import tempfile
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+import csv
+import io
+import json
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
 from rest_framework import status
 from apps.organizations.models import Organization, OrganizationMember
 from apps.namespaces.models import Namespace
-from apps.urls.models import ShortURL
+from apps.urls.models import ShortURL, ClickCountShard, ClickEvent, HourClickRollup
+from apps.urls.cache import fetch_resolution, namespace_generation, remember_namespace_id, resolution_cache, clear_redirect_caches, ResolutionCache, ResolvedShortURL
+from apps.urls.bloom import BloomFilter, short_code_filter
+from apps.urls.clicks import ClickCounterBuffer, compact_click_shards
+from apps.urls.events import ClickEventBuffer, hash_client_ip
+from apps.urls.rollups import rollup_click_events
+from apps.urls.hll import HyperLogLog
+from apps.urls.visitors import record_visitor_sketches, unique_visitors
+from apps.urls.trending import SpaceSaving, TrendingTracker
+from apps.urls.partitions import click_partitions, create_click_partitions, expire_click_partitions
+from apps.urls.canonical import canonicalize_url, url_digest
+from apps.urls.bulk import bulk_create_short_urls, BulkCreateConflict
+from apps.urls.checks import check_redirect_snapshot_cache, check_trending_links_cache
+from apps.urls.allocator import ShortCodePermutation, ShortCodeSpaceExhausted, ShortCodeBlockPool, allocate_short_code, decode_short_code
+from datetime import date, datetime, timezone as dt_timezone
 
 
 class ShortURLTests(TestCase):
@@ -37,6 +63,9 @@ class ShortURLTests(TestCase):
         
         # Set up API client
         self.client = APIClient()
+        
+        # Redirect caches outlive the per-test transaction
+        clear_redirect_caches()
     
     def test_create_short_url(self):
         """Test that authenticated editor can create a short URL"""
@@ -59,6 +88,165 @@ class ShortURLTests(TestCase):
         self.assertEqual(short_url.original_url, 'https://example.com')
         self.assertEqual(short_url.namespace, self.namespace)
     
+    def test_duplicates_are_rejected_by_the_constraints(self):
+        """Test that taken URLs and codes are field errors found by the insert, not pre-checks"""
+        ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        self.client.force_authenticate(user=self.user)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/urls/', {
+                'original_url': 'https://example.com',
+                'namespace': self.namespace.id,
+                'short_code': 'abc123'
+            })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'short_code': ['This short code is already taken. Please choose a different one.']})
+        prechecks = [q for q in queries.captured_queries if q['sql'].startswith('SELECT') and 'FROM "urls_shorturl"' in q['sql']]
+        self.assertEqual(prechecks, [])
+        
+        response = self.client.post('/api/urls/', {
+            'original_url': 'https://google.com',
+            'namespace': self.namespace.id,
+            'short_code': 'def456'
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'original_url': ['This URL has already been shortened as: test-namespace/abc123']})
+        
+        # Spellings of the same URL are duplicates too
+        response = self.client.post('/api/urls/', {
+            'original_url': 'https://Google.com:443',
+            'namespace': self.namespace.id
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('test-namespace/abc123', response.data['original_url'][0])
+        
+        # Updating a link to its own values is not a violation
+        short_url = ShortURL.objects.get()
+        response = self.client.put(f'/api/urls/{short_url.id}/', {
+            'original_url': 'https://google.com',
+            'short_code': 'abc123'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(ShortURL.objects.count(), 1)
+        
+        # The cache signals reuse the loaded key, so only get_object reads the row
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(f'/api/urls/{short_url.id}/', {'short_code': 'xyz789'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        reads = [q for q in queries.captured_queries if q['sql'].startswith('SELECT') and 'FROM "urls_shorturl"' in q['sql']]
+        self.assertEqual(len(reads), 1)
+    
+    def test_update_looks_up_memberships_once(self):
+        """Test that the permission check and namespace validation share one membership query"""
+        short_url = ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        self.client.force_authenticate(user=self.user)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(f'/api/urls/{short_url.id}/', {
+                'original_url': 'https://example.com',
+                'namespace': self.namespace.id
+            })
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        role_lookups = [q for q in queries.captured_queries if 'FROM "organizations_organizationmember"' in q['sql']]
+        self.assertEqual(len(role_lookups), 1)
+    
+    def test_legacy_duplicate_without_digest_can_still_be_edited(self):
+        """Test that a legacy row left without a digest saves until its URL is edited"""
+        ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        legacy = ShortURL.objects.create(
+            original_url='https://example.com',
+            short_code='def456',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        # As migration 0014 leaves a URL that only differs once canonicalized
+        ShortURL.objects.filter(pk=legacy.pk).update(original_url='https://GOOGLE.com:443', original_url_digest=None)
+        self.client.force_authenticate(user=self.user)
+        
+        response = self.client.put(f'/api/urls/{legacy.id}/', {'short_code': 'renamed'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        legacy = ShortURL.objects.get(pk=legacy.pk)
+        self.assertEqual(legacy.short_code, 'renamed')
+        self.assertIsNone(legacy.original_url_digest)
+        
+        legacy.short_code = 'renamed-again'
+        legacy.save()
+        self.assertIsNone(ShortURL.objects.get(pk=legacy.pk).original_url_digest)
+        
+        # Editing the URL gives it a digest, and so the usual duplicate check
+        response = self.client.put(f'/api/urls/{legacy.id}/', {'original_url': 'https://google.com/'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'original_url': ['This URL has already been shortened as: test-namespace/abc123']})
+    
+    def test_bulk_create_reports_each_item_in_order(self):
+        """Test that a bulk create inserts the valid items and reports errors per item"""
+        ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        other_namespace = Namespace.objects.create(
+            name='other-namespace',
+            organization=Organization.objects.create(name='Other Org')
+        )
+        self.client.force_authenticate(user=self.user)
+        
+        response = self.client.post('/api/urls/bulk/', [
+            {'original_url': 'https://example.com/1', 'namespace': self.namespace.id},
+            {'original_url': 'https://example.com/2', 'namespace': self.namespace.id, 'short_code': 'custom'},
+            {'original_url': 'https://google.com', 'namespace': self.namespace.id},
+            {'original_url': 'https://example.com/1', 'namespace': self.namespace.id},
+            {'original_url': 'https://example.com/3', 'namespace': self.namespace.id, 'short_code': 'abc123'},
+            {'original_url': 'https://example.com/4', 'namespace': other_namespace.id},
+            {'original_url': 'not a url', 'namespace': self.namespace.id},
+        ], format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 5))
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['created', 'created'] + ['error'] * 5)
+        self.assertEqual(results[1]['short_url']['short_code'], 'custom')
+        self.assertEqual([list(result['errors']) for result in results[2:]], [
+            ['original_url'], ['original_url'], ['short_code'], ['namespace'], ['original_url']
+        ])
+        self.assertEqual(ShortURL.objects.count(), 3)
+        generated = ShortURL.objects.get(pk=results[0]['short_url']['id'])
+        self.assertEqual(generated.created_by, self.user)
+        self.assertEqual(self.client.get(f'/{self.namespace.name}/{generated.short_code}/').status_code, 302)
+    
+    def test_bulk_create_query_count_is_independent_of_size(self):
+        """Test that bulk create runs the same queries for 5 and 50 items"""
+        self.client.force_authenticate(user=self.user)
+        query_counts = []
+        for size in [5, 50]:
+            items = [
+                {'original_url': f'https://example.com/{size}/{n}', 'namespace': self.namespace.id, 'short_code': f'c{size}-{n}'}
+                for n in range(size)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/urls/bulk/', items, format='json')
+            self.assertEqual(response.data['created'], size)
+            query_counts.append(len(queries))
+        
+        self.assertEqual(query_counts[0], query_counts[1])
+    
     def test_redirect_increments_click_count(self):
         """Test that accessing short URL redirects and increments click count"""
         # Create a short URL
@@ -81,3 +269,1239 @@ class ShortURLTests(TestCase):
         # Click count should increase
         short_url.refresh_from_db()
         self.assertEqual(short_url.click_count, initial_count + 1)
+
+    def test_redirect_served_from_cache(self):
+        """Test that a repeated redirect skips the lookup query"""
+        ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        
+        self.client.get(f'/{self.namespace.name}/abc123/')
+        
+        # Only the click count update should hit the database now
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/{self.namespace.name}/abc123/')
+        
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(resolution_cache.stats()['hits'], 1)
+    
+    def test_redirect_cache_invalidated_on_update(self):
+        """Test that editing a short URL is visible on the next redirect"""
+        short_url = ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        self.client.get(f'/{self.namespace.name}/abc123/')
+        
+        short_url.original_url = 'https://example.com'
+        short_url.save()
+        
+        response = self.client.get(f'/{self.namespace.name}/abc123/')
+        self.assertEqual(response.url, 'https://example.com')
+    
+    def test_redirect_cache_invalidated_on_namespace_rename(self):
+        """Test that renaming a namespace stops the old path from resolving"""
+        ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        self.client.get('/test-namespace/abc123/')
+        
+        self.namespace.name = 'renamed-namespace'
+        self.namespace.save()
+        
+        self.assertEqual(self.client.get('/test-namespace/abc123/').status_code, 404)
+        self.assertEqual(self.client.get('/renamed-namespace/abc123/').status_code, 302)
+    
+    def test_namespace_ids_cached_before_a_rename_are_not_trusted(self):
+        """Test that another worker's name -> id mapping is retired by a rename"""
+        ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        stale_generation = namespace_generation()
+        self.namespace.name = 'renamed-namespace'
+        self.namespace.save()
+        
+        # Another worker still maps the old name to the renamed namespace
+        remember_namespace_id('test-namespace', self.namespace.id, stale_generation)
+        self.assertIsNone(fetch_resolution('test-namespace', 'abc123'))
+        
+        # A new namespace reusing the name resolves its own links
+        reused = Namespace.objects.create(name='test-namespace', organization=self.org)
+        ShortURL.objects.create(
+            original_url='https://example.com',
+            short_code='def456',
+            namespace=reused,
+            created_by=self.user
+        )
+        self.assertEqual(fetch_resolution('test-namespace', 'def456').namespace_id, reused.id)
+
+    def test_redirect_served_from_shared_cache(self):
+        """Test that another worker's cached lookup is reused"""
+        ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        self.client.get(f'/{self.namespace.name}/abc123/')
+        
+        # Simulate a different worker: empty in-process cache, warm shared cache
+        resolution_cache.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/{self.namespace.name}/abc123/')
+        
+        self.assertEqual(response.url, 'https://google.com')
+    
+    def test_missing_short_url_is_negatively_cached(self):
+        """Test that repeated 404s skip the lookup until the URL is created"""
+        self.assertEqual(self.client.get(f'/{self.namespace.name}/missing/').status_code, 404)
+        
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/{self.namespace.name}/missing/')
+        self.assertEqual(response.status_code, 404)
+        
+        ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='missing',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        self.assertEqual(self.client.get(f'/{self.namespace.name}/missing/').status_code, 302)
+
+    @override_settings(CLICK_WRITE_BEHIND=True)
+    def test_write_behind_clicks_flush_in_one_statement(self):
+        """Test that buffered clicks skip the redirect and land in one batched update"""
+        first = ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        second = ShortURL.objects.create(
+            original_url='https://example.com',
+            short_code='def456',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        # Long interval so the background thread never flushes during the test
+        buffer = ClickCounterBuffer(flush_interval=3600, max_pending=1000)
+        
+        with mock.patch('apps.urls.clicks.click_buffer', buffer):
+            self.client.get(f'/{self.namespace.name}/abc123/')
+            # A cached redirect no longer writes to the database at all
+            with self.assertNumQueries(0):
+                self.client.get(f'/{self.namespace.name}/abc123/')
+            self.client.get(f'/{self.namespace.name}/def456/')
+        
+        self.assertEqual(buffer.pending(), {first.pk: 2, second.pk: 1})
+        
+        with self.assertNumQueries(1):
+            buffer.flush()
+        
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.click_count, second.click_count), (2, 1))
+        self.assertEqual(buffer.pending(), {})
+
+    @override_settings(CLICK_COUNTER_SHARDS=4)
+    def test_sharded_click_counts_are_summed_and_compacted(self):
+        """Test that sharded clicks show up in click_count and fold back on compaction"""
+        short_url = ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        for _ in range(5):
+            self.client.get(f'/{self.namespace.name}/abc123/')
+        
+        # The wide row is untouched; clicks live in the narrow shard table
+        short_url.refresh_from_db()
+        self.assertEqual(short_url.click_count, 0)
+        self.assertTrue(ClickCountShard.objects.filter(short_url=short_url).exists())
+        
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(f'/api/urls/{short_url.id}/')
+        self.assertEqual(response.data['click_count'], 5)
+        
+        self.assertEqual(compact_click_shards(), 1)
+        short_url.refresh_from_db()
+        self.assertEqual(short_url.click_count, 5)
+        self.assertFalse(ClickCountShard.objects.exists())
+        
+        response = self.client.get(f'/api/urls/{short_url.id}/')
+        self.assertEqual(response.data['click_count'], 5)
+
+    @override_settings(CLICK_EVENTS=True)
+    def test_redirect_click_events_are_buffered_and_bulk_inserted(self):
+        """Test that redirects buffer click events that are written in batches"""
+        short_url = ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        # Long interval and large batch so the background thread never flushes during the test
+        buffer = ClickEventBuffer(capacity=100, flush_interval=3600, batch_size=100)
+        
+        with mock.patch('apps.urls.events.click_event_buffer', buffer):
+            for _ in range(5):
+                self.client.get(
+                    f'/{self.namespace.name}/abc123/',
+                    HTTP_REFERER='https://news.example.com/',
+                    HTTP_USER_AGENT='TestAgent/1.0',
+                    REMOTE_ADDR='203.0.113.7'
+                )
+        self.assertEqual(buffer.pending(), 5)
+        
+        # One INSERT per batch of two events
+        buffer.batch_size = 2
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(buffer.flush(), 5)
+        event_inserts = [
+            query for query in queries
+            if query['sql'].startswith(f'INSERT INTO "{ClickEvent._meta.db_table}"')
+        ]
+        self.assertEqual(len(event_inserts), 3)
+        
+        events = ClickEvent.objects.filter(short_url=short_url)
+        self.assertEqual(events.count(), 5)
+        event = events.first()
+        self.assertEqual(event.referrer, 'https://news.example.com/')
+        self.assertEqual(event.user_agent, 'TestAgent/1.0')
+        self.assertEqual(event.ip_hash, hash_client_ip('203.0.113.7'))
+        self.assertNotIn('203.0.113.7', event.ip_hash)
+        
+        short_url.delete()
+        self.assertFalse(ClickEvent.objects.exists())
+    
+    def test_namespace_delete_cleans_up_short_urls_in_constant_queries(self):
+        """Test that a cascaded delete drops analytics and cached redirects without per-link queries"""
+        clicked_at = datetime(2026, 1, 1, 10, 5, tzinfo=dt_timezone.utc)
+        
+        def populate(namespace, links):
+            for n in range(links):
+                short_url = ShortURL.objects.create(
+                    original_url=f'https://example.com/{namespace.name}/{n}',
+                    short_code=f'{namespace.name}-{n}',
+                    namespace=namespace,
+                    created_by=self.user
+                )
+                ClickEvent.objects.create(short_url=short_url, clicked_at=clicked_at)
+                self.client.get(f'/{namespace.name}/{short_url.short_code}/')
+            rollup_click_events()
+        
+        query_counts = []
+        for name, links in [('small', 1), ('large', 5)]:
+            namespace = Namespace.objects.create(name=name, organization=self.org)
+            populate(namespace, links)
+            with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+                namespace.delete()
+            query_counts.append(len(queries))
+            self.assertEqual(self.client.get(f'/{name}/{name}-0/').status_code, 404)
+        self.assertEqual(query_counts[0], query_counts[1])
+        
+        other_org = Organization.objects.create(name='Other Org')
+        for name in ['first', 'second']:
+            populate(Namespace.objects.create(name=name, organization=other_org), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            other_org.delete()
+        self.assertEqual(self.client.get('/second/second-1/').status_code, 404)
+        
+        self.assertFalse(ClickEvent.objects.exists())
+        self.assertFalse(HourClickRollup.objects.exists())
+
+    def test_click_event_buffer_drops_oldest_when_full(self):
+        """Test that a full event buffer drops events instead of growing"""
+        short_url = ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        buffer = ClickEventBuffer(capacity=3, flush_interval=3600, batch_size=100)
+        for referrer in ['a', 'b', 'c', 'd', 'e']:
+            buffer.add(short_url.pk, referrer=referrer)
+        
+        self.assertEqual(buffer.pending(), 3)
+        self.assertEqual(buffer.dropped, 2)
+        buffer.flush()
+        self.assertEqual(
+            sorted(ClickEvent.objects.values_list('referrer', flat=True)),
+            ['c', 'd', 'e']
+        )
+
+    def test_click_rollups_are_incremental_and_back_stats(self):
+        """Test that rollups only fold new events and stats read the rollup rows"""
+        short_url = ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        first_hour = datetime(2026, 1, 1, 10, 5, tzinfo=dt_timezone.utc)
+        second_hour = datetime(2026, 1, 1, 11, 30, tzinfo=dt_timezone.utc)
+        ClickEvent.objects.bulk_create(
+            [ClickEvent(short_url=short_url, clicked_at=first_hour)] * 3
+            + [ClickEvent(short_url=short_url, clicked_at=second_hour)]
+        )
+        rollup_click_events(batch_size=2)
+        
+        # Only the new event is folded in on the next run
+        ClickEvent.objects.create(short_url=short_url, clicked_at=second_hour)
+        self.assertEqual(rollup_click_events(), 1)
+        self.assertEqual(rollup_click_events(), 0)
+        self.assertEqual(
+            list(HourClickRollup.objects.order_by('bucket').values_list('clicks', flat=True)),
+            [3, 2]
+        )
+        
+        self.client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/urls/{short_url.id}/stats/', {
+                'granularity': 'hour',
+                'start': '2026-01-01T10:30:00Z',
+                'end': '2026-01-01T12:00:00Z',
+            })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_clicks'], 5)
+        self.assertEqual([bucket['clicks'] for bucket in response.data['buckets']], [3, 2])
+        # Raw events are never scanned
+        self.assertFalse(any(ClickEvent._meta.db_table in query['sql'] for query in queries))
+        
+        response = self.client.get(f'/api/urls/{short_url.id}/stats/', {'granularity': 'week'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unique_visitors_merge_across_days_and_namespace(self):
+        """Test that visitor sketches count repeat visitors once across days and links"""
+        first = ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        second = ShortURL.objects.create(
+            original_url='https://example.com',
+            short_code='def456',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        day_one = datetime(2026, 1, 1, 12, tzinfo=dt_timezone.utc)
+        day_two = datetime(2026, 1, 2, 12, tzinfo=dt_timezone.utc)
+        events = [
+            ClickEvent(short_url=first, clicked_at=day_one, ip_hash=hash_client_ip(f'10.0.0.{n}'))
+            for n in range(100)
+        ]
+        # 50 returning visitors and 50 new ones on day two, on the other link
+        events += [
+            ClickEvent(short_url=second, clicked_at=day_two, ip_hash=hash_client_ip(f'10.0.0.{n}'))
+            for n in range(50, 150)
+        ]
+        record_visitor_sketches(events[:150])
+        record_visitor_sketches(events[150:])
+        
+        self.assertAlmostEqual(unique_visitors(day_one.date(), day_one.date(), short_url_id=first.id), 100, delta=5)
+        self.assertAlmostEqual(unique_visitors(day_one.date(), day_two.date(), namespace_id=self.namespace.id), 150, delta=8)
+        self.assertAlmostEqual(unique_visitors(day_one.date(), day_two.date(), organization_id=self.org.id), 150, delta=8)
+        
+        self.client.force_authenticate(user=self.user)
+        # Count, page, and one query for the page's lifetime sketches
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/urls/')
+        self.assertEqual(len(queries), 3)
+        list_query = next(q['sql'] for q in queries.captured_queries if q['sql'].startswith('SELECT DISTINCT'))
+        self.assertNotIn('registers', list_query)
+        visitors = {row['short_code']: row['unique_visitors'] for row in response.data['results']}
+        self.assertAlmostEqual(visitors['abc123'], 100, delta=5)
+        self.assertAlmostEqual(visitors['def456'], 100, delta=5)
+
+    @override_settings(TRENDING_LINKS=True)
+    def test_trending_links_per_namespace_and_organization(self):
+        """Test that trending endpoints rank links from the published heavy-hitter summaries"""
+        other_namespace = Namespace.objects.create(name='other-namespace', organization=self.org)
+        links = {}
+        for short_code, namespace in [('abc123', self.namespace), ('def456', self.namespace), ('ghi789', other_namespace)]:
+            links[short_code] = ShortURL.objects.create(
+                original_url=f'https://example.com/{short_code}',
+                short_code=short_code,
+                namespace=namespace,
+                created_by=self.user
+            )
+        tracker = TrendingTracker(capacity=10, slice_seconds=300, window_seconds=3600, flush_interval=3600)
+        
+        with mock.patch('apps.urls.trending.trending_tracker', tracker):
+            for short_code, namespace, clicks in [
+                ('abc123', self.namespace, 2), ('def456', self.namespace, 5), ('ghi789', other_namespace, 3)
+            ]:
+                for _ in range(clicks):
+                    self.client.get(f'/{namespace.name}/{short_code}/')
+            tracker.flush()
+            
+            self.client.force_authenticate(user=self.user)
+            response = self.client.get(f'/api/namespaces/{self.namespace.id}/trending/', {'k': 5})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                [(row['short_code'], row['clicks']) for row in response.data['results']],
+                [('def456', 5), ('abc123', 2)]
+            )
+            
+            response = self.client.get(f'/api/organizations/{self.org.id}/trending/', {'k': 2})
+            self.assertEqual(
+                [row['short_code'] for row in response.data['results']],
+                ['def456', 'ghi789']
+            )
+            
+            response = self.client.get(f'/api/organizations/{self.org.id}/trending/', {'k': 0})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_click_event_partitions_are_created_and_expired(self):
+        """Test monthly partition upkeep and that time-bounded queries prune partitions"""
+        short_url = ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        # An event for a month without a partition lands in the default partition
+        early = ClickEvent.objects.create(
+            short_url=short_url, clicked_at=datetime(2030, 3, 5, tzinfo=dt_timezone.utc)
+        )
+        
+        created = create_click_partitions(months_ahead=2, today=date(2030, 1, 15))
+        self.assertEqual(created, ['urls_clickevent_p203001', 'urls_clickevent_p203002', 'urls_clickevent_p203003'])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT id FROM urls_clickevent_p203003')
+            self.assertEqual(cursor.fetchall(), [(early.id,)])
+        
+        queryset = ClickEvent.objects.filter(
+            clicked_at__gte=datetime(2030, 2, 1, tzinfo=dt_timezone.utc),
+            clicked_at__lt=datetime(2030, 3, 1, tzinfo=dt_timezone.utc),
+        )
+        plan = queryset.explain()
+        self.assertIn('urls_clickevent_p203002', plan)
+        self.assertNotIn('urls_clickevent_p203001', plan)
+        self.assertNotIn('urls_clickevent_p203003', plan)
+        
+        expired = expire_click_partitions(retention_months=1, today=date(2030, 3, 10))
+        self.assertIn('urls_clickevent_p203001', expired)
+        self.assertNotIn('urls_clickevent_p203002', expired)
+        self.assertEqual(click_partitions()[0][0], 'urls_clickevent_p203002')
+        self.assertTrue(ClickEvent.objects.filter(pk=early.pk).exists())
+
+    def test_export_streams_csv_and_ndjson(self):
+        """Test that the export endpoint streams every visible link without pagination"""
+        for n in range(25):
+            ShortURL.objects.create(
+                original_url=f'https://example.com/{n}',
+                short_code=f'code{n}',
+                namespace=self.namespace,
+                created_by=self.user,
+                click_count=n
+            )
+        other_org = Organization.objects.create(name='Other Org')
+        other_namespace = Namespace.objects.create(name='hidden-namespace', organization=other_org)
+        ShortURL.objects.create(
+            original_url='https://hidden.example.com',
+            short_code='hidden',
+            namespace=other_namespace,
+            created_by=self.user
+        )
+        self.client.force_authenticate(user=self.user)
+        
+        response = self.client.get('/api/urls/export/', {'clicks': '1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 25)
+        self.assertEqual(rows[3]['short_code'], 'code3')
+        self.assertEqual(rows[3]['click_count'], '3')
+        
+        response = self.client.get('/api/urls/export/', {'output': 'ndjson', 'organization': self.org.id})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 25)
+        self.assertNotIn('click_count', json.loads(lines[0]))
+        
+        response = self.client.get('/api/urls/export/', {'organization': other_org.id})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        
+        output = io.StringIO()
+        call_command('export_short_urls', '--output-format', 'ndjson', '--clicks', stdout=output)
+        self.assertEqual(len(output.getvalue().splitlines()), 26)
+
+    def test_redirect_fast_path_skips_middleware_stack(self):
+        """Test that redirects are answered before session/auth middleware run"""
+        ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        
+        response = self.client.get(f'/{self.namespace.name}/abc123/')
+        
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, 'https://google.com')
+        self.assertFalse(hasattr(response.wsgi_request, 'session'))
+        self.assertFalse(hasattr(response.wsgi_request, 'user'))
+        
+        # Same JSON body as the DRF view's 404
+        response = self.client.get(f'/{self.namespace.name}/missing/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'detail': 'Short URL not found'})
+    
+    def test_redirect_rejects_unsafe_methods(self):
+        """Test that non-GET requests to a short URL are not redirected"""
+        ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        
+        # Unsafe methods miss the fast path; CSRF must not turn the 405 into a 403
+        client = Client(enforce_csrf_checks=True)
+        response = client.post(f'/{self.namespace.name}/abc123/')
+        self.assertEqual(response.status_code, 405)
+    
+    def test_redirect_fast_path_checks_allowed_hosts(self):
+        """Test that a Host header outside ALLOWED_HOSTS is rejected before the redirect"""
+        ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        
+        response = self.client.get(f'/{self.namespace.name}/abc123/', HTTP_HOST='evil.example.com')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_async_redirect_over_asgi(self):
+        """Test that the ASGI handler serves redirects through the async view"""
+        short_url = await ShortURL.objects.acreate(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        client = AsyncClient()
+        
+        with mock.patch('apps.urls.middleware.redirect_short_url') as sync_view, \
+                mock.patch('apps.urls.clicks.fetch_and_count') as sync_fetch, \
+                mock.patch('apps.urls.bloom.short_code_filter') as bloom_filter:
+            response = await client.get(f'/{self.namespace.name}/abc123/')
+            missing = await client.get(f'/{self.namespace.name}/missing/')
+            bad_host = await client.get(f'/{self.namespace.name}/abc123/', headers={'host': 'evil.example.com'})
+        
+        # The miss ran on the async ORM, and the disabled Bloom filter was never consulted
+        sync_view.assert_not_called()
+        sync_fetch.assert_not_called()
+        bloom_filter.might_contain.assert_not_called()
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, 'https://google.com')
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(missing.json(), {'detail': 'Short URL not found'})
+        self.assertEqual(bad_host.status_code, 400)
+        
+        await short_url.arefresh_from_db()
+        self.assertEqual(short_url.click_count, 1)
+
+    def test_uncached_redirect_is_one_round_trip(self):
+        """Test that a cache miss looks up and counts the click in one statement"""
+        short_url = ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/{self.namespace.name}/abc123/')
+        self.assertEqual(response.url, 'https://google.com')
+        
+        with self.assertNumQueries(1):
+            missing = self.client.get(f'/{self.namespace.name}/missing/')
+        self.assertEqual(missing.status_code, 404)
+        
+        short_url.refresh_from_db()
+        self.assertEqual(short_url.click_count, 1)
+
+    def test_known_namespace_skips_namespace_join(self):
+        """Test that a cached namespace id lets the lookup filter on namespace_id"""
+        ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        
+        # The first lookup joins on the name and learns the namespace id
+        fetch_resolution(self.namespace.name, 'abc123')
+        
+        with self.assertNumQueries(1) as queries:
+            resolved = fetch_resolution(self.namespace.name, 'abc123')
+        self.assertEqual(resolved.original_url, 'https://google.com')
+        self.assertNotIn('namespaces_namespace', queries.captured_queries[0]['sql'])
+
+    @override_settings(SHORT_CODE_BLOOM_FILTER=True)
+    def test_bloom_filter_skips_database_for_unknown_codes(self):
+        """Test that codes missing from the Bloom filter 404 without a query"""
+        ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        short_code_filter.rebuild()
+        
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/{self.namespace.name}/missing/')
+        self.assertEqual(response.status_code, 404)
+        
+        # Codes saved after the rebuild are added by the save signal
+        ShortURL.objects.create(
+            original_url='https://example.com',
+            short_code='def456',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        self.assertEqual(self.client.get(f'/{self.namespace.name}/abc123/').status_code, 302)
+        self.assertEqual(self.client.get(f'/{self.namespace.name}/def456/').status_code, 302)
+    
+    @override_settings(SHORT_CODE_BLOOM_FILTER=True)
+    def test_bloom_filter_syncs_other_workers_codes_in_the_background(self):
+        """Test that a due sync is handed to the background thread instead of querying in the request"""
+        short_code_filter.rebuild()
+        # Inserted without the save signal, as by another worker
+        ShortURL.objects.bulk_create([ShortURL(
+            original_url='https://example.com',
+            short_code='def456',
+            namespace=self.namespace,
+            created_by=self.user
+        )])
+        short_code_filter._last_sync_check = 0
+        
+        with mock.patch.object(short_code_filter, '_start_background') as start, self.assertNumQueries(0):
+            self.assertEqual(self.client.get(f'/{self.namespace.name}/def456/').status_code, 404)
+        start.assert_called_once_with(short_code_filter.sync)
+        
+        short_code_filter.sync()
+        self.assertEqual(self.client.get(f'/{self.namespace.name}/def456/').status_code, 302)
+    
+    @override_settings(SHORT_CODE_BLOOM_FILTER=True)
+    def test_generated_short_code_skips_uniqueness_query(self):
+        """Test that generating a short code needs no exists() query"""
+        short_code_filter.rebuild()
+        self.client.force_authenticate(user=self.user)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/urls/', {
+                'original_url': 'https://example.com',
+                'namespace': self.namespace.id
+            })
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        short_code_checks = [q for q in queries.captured_queries if '"short_code" =' in q['sql'] and 'LIMIT 1' in q['sql']]
+        self.assertEqual(short_code_checks, [])
+
+    def test_generated_codes_decode_and_reserve_their_range(self):
+        """Test that generated codes decode to sequence values and cannot be chosen as custom codes"""
+        self.client.force_authenticate(user=self.user)
+        
+        codes = []
+        for n in range(2):
+            response = self.client.post('/api/urls/', {
+                'original_url': f'https://example.com/{n}',
+                'namespace': self.namespace.id
+            })
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+            codes.append(response.data['short_code'])
+        self.assertNotEqual(decode_short_code(codes[0]), decode_short_code(codes[1]))
+        
+        # The next generated code is taken as a custom code before it is allocated
+        reserved = ShortCodePermutation(
+            settings.SECRET_KEY.encode(), settings.SHORT_CODE_CHARSET,
+            settings.SHORT_CODE_LENGTH, settings.SHORT_CODE_SPARSITY
+        ).encode(decode_short_code(codes[1]) + 1)
+        response = self.client.post('/api/urls/', {
+            'original_url': 'https://example.com/custom',
+            'short_code': reserved,
+            'namespace': self.namespace.id
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('short_code', response.data)
+    
+    def test_generated_code_skips_legacy_collision(self):
+        """Test that a generated code already saved as a legacy random code is skipped"""
+        self.client.force_authenticate(user=self.user)
+        taken, free = allocate_short_code(), allocate_short_code()
+        ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code=taken,
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        
+        with mock.patch('apps.urls.serializers.allocate_short_code', side_effect=[taken, free]):
+            response = self.client.post('/api/urls/', {
+                'original_url': 'https://example.com',
+                'namespace': self.namespace.id
+            })
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(response.data['short_code'], free)
+
+    def create_links(self, count, namespace=None):
+        return [
+            ShortURL.objects.create(
+                original_url=f'https://example.com/{n}',
+                short_code=f'code{n}',
+                namespace=namespace or self.namespace,
+                created_by=self.user
+            )
+            for n in range(count)
+        ]
+    
+    def test_bulk_delete_removes_links_click_data_and_cached_redirects(self):
+        """Test that bulk delete runs one DELETE per table and stops cached redirects"""
+        links = self.create_links(3)
+        hidden = ShortURL.objects.create(
+            original_url='https://hidden.example.com',
+            short_code='hidden',
+            namespace=Namespace.objects.create(name='hidden', organization=Organization.objects.create(name='Other Org')),
+        )
+        ClickCountShard.objects.create(short_url=links[0], shard=0, count=5)
+        ClickEvent.objects.create(short_url=links[0], clicked_at=datetime(2024, 1, 1, tzinfo=dt_timezone.utc))
+        # Cache the redirect before deleting
+        self.assertEqual(self.client.get(f'/{self.namespace.name}/code0/').status_code, 302)
+        self.client.force_authenticate(user=self.user)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/urls/bulk-delete/', {
+                'ids': [links[0].id, links[1].id, hidden.id, 999999]
+            }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data, {'deleted': 2, 'not_found': sorted([hidden.id, 999999])})
+        self.assertEqual(list(ShortURL.objects.values_list('short_code', flat=True).order_by('pk')), ['code2', 'hidden'])
+        self.assertFalse(ClickCountShard.objects.exists())
+        self.assertFalse(ClickEvent.objects.exists())
+        deletes = [q for q in queries.captured_queries if q['sql'].startswith('DELETE FROM "urls_shorturl"')]
+        self.assertEqual(len(deletes), 1)
+        self.assertIn('= ANY(', deletes[0]['sql'])
+        self.assertEqual(self.client.get(f'/{self.namespace.name}/code0/').status_code, 404)
+        
+        response = self.client.post('/api/urls/bulk-delete/', {'namespace': self.namespace.id}, format='json')
+        self.assertEqual(response.data['deleted'], 1)
+    
+    def test_bulk_actions_require_editor_role(self):
+        """Test that a viewer cannot bulk delete, and nothing is deleted"""
+        links = self.create_links(2)
+        viewer = User.objects.create_user(username='viewer', password='pass123')
+        OrganizationMember.objects.create(organization=self.org, user=viewer, role='VIEWER')
+        self.client.force_authenticate(user=viewer)
+        
+        response = self.client.post('/api/urls/bulk-delete/', {'ids': [link.id for link in links]}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(ShortURL.objects.count(), 2)
+        
+        # A JSON array instead of an object is a client error, not a 500
+        for path in ['bulk-delete', 'bulk-move', 'bulk-update']:
+            response = self.client.post(f'/api/urls/{path}/', [link.id for link in links], format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_bulk_move_and_update_destination(self):
+        """Test that moved and re-pointed links redirect by their new key and URL"""
+        links = self.create_links(3)
+        target = Namespace.objects.create(name='target-namespace', organization=self.org)
+        for link in links:
+            self.assertEqual(self.client.get(f'/{self.namespace.name}/{link.short_code}/').status_code, 302)
+        self.client.force_authenticate(user=self.user)
+        
+        response = self.client.post('/api/urls/bulk-move/', {
+            'ids': [links[0].id, links[1].id],
+            'namespace': target.id
+        }, format='json')
+        self.assertEqual(response.data, {'moved': 2, 'not_found': []})
+        self.assertEqual(self.client.get(f'/{self.namespace.name}/code0/').status_code, 404)
+        self.assertEqual(self.client.get(f'/{target.name}/code0/').status_code, 302)
+        
+        response = self.client.post('/api/urls/bulk-update/', {'updates': [
+            {'id': links[0].id, 'original_url': 'https://new.example.com/0'},
+            {'id': links[2].id, 'original_url': 'https://new.example.com/2'},
+        ]}, format='json')
+        self.assertEqual(response.data, {'updated': 2, 'not_found': []})
+        self.assertEqual(self.client.get(f'/{self.namespace.name}/code2/')['Location'], 'https://new.example.com/2')
+        links[2].refresh_from_db()
+        self.assertEqual(bytes(links[2].original_url_digest), url_digest('https://new.example.com/2'))
+        
+        # A destination another link already has is rejected as a whole
+        response = self.client.post('/api/urls/bulk-update/', {'updates': [
+            {'id': links[1].id, 'original_url': 'https://NEW.example.com/0'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('target-namespace/code0', response.data['error'])
+        
+        # Links may swap destinations within one request
+        response = self.client.post('/api/urls/bulk-update/', {'updates': [
+            {'id': links[0].id, 'original_url': 'https://new.example.com/2'},
+            {'id': links[2].id, 'original_url': 'https://new.example.com/0'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(self.client.get(f'/{target.name}/code0/')['Location'], 'https://new.example.com/2')
+        links[2].refresh_from_db()
+        self.assertEqual(bytes(links[2].original_url_digest), url_digest('https://new.example.com/0'))
+    
+    @override_settings(BULK_ACTION_MAX_ITEMS=2)
+    def test_bulk_delete_of_a_namespace_runs_in_batches(self):
+        """Test that emptying a namespace deletes at most BULK_ACTION_MAX_ITEMS rows per statement"""
+        self.create_links(5)
+        self.client.force_authenticate(user=self.user)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/urls/bulk-delete/', {'namespace': self.namespace.id}, format='json')
+        
+        self.assertEqual(response.data, {'deleted': 5, 'not_found': []})
+        self.assertFalse(ShortURL.objects.exists())
+        deletes = [q for q in queries.captured_queries if q['sql'].startswith('DELETE FROM "urls_shorturl"')]
+        self.assertEqual(len(deletes), 3)
+        # Every batch checks permissions against the request's one membership lookup
+        role_lookups = [q for q in queries.captured_queries if 'FROM "organizations_organizationmember"' in q['sql']]
+        self.assertEqual(len(role_lookups), 1)
+        
+        # JSON true is not a namespace id
+        response = self.client.post('/api/urls/bulk-delete/', {'namespace': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/api/urls/bulk-move/', {'ids': [1], 'namespace': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_import_command_checkpoints_and_resumes(self):
+        """Test that the import command writes rejects and resumes after the checkpoint"""
+        ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        import_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, import_dir)
+        path = os.path.join(import_dir, 'links.csv')
+        rows = [
+            ['https://example.com/1', 'legacy1', 'test-namespace'],
+            ['https://example.com/2', '', ''],
+            ['not a url', 'legacy3', 'test-namespace'],
+            ['https://example.com/4', 'legacy4', 'missing-namespace'],
+            ['https://google.com', 'legacy5', 'test-namespace'],
+        ]
+        with open(path, 'w', newline='') as source:
+            writer = csv.writer(source)
+            writer.writerow(['original_url', 'short_code', 'namespace_name'])
+            writer.writerows(rows)
+        
+        output = io.StringIO()
+        call_command('import_short_urls', path, '--namespace', 'test-namespace', '--chunk-size', '2', stdout=output)
+        self.assertIn('Imported 2 short URLs from 5 rows', output.getvalue())
+        self.assertEqual(ShortURL.objects.filter(short_code='legacy1').count(), 1)
+        self.assertEqual(ShortURL.objects.get(original_url='https://example.com/2').namespace, self.namespace)
+        with open(f'{path}.rejects.ndjson') as rejects:
+            rejected = [json.loads(line) for line in rejects]
+        self.assertEqual([reject['row'] for reject in rejected], [3, 4, 5])
+        self.assertEqual([list(reject['errors']) for reject in rejected], [['original_url'], ['namespace'], ['original_url']])
+        
+        # Rows appended after the checkpoint are the only ones read on resume
+        with open(path, 'a', newline='') as source:
+            csv.writer(source).writerow(['https://example.com/6', 'legacy6', 'test-namespace'])
+        output = io.StringIO()
+        call_command('import_short_urls', path, '--resume', stdout=output)
+        self.assertIn('Resuming after row 5', output.getvalue())
+        self.assertIn('Imported 3 short URLs from 6 rows', output.getvalue())
+        with open(f'{path}.rejects.ndjson') as rejects:
+            self.assertEqual(len(rejects.readlines()), 3)
+        self.assertEqual(ShortURL.objects.count(), 4)
+    
+    def test_import_command_rejects_a_conflicting_chunk_and_carries_on(self):
+        """Test that a chunk that keeps conflicting with concurrent writes goes to the rejects file"""
+        import_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, import_dir)
+        path = os.path.join(import_dir, 'links.csv')
+        with open(path, 'w', newline='') as source:
+            writer = csv.writer(source)
+            writer.writerow(['original_url', 'namespace_name'])
+            writer.writerows([[f'https://example.com/{n}', 'test-namespace'] for n in range(3)])
+        calls = []
+        
+        def conflict_once(user, items):
+            calls.append(items)
+            if len(calls) == 1:
+                raise BulkCreateConflict("Short URLs were created concurrently with this request. Please retry.")
+            return bulk_create_short_urls(user, items)
+        
+        output = io.StringIO()
+        with mock.patch('apps.urls.imports.bulk_create_short_urls', conflict_once):
+            call_command('import_short_urls', path, '--chunk-size', '2', stdout=output)
+        
+        self.assertIn('Imported 1 short URLs from 3 rows', output.getvalue())
+        with open(f'{path}.rejects.ndjson') as rejects:
+            rejected = [json.loads(line) for line in rejects]
+        self.assertEqual([reject['row'] for reject in rejected], [1, 2])
+        self.assertIn('concurrently', rejected[0]['errors']['row'][0])
+    
+    def test_import_command_rejects_malformed_csv_records(self):
+        """Test that a record the CSV reader cannot parse is rejected and the import goes on"""
+        import_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, import_dir)
+        path = os.path.join(import_dir, 'links.csv')
+        with open(path, 'w', newline='') as source:
+            source.write('original_url,namespace_name\r\n')
+            source.write('https://example.com/1,test-namespace\r\n')
+            # Longer than csv.field_size_limit()
+            source.write('"https://example.com/' + 'x' * 200000 + '",test-namespace\r\n')
+            source.write('https://example.com/3,test-namespace\r\n')
+        
+        output = io.StringIO()
+        call_command('import_short_urls', path, stdout=output)
+        
+        self.assertIn('Imported 2 short URLs from 3 rows', output.getvalue())
+        with open(f'{path}.rejects.ndjson') as rejects:
+            rejected = [json.loads(line) for line in rejects]
+        self.assertEqual([reject['row'] for reject in rejected], [2])
+        self.assertIn('Invalid CSV', rejected[0]['errors']['row'][0])
+        with open(f'{path}.checkpoint') as checkpoint:
+            self.assertEqual(json.load(checkpoint)['rows'], 3)
+    
+    def test_import_endpoint_checks_namespace_permissions(self):
+        """Test that uploaded rows are created only in namespaces the user can edit"""
+        Namespace.objects.create(name='other-namespace', organization=Organization.objects.create(name='Other Org'))
+        self.client.force_authenticate(user=self.user)
+        lines = [
+            {'original_url': 'https://example.com/1', 'namespace_name': 'test-namespace'},
+            {'original_url': 'https://example.com/2', 'namespace_name': 'other-namespace'},
+        ]
+        upload = SimpleUploadedFile(
+            'links.ndjson',
+            (''.join(json.dumps(line) + '\n' for line in lines) + '{broken\n').encode()
+        )
+        
+        response = self.client.post('/api/urls/import/', {'file': upload})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual((response.data['rows'], response.data['created'], response.data['rejected']), (3, 1, 2))
+        self.assertEqual([reject['row'] for reject in response.data['rejects']], [2, 3])
+        self.assertEqual(ShortURL.objects.get().original_url, 'https://example.com/1')
+
+    def test_redirects_served_from_snapshot(self):
+        """Test that exported links resolve from the snapshot and later edits override it"""
+        edited = ShortURL.objects.create(
+            original_url='https://google.com',
+            short_code='abc123',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        deleted = ShortURL.objects.create(
+            original_url='https://example.com',
+            short_code='def456',
+            namespace=self.namespace,
+            created_by=self.user
+        )
+        snapshot_dir = tempfile.mkdtemp()
+        snapshot_path = os.path.join(snapshot_dir, 'redirects.snapshot')
+        self.addCleanup(lambda: os.path.exists(snapshot_path) and os.unlink(snapshot_path))
+        call_command('export_redirect_snapshot', output=snapshot_path, stdout=open(os.devnull, 'w'))
+        
+        with override_settings(REDIRECT_SNAPSHOT_PATH=snapshot_path):
+            # Only the click count update reaches the database
+            with self.assertNumQueries(1):
+                response = self.client.get(f'/{self.namespace.name}/abc123/')
+            self.assertEqual(response.url, 'https://google.com')
+            
+            with self.captureOnCommitCallbacks(execute=True):
+                edited.original_url = 'https://google.com/new'
+                edited.save()
+                deleted.delete()
+            
+            self.assertEqual(self.client.get(f'/{self.namespace.name}/abc123/').url, 'https://google.com/new')
+            self.assertEqual(self.client.get(f'/{self.namespace.name}/def456/').status_code, 404)
+
+
+class RedirectQueryPlanTests(TransactionTestCase):
+    """Test that the redirect lookup probes the short_code key without a namespace join"""
+    
+    def setUp(self):
+        clear_redirect_caches()
+        org = Organization.objects.create(name='Test Org')
+        self.namespace = Namespace.objects.create(name='test-namespace', organization=org)
+        ShortURL.objects.bulk_create([
+            ShortURL(
+                original_url=f'https://example.com/{i}',
+                short_code=f'code{i}',
+                namespace=self.namespace
+            )
+            for i in range(1000)
+        ])
+        # Plan against real statistics rather than an empty-table estimate
+        with connection.cursor() as cursor:
+            cursor.execute(f'VACUUM ANALYZE {ShortURL._meta.db_table}')
+    
+    def test_redirect_lookup_uses_short_code_key(self):
+        """Test that the plan scans a short_code index and never reads the namespace table"""
+        remember_namespace_id(self.namespace.name, self.namespace.id, namespace_generation())
+        with CaptureQueriesContext(connection) as queries:
+            resolved = fetch_resolution(self.namespace.name, 'code500')
+        self.assertEqual(resolved.original_url, 'https://example.com/500')
+        
+        # Explain the exact statement the redirect lookup ran
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + queries.captured_queries[0]['sql'])
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        
+        # Either of Django's two indexes on short_code: the unique key or its _like twin
+        self.assertRegex(plan, r'Index Scan using urls_shorturl_short_code_(key|[0-9a-f]{8}_like) on urls_shorturl')
+        self.assertIn("Index Cond: ((short_code)::text = 'code500'::text)", plan)
+        self.assertNotIn('Seq Scan', plan)
+        self.assertNotIn('namespaces_namespace', plan)
+
+
+class ShortCodeBlockPoolTests(TransactionTestCase):
+    """Test hi/lo reservation of short code indexes"""
+    
+    def allocator_queries(self, queries):
+        return [q for q in queries.captured_queries if 'urls_shortcodeallocator' in q['sql']]
+    
+    def test_reserves_one_block_per_block_size(self):
+        """Test that indexes come from the local pool until the block is used up"""
+        pool = ShortCodeBlockPool(block_size=5)
+        other = ShortCodeBlockPool(block_size=5)
+        
+        with CaptureQueriesContext(connection) as queries:
+            first = pool.take(3) + pool.take(2)
+            second = other.take(1)
+            third = pool.take(1)
+        
+        self.assertEqual(first, [0, 1, 2, 3, 4])
+        self.assertEqual(second, [5])
+        self.assertEqual(third, [10])
+        self.assertEqual(len(self.allocator_queries(queries)), 3)
+    
+    def test_rolled_back_block_is_not_pooled(self):
+        """Test that a block reserved in a rolled back transaction is not handed out again"""
+        pool = ShortCodeBlockPool(block_size=5)
+        try:
+            with transaction.atomic():
+                self.assertEqual(pool.take(1), [0])
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(pool.take(1), [0])
+            self.assertEqual(pool.take(1), [1])
+        self.assertEqual(len(self.allocator_queries(queries)), 1)
+    
+    def test_create_runs_no_code_generation_queries(self):
+        """Test that creating a short URL takes its code from the pool"""
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        org = Organization.objects.create(name='Test Org')
+        OrganizationMember.objects.create(organization=org, user=user, role='ADMIN')
+        namespace = Namespace.objects.create(name='test-namespace', organization=org)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        allocate_short_code()
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post('/api/urls/', {
+                'original_url': 'https://example.com',
+                'namespace': namespace.id
+            })
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(self.allocator_queries(queries), [])
+
+
+class BloomFilterTests(SimpleTestCase):
+    """Test the Bloom filter's membership answers"""
+    
+    def test_no_false_negatives_and_few_false_positives(self):
+        """Test that added items are always found and the false-positive rate is respected"""
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f'code{i}')
+        
+        self.assertTrue(all(f'code{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'other{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class HyperLogLogTests(SimpleTestCase):
+    """Test the HyperLogLog sketch on its own"""
+    
+    def test_estimate_and_merge_within_error(self):
+        """Test that estimates stay within a few percent and merging unions the sets"""
+        first = HyperLogLog()
+        second = HyperLogLog()
+        for n in range(20000):
+            value = int(hash_client_ip(f'visitor-{n}')[:16], 16)
+            (first if n < 12000 else second).add_hash(value)
+            if 8000 <= n < 12000:
+                second.add_hash(value)
+        
+        self.assertAlmostEqual(first.count(), 12000, delta=12000 * 0.05)
+        first.merge(second)
+        self.assertAlmostEqual(first.count(), 20000, delta=20000 * 0.05)
+        self.assertEqual(len(first.to_bytes()), 4096)
+
+
+class ShortCodePermutationTests(SimpleTestCase):
+    """Test the keyed permutation behind generated short codes"""
+    
+    def test_encode_is_a_bijection(self):
+        """Test that distinct indexes give distinct codes that decode back"""
+        permutation = ShortCodePermutation(b'key', 'abcdefghij', 5, 10)
+        codes = [permutation.encode(index) for index in range(permutation.capacity)]
+        
+        self.assertEqual(len(set(codes)), permutation.capacity)
+        self.assertTrue(all(len(code) == 5 for code in codes))
+        self.assertEqual([permutation.decode(code) for code in codes], list(range(permutation.capacity)))
+        # Consecutive indexes do not give neighbouring codes
+        self.assertNotEqual(codes[:10], sorted(codes[:10]))
+    
+    def test_rejects_codes_it_could_not_generate(self):
+        """Test that decode rejects malformed and out-of-range codes"""
+        permutation = ShortCodePermutation(b'key', 'abcdefghij', 5, 10)
+        generated = {permutation.encode(index) for index in range(permutation.capacity)}
+        outside = next(
+            code for code in (permutation.encode(0)[:4] + c for c in 'abcdefghij')
+            if code not in generated
+        )
+        
+        for code in ['abcd', 'abcdef', 'abcdz', outside]:
+            with self.assertRaises(ValueError):
+                permutation.decode(code)
+        with self.assertRaises(ShortCodeSpaceExhausted):
+            permutation.encode(permutation.capacity)
+
+
+class CanonicalURLTests(SimpleTestCase):
+    """Test the canonical form used for URL duplicate detection"""
+    
+    def test_equivalent_spellings_share_a_digest(self):
+        """Test that host case, default ports and query order do not matter"""
+        self.assertEqual(canonicalize_url('HTTPS://Example.COM:443'), 'https://example.com/')
+        self.assertEqual(canonicalize_url('http://example.com:80/a?b=2&a=1&b=1'), 'http://example.com/a?a=1&b=2&b=1')
+        self.assertEqual(canonicalize_url('http://User:Pw@Example.com:8080/Path'), 'http://User:Pw@example.com:8080/Path')
+        self.assertEqual(url_digest('https://Example.com/x?b=1&a=2'), url_digest('https://example.com:443/x?a=2&b=1'))
+        self.assertEqual(len(url_digest('https://example.com')), 32)
+        self.assertNotEqual(url_digest('https://example.com/Path'), url_digest('https://example.com/path'))
+    
+    @override_settings(URL_CANONICAL_SORT_QUERY=False)
+    def test_query_order_is_kept_when_sorting_is_off(self):
+        """Test that query parameters keep their order when sorting is disabled"""
+        self.assertEqual(canonicalize_url('https://example.com/?b=1&a=2'), 'https://example.com/?b=1&a=2')
+
+
+class SpaceSavingTests(SimpleTestCase):
+    """Test the Space-Saving heavy-hitters summary"""
+    
+    def test_heavy_hitters_survive_a_long_tail(self):
+        """Test that frequent items stay tracked with bounded error across merges"""
+        first = SpaceSaving(capacity=10)
+        second = SpaceSaving(capacity=10)
+        for n in range(1000):
+            first.add(f'tail-{n}')
+            second.add(f'other-tail-{n}')
+            if n % 4 == 0:
+                first.add('hot')
+                second.add('hot')
+            if n % 3 == 0:
+                second.add('warm')
+        
+        first.merge(SpaceSaving.from_list(10, second.to_list()))
+        (top, count, error), (runner_up, _, _) = first.top(2)
+        self.assertEqual((top, runner_up), ('hot', 'warm'))
+        self.assertLessEqual(count - error, 500)
+        self.assertGreaterEqual(count, 500)
+        self.assertLessEqual(len(first.counters), 10)
+    
+    def test_counts_stay_bounded_over_many_replacements(self):
+        """Test that counters keep the Space-Saving bounds while the heap stays small"""
+        summary = SpaceSaving(capacity=20)
+        true_counts = {}
+        for n in range(5000):
+            item = n % 7 if n % 2 else n
+            summary.add(item)
+            true_counts[item] = true_counts.get(item, 0) + 1
+        
+        # Once full, the counters add up to the length of the stream
+        self.assertEqual(sum(count for count, _ in summary.counters.values()), 5000)
+        for item, (count, error) in summary.counters.items():
+            self.assertLessEqual(count - error, true_counts[item])
+            self.assertGreaterEqual(count, true_counts[item])
+        self.assertEqual({item for item, _, _ in summary.top(7)}, set(range(7)))
+        self.assertLessEqual(len(summary._heap), 40)
+
+
+class ResolutionCacheTests(SimpleTestCase):
+    """Test LRU eviction and TTL expiry of the resolution cache"""
+    
+    def test_evicts_least_recently_used(self):
+        """Test that the oldest untouched entry is evicted when full"""
+        cache = ResolutionCache(max_size=2, ttl=60)
+        cache.set(('ns', 'a'), ResolvedShortURL(1, 'https://a.com', 1))
+        cache.set(('ns', 'b'), ResolvedShortURL(2, 'https://b.com', 1))
+        
+        # Touch 'a' so that 'b' becomes the least recently used entry
+        cache.get(('ns', 'a'))
+        cache.set(('ns', 'c'), ResolvedShortURL(3, 'https://c.com', 1))
+        
+        self.assertIsNotNone(cache.get(('ns', 'a')))
+        self.assertIsNone(cache.get(('ns', 'b')))
+        self.assertIsNotNone(cache.get(('ns', 'c')))
+    
+    def test_expired_entries_are_misses(self):
+        """Test that entries older than the TTL are not served"""
+        cache = ResolutionCache(max_size=10, ttl=5)
+        with mock.patch('apps.urls.cache.time.monotonic', return_value=100):
+            cache.set(('ns', 'a'), ResolvedShortURL(1, 'https://a.com', 1))
+        with mock.patch('apps.urls.cache.time.monotonic', return_value=106):
+            self.assertIsNone(cache.get(('ns', 'a')))
+        
+        self.assertEqual(cache.stats()['misses'], 1)
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    """Test the system checks for settings that need a shared cache"""
+    
+    def test_snapshot_requires_shared_cache(self):
+        """Test that a redirect snapshot is rejected with a per-process cache"""
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}
+        
+        with override_settings(REDIRECT_SNAPSHOT_PATH='/tmp/redirects.snap', CACHES=locmem):
+            self.assertEqual([e.id for e in check_redirect_snapshot_cache(None)], ['urls.E001'])
+        with override_settings(REDIRECT_SNAPSHOT_PATH='/tmp/redirects.snap', CACHES=redis):
+            self.assertEqual(check_redirect_snapshot_cache(None), [])
+        with override_settings(REDIRECT_SNAPSHOT_PATH='', CACHES=locmem):
+            self.assertEqual(check_redirect_snapshot_cache(None), [])
+    
+    def test_trending_links_require_shared_cache(self):
+        """Test that trending links are rejected with a per-process cache"""
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}
+        
+        with override_settings(TRENDING_LINKS=True, CACHES=locmem):
+            self.assertEqual([e.id for e in check_trending_links_cache(None)], ['urls.E002'])
+        with override_settings(TRENDING_LINKS=True, CACHES=redis):
+            self.assertEqual(check_trending_links_cache(None), [])
+        with override_settings(TRENDING_LINKS=False, CACHES=locmem):
+            self.assertEqual(check_trending_links_cache(None), [])
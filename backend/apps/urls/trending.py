@@ -0,0 +1,279 @@
+"""
+Trending links: streaming top-K heavy hitters per namespace over a sliding
+window, fed from the redirect path
+"""
+import heapq
+import os
+import threading
+import time
+from django.conf import settings
+from .cache import get_shared_cache
+from .clicks import BackgroundFlusher
+from .models import ShortURL
+
+# Largest k a trending request may ask for
+MAX_TRENDING_K = 100
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitters summary over at most capacity counters.
+
+    Every item whose true count exceeds total / capacity is guaranteed to be
+    tracked. A tracked item's count overestimates its true count by at most
+    its error. The smallest counter is found through a min-heap, so adding
+    an untracked item costs O(log capacity) rather than a scan.
+    """
+
+    def __init__(self, capacity, counters=None):
+        self.capacity = capacity
+        # item -> [count, error]
+        self.counters = counters or {}
+        # (count, item) min-heap built lazily from counters. Counts only grow,
+        # so an entry whose count is no longer the item's is stale and skipped.
+        self._heap = None
+
+    def add(self, item, count=1):
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += count
+        elif len(self.counters) < self.capacity:
+            counter = self.counters[item] = [count, 0]
+        else:
+            # Replace the smallest counter; the new item inherits its count as error
+            floor = self._pop_smallest()
+            counter = self.counters[item] = [floor + count, floor]
+        self._push(item, counter[0])
+
+    def _push(self, item, count):
+        # Stale entries pile up as counts grow; rebuilding once the heap is
+        # twice the counters keeps it bounded at amortized O(1) per add
+        if self._heap is None or len(self._heap) >= 2 * self.capacity:
+            self._rebuild_heap()
+        else:
+            heapq.heappush(self._heap, (count, item))
+
+    def _rebuild_heap(self):
+        self._heap = [(counter[0], item) for item, counter in self.counters.items()]
+        heapq.heapify(self._heap)
+
+    def _pop_smallest(self):
+        # Remove the item with the smallest counter and return its count
+        if self._heap is None:
+            self._rebuild_heap()
+        while True:
+            count, item = heapq.heappop(self._heap)
+            counter = self.counters.get(item)
+            if counter is not None and counter[0] == count:
+                del self.counters[item]
+                return count
+
+    def _floor(self):
+        # Upper bound on the count of an item this summary does not track
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(counter[0] for counter in self.counters.values())
+
+    def merge(self, other):
+        """Fold another summary into this one, keeping the capacity largest counters."""
+        own_floor, other_floor = self._floor(), other._floor()
+        merged = {}
+        for item in self.counters.keys() | other.counters.keys():
+            own = self.counters.get(item, [own_floor, own_floor])
+            theirs = other.counters.get(item, [other_floor, other_floor])
+            merged[item] = [own[0] + theirs[0], own[1] + theirs[1]]
+        largest = sorted(merged.items(), key=lambda entry: entry[1][0], reverse=True)[:self.capacity]
+        self.counters = dict(largest)
+        self._heap = None
+
+    def top(self, k):
+        """Return [(item, count, error)] for the k largest counters."""
+        ranked = sorted(self.counters.items(), key=lambda entry: entry[1][0], reverse=True)[:k]
+        return [(item, count, error) for item, (count, error) in ranked]
+
+    def to_list(self):
+        return [[item, count, error] for item, (count, error) in self.counters.items()]
+
+    @classmethod
+    def from_list(cls, capacity, rows):
+        return cls(capacity, {item: [count, error] for item, count, error in rows})
+
+
+def _slots_key(slice_index):
+    return f'trending:{slice_index}:slots'
+
+
+def _slot_key(slice_index, slot):
+    return f'trending:{slice_index}:{slot}'
+
+
+class TrendingTracker(BackgroundFlusher):
+    """
+    Per-worker Space-Saving summaries of clicks per namespace, in time
+    slices of slice_seconds.
+
+    Recording a click only touches memory. A background thread publishes
+    this worker's summaries for the current slice to the shared cache every
+    flush_interval seconds, each worker under its own slot number so
+    publishing never overwrites another worker's counts. Readers merge the
+    summaries of every slot of every slice in the window.
+    """
+    thread_name = 'trending-publish'
+
+    def __init__(self, capacity, slice_seconds, window_seconds, flush_interval):
+        super().__init__(flush_interval)
+        self.capacity = capacity
+        self.slice_seconds = slice_seconds
+        self.window_seconds = window_seconds
+        self._slice = None
+        self._sketches = {}
+        # Summaries of the slice that just ended, published once more
+        self._finished = {}
+        self._slots = {}
+        self._slots_pid = None
+        self._lock = threading.Lock()
+
+    def _slice_index(self, now=None):
+        return int((now or time.time()) // self.slice_seconds)
+
+    def add(self, namespace_id, short_url_id):
+        """Count one click on a short URL in the given namespace."""
+        self._ensure_started()
+        slice_index = self._slice_index()
+        with self._lock:
+            if slice_index != self._slice:
+                if self._slice is not None:
+                    self._finished[self._slice] = self._sketches
+                self._slice = slice_index
+                self._sketches = {}
+            sketch = self._sketches.get(namespace_id)
+            if sketch is None:
+                sketch = self._sketches[namespace_id] = SpaceSaving(self.capacity)
+            sketch.add(short_url_id)
+
+    def flush(self):
+        """Publish this worker's summaries to the shared cache."""
+        with self._lock:
+            pending = dict(self._finished)
+            self._finished = {}
+            if self._slice is not None:
+                pending[self._slice] = {
+                    namespace_id: SpaceSaving(sketch.capacity, {
+                        item: list(counter) for item, counter in sketch.counters.items()
+                    })
+                    for namespace_id, sketch in self._sketches.items()
+                }
+        if not pending:
+            return
+
+        cache = get_shared_cache()
+        timeout = self.window_seconds + 2 * self.slice_seconds
+        for slice_index, sketches in pending.items():
+            slot = self._slot_for(cache, slice_index, timeout)
+            cache.set(
+                _slot_key(slice_index, slot),
+                {namespace_id: sketch.to_list() for namespace_id, sketch in sketches.items()},
+                timeout,
+            )
+        # Forget slot numbers of slices that left the window
+        oldest = self._slice_index() - self.window_seconds // self.slice_seconds - 1
+        self._slots = {index: slot for index, slot in self._slots.items() if index >= oldest}
+
+    def _slot_for(self, cache, slice_index, timeout):
+        # A forked worker must not reuse its parent's slots
+        if self._slots_pid != os.getpid():
+            self._slots_pid = os.getpid()
+            self._slots = {}
+        slot = self._slots.get(slice_index)
+        if slot is None:
+            cache.add(_slots_key(slice_index), 0, timeout)
+            slot = self._slots[slice_index] = cache.incr(_slots_key(slice_index))
+        return slot
+
+    def trending(self, namespace_ids, k):
+        """
+        Merge every published summary in the window for the given namespaces.
+
+        Returns:
+            list of (short_url_id, clicks, error), largest first
+        """
+        cache = get_shared_cache()
+        current = self._slice_index()
+        slices = range(current - self.window_seconds // self.slice_seconds + 1, current + 1)
+        slot_counts = cache.get_many([_slots_key(index) for index in slices])
+        keys = [
+            _slot_key(index, slot)
+            for index in slices
+            for slot in range(1, (slot_counts.get(_slots_key(index)) or 0) + 1)
+        ]
+
+        merged = SpaceSaving(self.capacity)
+        namespace_ids = set(namespace_ids)
+        for published in cache.get_many(keys).values():
+            for namespace_id, rows in published.items():
+                if namespace_id in namespace_ids:
+                    merged.merge(SpaceSaving.from_list(self.capacity, rows))
+        return merged.top(k)
+
+
+trending_tracker = TrendingTracker(
+    capacity=settings.TRENDING_CAPACITY,
+    slice_seconds=settings.TRENDING_SLICE_SECONDS,
+    window_seconds=settings.TRENDING_WINDOW_SECONDS,
+    flush_interval=settings.TRENDING_PUBLISH_INTERVAL,
+)
+
+
+def record_trending_click(resolved):
+    """Count a redirect towards trending links, unless TRENDING_LINKS is disabled."""
+    if settings.TRENDING_LINKS:
+        trending_tracker.add(resolved.namespace_id, resolved.pk)
+
+
+def trending_links(namespace_ids, k):
+    """
+    Return the top k links over the trending window among the namespaces.
+
+    Links are looked up by primary key for display; deleted links and links
+    moved out of the namespaces are skipped.
+
+    Returns:
+        list of dicts with id, short_code, original_url, namespace_name,
+        clicks (estimated) and error (how much clicks may be overestimated)
+    """
+    ranked = trending_tracker.trending(namespace_ids, k)
+    short_urls = ShortURL.objects.filter(
+        pk__in=[short_url_id for short_url_id, _, _ in ranked],
+        namespace_id__in=namespace_ids,
+    ).select_related('namespace').in_bulk()
+
+    results = []
+    for short_url_id, clicks, error in ranked:
+        short_url = short_urls.get(short_url_id)
+        if short_url is None:
+            continue
+        results.append({
+            'id': short_url.id,
+            'short_code': short_url.short_code,
+            'original_url': short_url.original_url,
+            'namespace_name': short_url.namespace.name,
+            'clicks': clicks,
+            'error': error,
+        })
+    return results
+
+
+def parse_trending_k(query_params, default=10):
+    """
+    Read k from query parameters.
+
+    Raises:
+        ValueError: With a message for the client if k is invalid
+    """
+    try:
+        k = int(query_params.get('k', default))
+    except (TypeError, ValueError):
+        raise ValueError("k must be an integer")
+    if not 1 <= k <= MAX_TRENDING_K:
+        raise ValueError(f"k must be between 1 and {MAX_TRENDING_K}")
+    return k
@@ -10,5 +10,5 @@ router.register(r'api/urls', views.ShortURLViewSet, basename='url')
 urlpatterns = [
     path('', include(router.urls)),
     # Public redirect endpoint - must be after API routes
-    path('<str:namespace_name>/<str:short_code>/', views.RedirectShortURLView.as_view(), name='redirect'),
+    path('<str:namespace_name>/<str:short_code>/', views.redirect_short_url, name='redirect'),
 ]
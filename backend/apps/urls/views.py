@@ -1,13 +1,28 @@
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.views import APIView
 from django.shortcuts import redirect
-from django.http import Http404
-from django.db import models
+from django.http import Http404, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_safe
 from .models import ShortURL
 from .serializers import ShortURLSerializer
+from .clicks import resolve_and_record_click, aresolve_and_record_click
+from .events import record_click_event
+from .trending import record_trending_click
+from .rollups import parse_stats_params, click_stats
+from .export import EXPORT_FORMATS, stream_export
+from .bulk import (
+    bulk_create_short_urls, BulkCreateConflict,
+    bulk_delete_short_urls, bulk_move_short_urls, bulk_update_destinations,
+)
+from .imports import detect_format, parse_rows, import_short_urls
+import io
+from django.conf import settings
 from core.permissions import IsOrganizationEditorOrAdmin
+from core.utils import get_membership_roles
 
 
 class ShortURLViewSet(viewsets.ModelViewSet):
@@ -28,11 +43,16 @@ class ShortURLViewSet(viewsets.ModelViewSet):
         """
         Optimized queryset using join instead of subquery.
         Only return URLs from namespaces in organizations where user is a member.
-        Uses select_related to avoid N+1 queries when accessing namespace and created_by.
+        Uses select_related to avoid N+1 queries when accessing namespace and created_by,
+        and annotates click totals so sharded counters are summed in the same query.
+        Lifetime visitor sketches for unique_visitors are prefetched in one query
+        per page, keeping their registers out of the DISTINCT row.
         """
         return ShortURL.objects.filter(
             namespace__organization__members__user=self.request.user
-        ).select_related('namespace', 'namespace__organization', 'created_by').distinct()
+        ).select_related(
+            'namespace', 'namespace__organization', 'created_by'
+        ).prefetch_related('visitor_sketch').with_click_totals().distinct()
     
     def list(self, request):
         """List all short URLs from user's organizations"""
@@ -91,10 +111,228 @@ class ShortURLViewSet(viewsets.ModelViewSet):
         short_url = self.get_object()
         short_url.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create many short URLs from a JSON array of create payloads.
+        
+        Each item succeeds or fails on its own; results are returned in
+        input order with the counts of created and failed items.
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {'error': 'Expected a non-empty list of short URLs'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > settings.BULK_CREATE_MAX_ITEMS:
+            return Response(
+                {'error': f'At most {settings.BULK_CREATE_MAX_ITEMS} short URLs can be created per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            results = bulk_create_short_urls(request.user, items, request)
+        except BulkCreateConflict as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        
+        created = sum(1 for result in results if result['status'] == 'created')
+        return Response({
+            'created': created,
+            'failed': len(results) - created,
+            'results': results,
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+    
+    def _bulk_ids(self, request):
+        """
+        Read the ids list of a bulk action request.
+        
+        Raises:
+            ValueError: With a message for the client if ids is invalid
+        """
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            raise ValueError("ids must be a non-empty list of short URL IDs")
+        if len(ids) > settings.BULK_ACTION_MAX_ITEMS:
+            raise ValueError(f"At most {settings.BULK_ACTION_MAX_ITEMS} ids can be given per request")
+        if not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+            raise ValueError("ids must be integers")
+        return ids
+    
+    @action(detail=False, methods=['post'], url_path='bulk-delete')
+    def bulk_delete(self, request):
+        """
+        Delete many short URLs at once.
+        
+        Body: ids (list of short URL IDs) or namespace (delete every short URL
+        in it). Permissions are checked once per organization involved.
+        """
+        if not isinstance(request.data, dict):
+            return Response({'error': 'Expected a JSON object'}, status=status.HTTP_400_BAD_REQUEST)
+        namespace_id = request.data.get('namespace')
+        try:
+            if namespace_id is not None and 'ids' not in request.data:
+                if not isinstance(namespace_id, int) or isinstance(namespace_id, bool):
+                    raise ValueError("Invalid namespace ID")
+                result = bulk_delete_short_urls(request.user, namespace_id=namespace_id, request=request)
+            else:
+                result = bulk_delete_short_urls(request.user, ids=self._bulk_ids(request), request=request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+    
+    @action(detail=False, methods=['post'], url_path='bulk-move')
+    def bulk_move(self, request):
+        """
+        Move many short URLs to another namespace.
+        
+        Body: ids and namespace (the target). The user must be an admin or
+        editor of both the source and the target organizations.
+        """
+        if not isinstance(request.data, dict):
+            return Response({'error': 'Expected a JSON object'}, status=status.HTTP_400_BAD_REQUEST)
+        namespace_id = request.data.get('namespace')
+        try:
+            ids = self._bulk_ids(request)
+            if not isinstance(namespace_id, int) or isinstance(namespace_id, bool):
+                raise ValueError("Invalid namespace ID")
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(bulk_move_short_urls(request.user, ids, namespace_id, request))
+    
+    @action(detail=False, methods=['post'], url_path='bulk-update')
+    def bulk_update(self, request):
+        """
+        Change the destination of many short URLs at once.
+        
+        Body: updates, a list of {id, original_url}. All updates are applied
+        in one statement or none are.
+        """
+        if not isinstance(request.data, dict):
+            return Response({'error': 'Expected a JSON object'}, status=status.HTTP_400_BAD_REQUEST)
+        updates = request.data.get('updates')
+        if not isinstance(updates, list) or not updates:
+            return Response(
+                {'error': 'updates must be a non-empty list of {id, original_url}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(updates) > settings.BULK_ACTION_MAX_ITEMS:
+            return Response(
+                {'error': f'At most {settings.BULK_ACTION_MAX_ITEMS} updates can be given per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            result = bulk_update_destinations(request.user, updates, request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+    
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_file(self, request):
+        """
+        Import short URLs from an uploaded CSV or NDJSON file.
+        
+        Form fields: file, input_format (csv or ndjson; defaults to the file
+        extension) and namespace (id used for rows that do not name one).
+        The file is streamed and inserted a chunk per transaction; the
+        response has the totals and the first rejected rows. Very large
+        files are better loaded with the import_short_urls command, which
+        can resume.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            import_format = detect_format(upload.name, request.data.get('input_format'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        namespace_id = request.data.get('namespace')
+        if namespace_id:
+            try:
+                namespace_id = int(namespace_id)
+            except (ValueError, TypeError):
+                return Response(
+                    {'error': 'Invalid namespace ID'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        rejects = []
+        
+        def reject(number, row, errors):
+            if len(rejects) < settings.IMPORT_MAX_REPORTED_REJECTS:
+                rejects.append({'row': number, 'record': row, 'errors': errors})
+        
+        lines = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+        try:
+            stats = import_short_urls(
+                parse_rows(lines, import_format),
+                user=request.user,
+                namespace_id=namespace_id or None,
+                on_reject=reject,
+            )
+        except UnicodeDecodeError:
+            return Response({'error': 'File must be UTF-8 encoded'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({**stats.as_dict(), 'rejects': rejects})
+    
+    @action(detail=False)
+    def export(self, request):
+        """
+        Stream every short URL from the user's organizations as a download.
+        
+        Query params: output (csv or ndjson; default csv), organization
+        (limit to one organization) and clicks (1 to include click counts).
+        Rows are streamed from a server-side cursor instead of paginated.
+        """
+        organization_ids = list(get_membership_roles(request.user, request))
+        organization_id = request.query_params.get('organization')
+        if organization_id:
+            try:
+                organization_id = int(organization_id)
+            except (ValueError, TypeError):
+                return Response(
+                    {'error': 'Invalid organization ID'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if organization_id not in organization_ids:
+                raise Http404("Organization not found")
+            organization_ids = [organization_id]
+        
+        output_format = request.query_params.get('output', 'csv')
+        include_clicks = request.query_params.get('clicks') in ('1', 'true')
+        try:
+            chunks = stream_export(output_format, organization_ids, include_clicks)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        response = StreamingHttpResponse(chunks, content_type=EXPORT_FORMATS[output_format])
+        response['Content-Disposition'] = f'attachment; filename="short-urls.{output_format}"'
+        return response
+    
+    @action(detail=True)
+    def stats(self, request, pk=None):
+        """
+        Clicks per minute, hour or day for a short URL.
+        
+        Query params: granularity (minute, hour or day; default hour) and
+        optional ISO 8601 start/end. Served from the rollup tables, so the
+        cost depends on the number of buckets, not the number of clicks.
+        """
+        short_url = self.get_object()
+        try:
+            granularity, start, end = parse_stats_params(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(click_stats(granularity, start, end, short_url_id=short_url.pk))
 
 
 class RedirectShortURLView(APIView):
-    """Public endpoint to redirect short URLs to their original destinations"""
+    """
+    DRF version of the public redirect endpoint.
+    
+    Kept for comparison in the benchmark_redirects command; the URL is served
+    by redirect_short_url, which skips DRF's request handling.
+    """
     permission_classes = [AllowAny]  # Public endpoint - no authentication required
     
     def get(self, request, namespace_name, short_code):
@@ -108,20 +346,65 @@ class RedirectShortURLView(APIView):
         Returns:
             HTTP redirect to the original URL or 404 if not found
         """
-        try:
-            # Look up the short URL by namespace name and short code
-            short_url = ShortURL.objects.select_related('namespace').get(
-                namespace__name=namespace_name,
-                short_code=short_code
-            )
-            
-            # Increment click count atomically to avoid race conditions
-            ShortURL.objects.filter(pk=short_url.pk).update(
-                click_count=models.F('click_count') + 1
-            )
-            
-            # Redirect to the original URL (temporary redirect, not cached)
-            return redirect(short_url.original_url, permanent=False)
-            
-        except ShortURL.DoesNotExist:
+        # Look up the short URL by namespace name and short code, served from
+        # the resolution caches when possible, and count the click
+        resolved = resolve_and_record_click(namespace_name, short_code)
+        if resolved is None:
             raise Http404("Short URL not found")
+        record_click_event(request, resolved.pk)
+        record_trending_click(resolved)
+        
+        # Redirect to the original URL (temporary redirect, not cached)
+        return redirect(resolved.original_url, permanent=False)
+
+
+def short_url_not_found():
+    """The 404 the redirect endpoint has always returned, with DRF's JSON body"""
+    return JsonResponse({'detail': 'Short URL not found'}, status=404)
+
+
+# Public and cookie-free, so no CSRF check: other methods get a 405, not a 403
+@csrf_exempt
+@require_safe
+def redirect_short_url(request, namespace_name, short_code):
+    """
+    Public endpoint to redirect short URLs to their original destinations.
+    
+    A plain Django view so redirects skip DRF's request wrapping, content
+    negotiation and permission checks. RedirectFastPathMiddleware calls it
+    directly, before the session/CSRF/auth/messages middleware and URL
+    resolution run.
+    
+    Args:
+        namespace_name: The namespace name
+        short_code: The short code identifier
+        
+    Returns:
+        HTTP 302 redirect to the original URL or 404 if not found
+    """
+    resolved = resolve_and_record_click(namespace_name, short_code)
+    if resolved is None:
+        return short_url_not_found()
+    record_click_event(request, resolved.pk)
+    record_trending_click(resolved)
+    
+    # Build the response directly; shortcuts.redirect() tries reverse() first
+    return HttpResponseRedirect(resolved.original_url)
+
+
+async def aredirect_short_url(request, namespace_name, short_code):
+    """
+    Async version of redirect_short_url, used by RedirectFastPathMiddleware
+    when the project is served over ASGI.
+    
+    Cache hits with write-behind click counting never leave the event loop,
+    so a worker can hold many in-flight redirects without a thread each.
+    """
+    resolved = await aresolve_and_record_click(namespace_name, short_code)
+    if resolved is None:
+        return short_url_not_found()
+    # Both only update in-memory buffers, so they are safe on the event loop
+    record_click_event(request, resolved.pk)
+    record_trending_click(resolved)
+    
+    return HttpResponseRedirect(resolved.original_url)
@@ -0,0 +1,105 @@
+"""
+Unique visitor counts from HyperLogLog sketches of hashed client IPs
+"""
+from collections import defaultdict
+from django.db import transaction
+from apps.namespaces.models import Namespace
+from .hll import HyperLogLog
+from .models import ShortURL, DailyVisitorSketch, LifetimeVisitorSketch
+
+# Sketches are streamed in chunks of this size when merging
+MERGE_CHUNK_SIZE = 500
+
+
+def visitor_hash(ip_hash):
+    """64-bit HyperLogLog hash of a visitor, from the hex ClickEvent.ip_hash"""
+    return int(ip_hash[:16], 16)
+
+
+def record_visitor_sketches(events):
+    """
+    Fold a batch of click events into the daily and lifetime sketches.
+
+    The batch is first summarised into one in-memory sketch per short URL
+    and day, so the database work depends on the number of distinct links in
+    the batch, not the number of clicks.
+    """
+    daily = defaultdict(HyperLogLog)
+    lifetime = defaultdict(HyperLogLog)
+    for event in events:
+        if not event.ip_hash:
+            continue
+        value = visitor_hash(event.ip_hash)
+        daily[(event.short_url_id, event.clicked_at.date())].add_hash(value)
+        lifetime[event.short_url_id].add_hash(value)
+    if not lifetime:
+        return
+
+    namespace_ids = dict(ShortURL.objects.filter(pk__in=list(lifetime)).values_list('pk', 'namespace_id'))
+    with transaction.atomic():
+        _merge_into(DailyVisitorSketch, ('short_url_id', 'day'), daily, namespace_ids)
+        _merge_into(
+            LifetimeVisitorSketch, ('short_url_id',),
+            {(short_url_id,): sketch for short_url_id, sketch in lifetime.items()}, namespace_ids
+        )
+
+
+def _merge_into(model, fields, sketches, namespace_ids):
+    # Keys are tuples of values for fields, starting with short_url_id;
+    # sketches of short URLs deleted since the click are skipped
+    sketches = {key: sketch for key, sketch in sketches.items() if key[0] in namespace_ids}
+    if not sketches:
+        return
+    keys = sorted(sketches)
+    empty = HyperLogLog().to_bytes()
+    # Create missing rows first so every sketch is merged under a row lock;
+    # an upsert that overwrote registers would lose a concurrent worker's visitors
+    model.objects.bulk_create(
+        [model(namespace_id=namespace_ids[key[0]], registers=empty, **dict(zip(fields, key))) for key in keys],
+        ignore_conflicts=True,
+    )
+
+    candidates = model.objects.all()
+    for position, field in enumerate(fields):
+        candidates = candidates.filter(**{f'{field}__in': {key[position] for key in keys}})
+    # Locked in primary key order so concurrent flushes cannot deadlock
+    rows = []
+    for row in candidates.select_for_update().order_by('pk'):
+        key = tuple(getattr(row, field) for field in fields)
+        if key in sketches:
+            merged = HyperLogLog(row.registers)
+            merged.merge(sketches[key])
+            row.registers = merged.to_bytes()
+            rows.append(row)
+    model.objects.bulk_update(rows, ['registers'])
+
+
+def merged_visitor_count(sketches):
+    """
+    Estimate the distinct visitors across a queryset of sketches.
+
+    Returns:
+        int: Estimated unique visitors (0 if there are no sketches)
+    """
+    merged = HyperLogLog()
+    for registers in sketches.values_list('registers', flat=True).iterator(chunk_size=MERGE_CHUNK_SIZE):
+        merged.merge(registers)
+    return merged.count()
+
+
+def unique_visitors(first_day, last_day, short_url_id=None, namespace_id=None, organization_id=None):
+    """
+    Estimate distinct visitors between two days, inclusive.
+
+    Exactly one of short_url_id, namespace_id or organization_id selects the
+    sketches. A visitor seen on several days or links counts once.
+    """
+    sketches = DailyVisitorSketch.objects.filter(day__gte=first_day, day__lte=last_day)
+    if short_url_id is not None:
+        sketches = sketches.filter(short_url_id=short_url_id)
+    elif namespace_id is not None:
+        sketches = sketches.filter(namespace_id=namespace_id)
+    else:
+        namespace_ids = Namespace.objects.filter(organization_id=organization_id).values('pk')
+        sketches = sketches.filter(namespace_id__in=namespace_ids)
+    return merged_visitor_count(sketches)
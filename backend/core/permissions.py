@@ -1,8 +1,12 @@
 """
 Custom permission classes for role-based access control
+
+Roles are read from the request's membership map (see
+core.utils.get_membership_roles), so the permission check and any
+serializer or view checking roles afterwards share a single query.
 """
 from rest_framework import permissions
-from core.utils import is_organization_admin, is_organization_editor_or_admin
+from core.utils import is_organization_admin, is_organization_editor_or_admin, get_user_organization_role
 
 
 class IsOrganizationAdmin(permissions.BasePermission):
@@ -23,14 +27,14 @@ class IsOrganizationAdmin(permissions.BasePermission):
         # If the object itself is an Organization
         from apps.organizations.models import Organization
         if isinstance(obj, Organization):
-            return is_organization_admin(request.user, obj)
+            return is_organization_admin(request.user, obj, request)
         
         # Direct organization attribute (e.g., Namespace)
-        if hasattr(obj, 'organization'):
-            return is_organization_admin(request.user, obj.organization)
+        if hasattr(obj, 'organization_id'):
+            return is_organization_admin(request.user, obj.organization_id, request)
         # Nested through namespace (e.g., ShortURL)
-        elif hasattr(obj, 'namespace') and hasattr(obj.namespace, 'organization'):
-            return is_organization_admin(request.user, obj.namespace.organization)
+        elif hasattr(obj, 'namespace'):
+            return is_organization_admin(request.user, obj.namespace.organization_id, request)
         return False
 
 
@@ -49,11 +53,11 @@ class IsOrganizationEditorOrAdmin(permissions.BasePermission):
         or objects with 'namespace.organization' (like ShortURL).
         """
         # Direct organization attribute (e.g., Namespace)
-        if hasattr(obj, 'organization'):
-            return is_organization_editor_or_admin(request.user, obj.organization)
+        if hasattr(obj, 'organization_id'):
+            return is_organization_editor_or_admin(request.user, obj.organization_id, request)
         # Nested through namespace (e.g., ShortURL)
-        elif hasattr(obj, 'namespace') and hasattr(obj.namespace, 'organization'):
-            return is_organization_editor_or_admin(request.user, obj.namespace.organization)
+        elif hasattr(obj, 'namespace'):
+            return is_organization_editor_or_admin(request.user, obj.namespace.organization_id, request)
         return False
 
 
@@ -70,10 +74,6 @@ class IsOrganizationViewer(permissions.BasePermission):
         Check if user is a member (viewer, editor, or admin) of the organization.
         Works with objects that have an 'organization' attribute.
         """
-        if hasattr(obj, 'organization'):
-            from apps.organizations.models import OrganizationMember
-            return OrganizationMember.objects.filter(
-                organization=obj.organization,
-                user=request.user
-            ).exists()
+        if hasattr(obj, 'organization_id'):
+            return get_user_organization_role(request.user, obj.organization_id, request) is not None
         return False
@@ -0,0 +1,81 @@
+"""
+Shared serializer helpers
+"""
+from functools import lru_cache
+from django.db import IntegrityError, connection, transaction
+from rest_framework import serializers
+
+
+@lru_cache(maxsize=None)
+def _unique_index_columns(index_name):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT a.attname FROM pg_class i '
+            'JOIN pg_index x ON x.indexrelid = i.oid AND x.indisunique '
+            'JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = ANY(x.indkey) '
+            'WHERE i.relname = %s',
+            [index_name]
+        )
+        return tuple(row[0] for row in cursor.fetchall())
+
+
+def violated_unique_field(model, error):
+    """
+    Return the name of the single model field whose unique constraint an
+    IntegrityError reports, or None for any other integrity error.
+
+    The constraint is looked up by the name Postgres reports, so this works
+    for Django's hashed constraint names as well as hand-written indexes.
+    """
+    diag = getattr(error.__cause__, 'diag', None)
+    constraint_name = getattr(diag, 'constraint_name', None)
+    if not constraint_name or getattr(error.__cause__, 'pgcode', None) != '23505':
+        return None
+    columns = _unique_index_columns(constraint_name)
+    if len(columns) != 1:
+        return None
+    for field in model._meta.concrete_fields:
+        if field.column == columns[0]:
+            return field.name
+    return None
+
+
+class UniqueConstraintErrorsMixin:
+    """
+    ModelSerializer mixin that saves without checking uniqueness first.
+
+    The unique constraints are the real guard, so instead of a racy exists()
+    per unique field the row is written straight away, and a violation of a
+    field listed in unique_error_messages comes back as a ValidationError on
+    that field, the same 400 a pre-check gives. Other integrity errors are
+    raised unchanged. List those fields with validators=[] in extra_kwargs so
+    DRF does not add its own UniqueValidator query. Errors on a model field
+    the client does not send are reported on the field named for it in
+    unique_error_fields.
+    """
+    unique_error_messages = {}
+    unique_error_fields = {}
+
+    def create(self, validated_data):
+        return self.save_through_constraints(super().create, validated_data)
+
+    def update(self, instance, validated_data):
+        return self.save_through_constraints(super().update, instance, validated_data)
+
+    def save_through_constraints(self, save, *args):
+        validated_data = args[-1]
+        try:
+            # A savepoint, so an enclosing transaction survives the violation
+            with transaction.atomic():
+                return save(*args)
+        except IntegrityError as e:
+            field = violated_unique_field(self.Meta.model, e)
+            if field not in self.unique_error_messages:
+                raise
+            raise serializers.ValidationError({
+                self.unique_error_fields.get(field, field): [self.unique_error_message(field, validated_data)]
+            })
+
+    def unique_error_message(self, field, validated_data):
+        """Return the error for a unique violation on field; override for messages that need a lookup."""
+        return self.unique_error_messages[field]
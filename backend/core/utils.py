@@ -3,57 +3,97 @@ Shared utility functions for the application
 """
 from apps.organizations.models import OrganizationMember
 
+ADMIN_ROLES = ('ADMIN',)
+EDITOR_ROLES = ('ADMIN', 'EDITOR')
 
-def is_organization_admin(user, organization):
+
+def _http_request(request):
+    # A DRF Request wraps the HttpRequest; cache on the latter so both share it
+    return getattr(request, '_request', request)
+
+
+def get_membership_roles(user, request=None):
+    """
+    Get the user's role in every organization they belong to.
+    
+    Loaded with one query, and only once per request when request is given,
+    so permissions, serializers and views checking roles in the same request
+    share it.
+    
+    Args:
+        user: User instance
+        request: Request to cache the map on, or None for no caching
+        
+    Returns:
+        dict: Organization id to role ('ADMIN', 'EDITOR', 'VIEWER')
+    """
+    if request is None:
+        return dict(OrganizationMember.objects.filter(user=user).values_list('organization_id', 'role'))
+    http_request = _http_request(request)
+    cached = getattr(http_request, '_membership_roles', None)
+    if cached is None or cached[0] != user.pk:
+        roles = dict(OrganizationMember.objects.filter(user=user).values_list('organization_id', 'role'))
+        cached = (user.pk, roles)
+        http_request._membership_roles = cached
+    return cached[1]
+
+
+def clear_membership_roles(request):
+    """Forget the cached membership map after the request changed a membership."""
+    http_request = _http_request(request)
+    if hasattr(http_request, '_membership_roles'):
+        del http_request._membership_roles
+
+
+def _organization_id(organization):
+    return getattr(organization, 'pk', organization)
+
+
+def is_organization_admin(user, organization, request=None):
     """
     Check if user is an admin of the organization.
     
     Args:
         user: User instance
-        organization: Organization instance
+        organization: Organization instance or id
+        request: Request whose membership map to consult, see get_membership_roles
         
     Returns:
         bool: True if user is admin, False otherwise
     """
-    return OrganizationMember.objects.filter(
-        organization=organization,
-        user=user,
-        role='ADMIN'
-    ).exists()
+    return get_user_organization_role(user, organization, request) in ADMIN_ROLES
 
 
-def is_organization_editor_or_admin(user, organization):
+def is_organization_editor_or_admin(user, organization, request=None):
     """
     Check if user is an editor or admin of the organization.
     
     Args:
         user: User instance
-        organization: Organization instance
+        organization: Organization instance or id
+        request: Request whose membership map to consult, see get_membership_roles
         
     Returns:
         bool: True if user is editor or admin, False otherwise
     """
-    return OrganizationMember.objects.filter(
-        organization=organization,
-        user=user,
-        role__in=['ADMIN', 'EDITOR']
-    ).exists()
+    return get_user_organization_role(user, organization, request) in EDITOR_ROLES
 
 
-def get_user_organization_role(user, organization):
+def get_user_organization_role(user, organization, request=None):
     """
     Get user's role in the organization.
     
     Args:
         user: User instance
-        organization: Organization instance
+        organization: Organization instance or id
+        request: Request whose membership map to consult, see get_membership_roles
         
     Returns:
         str or None: User's role ('ADMIN', 'EDITOR', 'VIEWER') or None if not a member
     """
-    member = OrganizationMember.objects.filter(
+    if request is not None:
+        return get_membership_roles(user, request).get(_organization_id(organization))
+    return OrganizationMember.objects.filter(
         organization=organization,
         user=user
-    ).first()
-    return member.role if member else None
-
+    ).values_list('role', flat=True).first()
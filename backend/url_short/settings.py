@@ -49,6 +49,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Serves public redirects before the session/CSRF/auth/messages middleware
+    'apps.urls.middleware.RedirectFastPathMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -94,6 +96,19 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Point CACHE_BACKEND at django.core.cache.backends.redis.RedisCache (or
+# memcached) in production so every worker shares one cache.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -172,9 +187,110 @@ SIMPLE_JWT = {
 # Application settings
 SHORT_CODE_LENGTH = config('SHORT_CODE_LENGTH', default=8, cast=int)
 SHORT_CODE_CHARSET = config('SHORT_CODE_CHARSET', default='abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789')
+
+# Generated short codes are a keyed permutation of a database sequence.
+# Only 1 in SHORT_CODE_SPARSITY codes of the generated shape is ever handed
+# out, so codes are hard to guess; custom codes are kept out of that range.
+# The key defaults to SECRET_KEY. Changing it, the charset or the length
+# after codes were generated can make new codes collide with old ones.
+SHORT_CODE_PERMUTATION_KEY = config('SHORT_CODE_PERMUTATION_KEY', default='')
+SHORT_CODE_SPARSITY = config('SHORT_CODE_SPARSITY', default=1000, cast=int)
+# Indexes each worker reserves from the allocator table at a time. Indexes
+# left when a worker exits are never handed out.
+SHORT_CODE_BLOCK_SIZE = config('SHORT_CODE_BLOCK_SIZE', default=1000, cast=int)
+
+# Order query parameters by name when canonicalizing destination URLs for
+# duplicate detection. Changing it after links exist leaves their stored
+# digests in the old canonical form.
+URL_CANONICAL_SORT_QUERY = config('URL_CANONICAL_SORT_QUERY', default=True, cast=bool)
+
+# Largest array POST /api/urls/bulk/ accepts
+BULK_CREATE_MAX_ITEMS = config('BULK_CREATE_MAX_ITEMS', default=1000, cast=int)
+# Most ids the bulk delete, move and destination update actions accept
+BULK_ACTION_MAX_ITEMS = config('BULK_ACTION_MAX_ITEMS', default=1000, cast=int)
+
+# Rows validated and inserted per transaction by short URL imports, and how
+# many rejected rows the upload endpoint returns in its response
+IMPORT_CHUNK_SIZE = config('IMPORT_CHUNK_SIZE', default=1000, cast=int)
+IMPORT_MAX_REPORTED_REJECTS = config('IMPORT_MAX_REPORTED_REJECTS', default=100, cast=int)
 FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:5174')
 INVITATION_EXPIRY_DAYS = config('INVITATION_EXPIRY_DAYS', default=7, cast=int)
 
+# First path segments that are never treated as a namespace by the redirect
+# fast path, so two-segment API/admin/static URLs reach their own views
+REDIRECT_RESERVED_PREFIXES = config('REDIRECT_RESERVED_PREFIXES', default='api,admin,static', cast=Csv())
+
+# Redirect resolution cache (per worker process)
+REDIRECT_CACHE_SIZE = config('REDIRECT_CACHE_SIZE', default=10000, cast=int)
+REDIRECT_CACHE_TTL = config('REDIRECT_CACHE_TTL', default=60, cast=int)
+
+# Redirect resolution cache shared by all workers, backed by CACHES
+REDIRECT_SHARED_CACHE_ALIAS = config('REDIRECT_SHARED_CACHE_ALIAS', default='default')
+REDIRECT_SHARED_CACHE_TTL = config('REDIRECT_SHARED_CACHE_TTL', default=300, cast=int)
+REDIRECT_NEGATIVE_CACHE_TTL = config('REDIRECT_NEGATIVE_CACHE_TTL', default=30, cast=int)
+
+# On a resolution cache miss, look the short URL up and increment its
+# click_count in one UPDATE ... RETURNING statement
+REDIRECT_SINGLE_STATEMENT = config('REDIRECT_SINGLE_STATEMENT', default=True, cast=bool)
+
+# Memory-mapped redirect snapshot written by the export_redirect_snapshot
+# command (empty disables it). Workers check for a swapped file every
+# REDIRECT_SNAPSHOT_CHECK_INTERVAL seconds. Re-export at least every
+# REDIRECT_SNAPSHOT_MAX_AGE seconds: edits and deletes made after an export
+# are pinned in the shared cache for that long to override the snapshot.
+# The snapshot therefore needs a cache every worker shares (a system check
+# rejects LocMemCache), configured not to evict the pins before they expire.
+REDIRECT_SNAPSHOT_PATH = config('REDIRECT_SNAPSHOT_PATH', default='')
+REDIRECT_SNAPSHOT_CHECK_INTERVAL = config('REDIRECT_SNAPSHOT_CHECK_INTERVAL', default=1, cast=float)
+REDIRECT_SNAPSHOT_MAX_AGE = config('REDIRECT_SNAPSHOT_MAX_AGE', default=3600, cast=int)
+
+# Per-worker Bloom filter of existing short codes. A definite miss skips the
+# database for unknown redirects and for short code collision checks. Codes
+# saved by other workers are picked up within SHORT_CODE_BLOOM_SYNC_INTERVAL
+# seconds.
+SHORT_CODE_BLOOM_FILTER = config('SHORT_CODE_BLOOM_FILTER', default=False, cast=bool)
+SHORT_CODE_BLOOM_ERROR_RATE = config('SHORT_CODE_BLOOM_ERROR_RATE', default=0.001, cast=float)
+SHORT_CODE_BLOOM_SYNC_INTERVAL = config('SHORT_CODE_BLOOM_SYNC_INTERVAL', default=1, cast=float)
+SHORT_CODE_BLOOM_REBUILD_INTERVAL = config('SHORT_CODE_BLOOM_REBUILD_INTERVAL', default=3600, cast=float)
+
+# Write-behind click counting: buffer increments per worker and flush them in
+# batches. CLICK_FLUSH_INTERVAL bounds how many seconds of clicks a crashed
+# worker can lose.
+CLICK_WRITE_BEHIND = config('CLICK_WRITE_BEHIND', default=False, cast=bool)
+CLICK_FLUSH_INTERVAL = config('CLICK_FLUSH_INTERVAL', default=5, cast=float)
+CLICK_FLUSH_MAX_PENDING = config('CLICK_FLUSH_MAX_PENDING', default=1000, cast=int)
+
+# Number of counter shards per short URL (0 updates ShortURL.click_count
+# directly). Run the compact_click_counts command periodically when enabled.
+CLICK_COUNTER_SHARDS = config('CLICK_COUNTER_SHARDS', default=0, cast=int)
+
+# Per-click event capture (timestamp, referrer, user agent, hashed IP).
+# Events are kept in a ring buffer of CLICK_EVENT_BUFFER_SIZE per worker and
+# inserted CLICK_EVENT_BATCH_SIZE rows at a time; when the database falls
+# behind, the oldest buffered events are dropped.
+CLICK_EVENTS = config('CLICK_EVENTS', default=False, cast=bool)
+CLICK_EVENT_BUFFER_SIZE = config('CLICK_EVENT_BUFFER_SIZE', default=50000, cast=int)
+CLICK_EVENT_FLUSH_INTERVAL = config('CLICK_EVENT_FLUSH_INTERVAL', default=2, cast=float)
+CLICK_EVENT_BATCH_SIZE = config('CLICK_EVENT_BATCH_SIZE', default=1000, cast=int)
+
+# Click events are stored in monthly partitions. manage_click_partitions
+# creates CLICK_EVENT_PARTITIONS_AHEAD months ahead and drops partitions older
+# than CLICK_EVENT_RETENTION_MONTHS full months (0 keeps everything).
+CLICK_EVENT_PARTITIONS_AHEAD = config('CLICK_EVENT_PARTITIONS_AHEAD', default=3, cast=int)
+CLICK_EVENT_RETENTION_MONTHS = config('CLICK_EVENT_RETENTION_MONTHS', default=13, cast=int)
+
+# Trending links: per-worker Space-Saving summaries of the top
+# TRENDING_CAPACITY links per namespace, in slices of TRENDING_SLICE_SECONDS,
+# published to the shared cache every TRENDING_PUBLISH_INTERVAL seconds and
+# merged over the last TRENDING_WINDOW_SECONDS when read. Off by default:
+# with a per-process cache each worker would only see its own clicks, so
+# a system check requires a shared cache when it is enabled.
+TRENDING_LINKS = config('TRENDING_LINKS', default=False, cast=bool)
+TRENDING_CAPACITY = config('TRENDING_CAPACITY', default=100, cast=int)
+TRENDING_SLICE_SECONDS = config('TRENDING_SLICE_SECONDS', default=300, cast=int)
+TRENDING_WINDOW_SECONDS = config('TRENDING_WINDOW_SECONDS', default=3600, cast=int)
+TRENDING_PUBLISH_INTERVAL = config('TRENDING_PUBLISH_INTERVAL', default=5, cast=float)
+
 # Email configuration
 EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = config('EMAIL_HOST', default='')